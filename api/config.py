@@ -20,4 +20,79 @@ PACKETSTREAM_HTTPS_PORT=os.environ.get("PACKETSTREAM_HTTPS_PORT")
 PACKETSTREAM_USERNAME=os.environ.get("PACKETSTREAM_USERNAME")
 PACKETSTREAM_PASSWORD=os.environ.get("PACKETSTREAM_PASSWORD")
 # Only used when localstack is employed
-LOCAL_AWS_ENDPOINT_URL=os.environ.get("ENDPOINT_URL")
\ No newline at end of file
+LOCAL_AWS_ENDPOINT_URL=os.environ.get("ENDPOINT_URL")
+
+# Text capture for HTML pages: "PDF" parses the rendered PDF, "DOM" reads the live page
+TEXT_EXTRACTION_MODE=os.environ.get("TEXT_EXTRACTION_MODE", "PDF").upper()
+WRITE_TEXT_SIDECAR=os.environ.get("WRITE_TEXT_SIDECAR", "False").lower() == "true"
+# Post-processing of rendered/downloaded PDFs before upload
+PDF_OPTIMIZATION_ENABLED=os.environ.get("PDF_OPTIMIZATION_ENABLED", "False").lower() == "true"
+PDF_OPTIMIZATION_IMAGE_DPI=int(os.environ.get("PDF_OPTIMIZATION_IMAGE_DPI", "150"))
+PDF_OPTIMIZATION_IMAGE_QUALITY=int(os.environ.get("PDF_OPTIMIZATION_IMAGE_QUALITY", "75"))
+PDF_OPTIMIZATION_WORKERS=int(os.environ.get("PDF_OPTIMIZATION_WORKERS", "2"))
+# Chromium resource governor
+BROWSER_PAGE_MEMORY_LIMIT_MB=int(os.environ.get("BROWSER_PAGE_MEMORY_LIMIT_MB", "1536"))
+BROWSER_MEMORY_POLL_SECONDS=float(os.environ.get("BROWSER_MEMORY_POLL_SECONDS", "2"))
+MIN_HOST_AVAILABLE_MEMORY_MB=int(os.environ.get("MIN_HOST_AVAILABLE_MEMORY_MB", "512"))
+HOST_MEMORY_WAIT_SECONDS=int(os.environ.get("HOST_MEMORY_WAIT_SECONDS", "60"))
+# Per-search download budget; 0 means unlimited
+MAX_URLS_PER_SEARCH=int(os.environ.get("MAX_URLS_PER_SEARCH", "0"))
+MAX_SECONDS_PER_SEARCH=int(os.environ.get("MAX_SECONDS_PER_SEARCH", "0"))
+# Seconds of a schedule's deadline kept back for writing manifests and uploading
+DEADLINE_FINALIZE_RESERVE_SECONDS=int(os.environ.get("DEADLINE_FINALIZE_RESERVE_SECONDS", "120"))
+# Concurrency of a worker; slots are shared fairly between the schedules it runs at once
+MAX_CONCURRENT_SCHEDULES=int(os.environ.get("MAX_CONCURRENT_SCHEDULES", "1"))
+BROWSER_PAGE_SLOTS=int(os.environ.get("BROWSER_PAGE_SLOTS", "2"))
+PDF_DOWNLOAD_SLOTS=int(os.environ.get("PDF_DOWNLOAD_SLOTS", "4"))
+TEXT_EXTRACTION_SLOTS=int(os.environ.get("TEXT_EXTRACTION_SLOTS", "2"))
+# Bulk due diligence submission
+MAX_DUE_DILIGENCE_BATCH_SIZE=int(os.environ.get("MAX_DUE_DILIGENCE_BATCH_SIZE", "1000"))
+PUBLISH_BATCH_CONCURRENCY=int(os.environ.get("PUBLISH_BATCH_CONCURRENCY", "5"))
+# Where artifacts go: "LOCAL" stages under LOCAL_ARTIFACT_ROOT and uploads at the end, "S3" streams straight to the bucket
+# With "S3" nothing touches local disk, but each PDF is held in memory whole (up to LARGE_PDF_THRESHOLD_MB) while it is finalized
+BUCKET_NAME=os.environ.get("BUCKET_NAME", "vdd-crawler")
+ARTIFACT_STORAGE=os.environ.get("ARTIFACT_STORAGE", "LOCAL").upper()
+LOCAL_ARTIFACT_ROOT=os.environ.get("LOCAL_ARTIFACT_ROOT", "./tmp")
+CLEANUP_LOCAL_ARTIFACTS=os.environ.get("CLEANUP_LOCAL_ARTIFACTS", "True").lower() == "true"
+S3_MULTIPART_PART_SIZE_MB=int(os.environ.get("S3_MULTIPART_PART_SIZE_MB", "8"))
+# Pack a schedule's artifacts into one archive per "SCHEDULE" or per crawler "CATEGORY" before upload; "NONE" uploads them as they are
+ARTIFACT_PACKAGING=os.environ.get("ARTIFACT_PACKAGING", "NONE").upper()
+# Near-duplicate texts within a schedule: "OFF", "MARK" them in the manifests, or "DROP" their files before upload
+DEDUPLICATION_MODE=os.environ.get("DEDUPLICATION_MODE", "OFF").upper()
+DEDUPLICATION_THRESHOLD=float(os.environ.get("DEDUPLICATION_THRESHOLD", "0.8"))
+DEDUPLICATION_VENDOR_HISTORY=os.environ.get("DEDUPLICATION_VENDOR_HISTORY", "False").lower() == "true"
+DEDUPLICATION_HISTORY_LIMIT=int(os.environ.get("DEDUPLICATION_HISTORY_LIMIT", "5000"))
+# Full-text index of each schedule's texts, shipped with its artifacts and queried by the search endpoint
+TEXT_INDEX_ENABLED=os.environ.get("TEXT_INDEX_ENABLED", "True").lower() == "true"
+TEXT_INDEX_CACHE_DIR=os.environ.get("TEXT_INDEX_CACHE_DIR", "./text-index-cache")
+TEXT_INDEX_CACHE_SIZE=int(os.environ.get("TEXT_INDEX_CACHE_SIZE", "50"))
+# Retries: jittered exponential backoff, and a deferred lane that tries failed URLs again at the end of a schedule
+RETRY_BASE_DELAY_SECONDS=float(os.environ.get("RETRY_BASE_DELAY_SECONDS", "2"))
+RETRY_MAX_DELAY_SECONDS=float(os.environ.get("RETRY_MAX_DELAY_SECONDS", "30"))
+DEFERRED_RETRY_ENABLED=os.environ.get("DEFERRED_RETRY_ENABLED", "True").lower() == "true"
+DEFERRED_RETRY_ROUNDS=int(os.environ.get("DEFERRED_RETRY_ROUNDS", "2"))
+DEFERRED_RETRY_BUDGET_RATIO=float(os.environ.get("DEFERRED_RETRY_BUDGET_RATIO", "0.2"))
+DEFERRED_RETRY_MIN_BUDGET=int(os.environ.get("DEFERRED_RETRY_MIN_BUDGET", "5"))
+# Large PDFs: parallel range downloads, and past LARGE_PDF_THRESHOLD_MB only the leading part is kept, repaired to its first pages
+LARGE_PDF_THRESHOLD_MB=int(os.environ.get("LARGE_PDF_THRESHOLD_MB", "50"))
+PARTIAL_PDF_BYTES_MB=int(os.environ.get("PARTIAL_PDF_BYTES_MB", "16"))
+PARTIAL_PDF_MAX_PAGES=int(os.environ.get("PARTIAL_PDF_MAX_PAGES", "50"))
+RANGE_DOWNLOAD_CHUNK_MB=int(os.environ.get("RANGE_DOWNLOAD_CHUNK_MB", "4"))
+RANGE_DOWNLOAD_WORKERS=int(os.environ.get("RANGE_DOWNLOAD_WORKERS", "4"))
+RANGE_DOWNLOAD_MIN_MB=int(os.environ.get("RANGE_DOWNLOAD_MIN_MB", "8"))
+# Which worker runs which schedule, so redelivered SQS messages don't run a schedule twice: "SQLITE" or "NONE"
+SCHEDULE_LEDGER=os.environ.get("SCHEDULE_LEDGER", "SQLITE").upper()
+SCHEDULE_LEDGER_PATH=os.environ.get("SCHEDULE_LEDGER_PATH", "./schedule_ledger.sqlite")
+SCHEDULE_LEASE_SECONDS=int(os.environ.get("SCHEDULE_LEASE_SECONDS", "300"))
+# Bytes pulled over the network: a schedule stops starting new URLs past its budget, and a page stops loading past its own; 0 means unlimited
+SCHEDULE_BYTE_BUDGET_MB=int(os.environ.get("SCHEDULE_BYTE_BUDGET_MB", "0"))
+PAGE_BYTE_BUDGET_MB=int(os.environ.get("PAGE_BYTE_BUDGET_MB", "0"))
+BANDWIDTH_TOP_HOSTS=int(os.environ.get("BANDWIDTH_TOP_HOSTS", "20"))
+# Single-URL captures served by the API: browsers kept warm between them, concurrency limit and result cache
+CAPTURE_MAX_CONCURRENCY=int(os.environ.get("CAPTURE_MAX_CONCURRENCY", "2"))
+CAPTURE_WARM_BROWSERS=int(os.environ.get("CAPTURE_WARM_BROWSERS", "0"))
+CAPTURE_BROWSER_MAX_PAGES=int(os.environ.get("CAPTURE_BROWSER_MAX_PAGES", "50"))
+CAPTURE_TIMEOUT_SECONDS=int(os.environ.get("CAPTURE_TIMEOUT_SECONDS", "45"))
+CAPTURE_CACHE_TTL_SECONDS=int(os.environ.get("CAPTURE_CACHE_TTL_SECONDS", "900"))
+CAPTURE_CACHE_SIZE=int(os.environ.get("CAPTURE_CACHE_SIZE", "50"))
+CAPTURE_CACHE_MAX_MB=int(os.environ.get("CAPTURE_CACHE_MAX_MB", "200"))
@@ -1,24 +1,30 @@
 from abc import ABC, abstractmethod
 from api.page_objects.google_crawler_page import CrawlerPage
 from api.config import REGULATORY_DATABASE_SEARCH_ENGINE_URL, DEFAULT_SEARCH_ENGINE_URL, NEWS_SEARCH_ENGINE_URL
+from api.util.BudgetUtils import TimeBudget, new_search_budget
 
 import logging
 
 logger = logging.getLogger('crawlers')
 
 
+RISK_TERMS = ["facilitation payment", "litigation", "judicial", "fine", "launder", "OFAC", "terror", "manipulate",
+              "counterfeit", "traffic", "court", "appeal", "investigate", "guilty", "illegal", "arrest", "evasion",
+              "sentence", "kickback", "prison", "jail", "corruption", "corrupt", "grease payment", "crime", "bribe",
+              "fraud", "condemn", "accuse", "implicate"]
+
+HINDI_RISK_TERMS = ["अपराध", "रिश्वत", "धोखाधड़ी", "निंदा", "आरोप", "शामिल", "ग्रेस भुगतान", "मुकदमा", "न्यायिक", "जुर्माना",
+                    "मनी लॉन्ड्रिंग", "आतंकवाद", "नकली", "तस्करी", "कोर्ट", "अपील", "जांच", "दोषी", "अवैध", "गिरफ्तारी",
+                    "चोरी", "सजा", "घूस", "जेल", "भ्रष्टाचार"]
+
+
 def get_search_term(actor_name) -> str:
-    return (
-        f'-filetype:csv -filetype:xls -filetype:xlsx "{actor_name}" ("facilitation payment" | litigation | judicial | fine | launder | OFAC | '
-        f'terror | manipulate | counterfeit | traffic | court | appeal | investigate | guilty | illegal | '
-        f'arrest | evasion | sentence | kickback | prison | jail | corruption | corrupt | "grease payment" '
-        f'| crime | bribe | fraud | condemn | accuse | implicate)')
+    risk_terms = " | ".join(f'"{term}"' if " " in term else term for term in RISK_TERMS)
+    return f'-filetype:csv -filetype:xls -filetype:xlsx "{actor_name}" ({risk_terms})'
 
 
 def get_hindi_search_term(actor_name):
-    return (f'-filetype:csv -filetype:xls -filetype:xlsx "{actor_name}" (अपराध | रिश्वत | धोखाधड़ी | निंदा | आरोप | शामिल | ग्रेस भुगतान | '
-            f'मुकदमा | न्यायिक | जुर्माना | मनी लॉन्ड्रिंग | आतंकवाद | नकली | तस्करी | कोर्ट | '
-            f'अपील | जांच | दोषी | अवैध | गिरफ्तारी | चोरी | सजा | घूस | जेल | भ्रष्टाचार)')
+    return f'-filetype:csv -filetype:xls -filetype:xlsx "{actor_name}" ({" | ".join(HINDI_RISK_TERMS)})'
 
 
 class BaseCrawler(ABC):
@@ -27,7 +33,7 @@ class BaseCrawler(ABC):
         pass
 
     @abstractmethod
-    async def crawl(self, actor_name, directors, schedule_id, pages, site_url: None):
+    async def crawl(self, actor_name, directors, schedule_id, pages, site_url: None, time_budget: TimeBudget = None):
         pass
 
     @abstractmethod
@@ -37,6 +43,13 @@ class BaseCrawler(ABC):
     def should_crawl_for_director(self):
         pass
 
+    @abstractmethod
+    def count_searches(self, directors, site_url) -> int:
+        """
+        Number of searches `crawl` will run; used to share a schedule's deadline across crawlers and searches.
+        """
+        pass
+
 
 class GoogleCrawler(BaseCrawler):
     def get_category(self) -> str:
@@ -48,18 +61,25 @@ class GoogleCrawler(BaseCrawler):
     def should_crawl_for_director(self):
         return True
 
-    async def crawl(self, actor_name, directors, schedule_id, pages, site_url: None):
-        google_page = CrawlerPage()
+    def count_searches(self, directors, site_url) -> int:
+        return 2 + (2 * len(directors) if self.should_crawl_for_director() else 0)
+
+    async def crawl(self, actor_name, directors, schedule_id, pages, site_url: None, time_budget: TimeBudget = None):
+        google_page = CrawlerPage(schedule_id)
         logger.info(f"Performing search using English search terms for {actor_name}...")
         search_term = get_search_term(actor_name)
         await google_page.search_and_download(search_term, pages, f"{schedule_id}/{self.get_category()}",
-                                              search_url=self.get_search_engine_url())
+                                              search_url=self.get_search_engine_url(),
+                                              actor_names=[actor_name], risk_terms=RISK_TERMS,
+                                              budget=new_search_budget(time_budget))
         logger.info(f"Completed search using English search terms for {actor_name}.")
 
         logger.info(f"Performing search using Hindi search terms for {actor_name}...")
         hindi_search_term = get_hindi_search_term(actor_name)
         await google_page.search_and_download(hindi_search_term, pages, f"{schedule_id}/{self.get_category()}/Hindi",
-                                              search_url=self.get_search_engine_url())
+                                              search_url=self.get_search_engine_url(),
+                                              actor_names=[actor_name], risk_terms=HINDI_RISK_TERMS,
+                                              budget=new_search_budget(time_budget))
         logger.info(f"Completed search using Hindi search terms for {actor_name}.")
 
         if self.should_crawl_for_director():
@@ -69,7 +89,9 @@ class GoogleCrawler(BaseCrawler):
                 await (google_page.search_and_download(director_search_term,
                                                        pages,
                                                        f"{schedule_id}/{self.get_category()}/Directors/{director}",
-                                                       search_url=self.get_search_engine_url()))
+                                                       search_url=self.get_search_engine_url(),
+                                                       actor_names=[director], risk_terms=RISK_TERMS,
+                                                       budget=new_search_budget(time_budget)))
                 logger.info(f"Completed search using English search terms for director {director}.")
 
                 logger.info(f"Performing search using Hindi search terms for director {director}...")
@@ -77,7 +99,9 @@ class GoogleCrawler(BaseCrawler):
                 await google_page.search_and_download(director_hindi_search_term,
                                                       pages,
                                                       f"{schedule_id}/{self.get_category()}/Directors/{director}/Hindi",
-                                                      search_url=self.get_search_engine_url())
+                                                      search_url=self.get_search_engine_url(),
+                                                      actor_names=[director], risk_terms=HINDI_RISK_TERMS,
+                                                      budget=new_search_budget(time_budget))
                 logger.info(f"Completed search using Hindi search terms for director {director}.")
 
 
@@ -109,20 +133,27 @@ class RegulatoryDatabaseCrawler(GoogleCrawler):
             cleaned_name = cleaned_name.replace(suffix, "")
         return cleaned_name.strip()
 
-    async def crawl(self, actor_name, directors, schedule_id, pages, site_url: None):
-        google_page = CrawlerPage()
+    def count_searches(self, directors, site_url) -> int:
+        return 2 + super().count_searches(directors, site_url)
+
+    async def crawl(self, actor_name, directors, schedule_id, pages, site_url: None, time_budget: TimeBudget = None):
+        google_page = CrawlerPage(schedule_id)
         stripped_vendor_name = self.strip_vendor_business_suffix(actor_name)
         logger.info(f"Performing BSE Search for {actor_name}...")
         search_term = f'-filetype:pdf -filetype:xls -filetype:xlsx site:https://www.bseindia.com/ "{stripped_vendor_name}"'
         await google_page.search_and_download(search_term, pages, f"{schedule_id}/{self.get_category()}/BSE",
-                                              search_url=self.get_search_engine_url(), use_proxy=False)
+                                              search_url=self.get_search_engine_url(), use_proxy=False,
+                                              actor_names=[stripped_vendor_name],
+                                              budget=new_search_budget(time_budget))
 
         logger.info(f"Performing NSE Search for {actor_name}...")
         search_term = f'-filetype:pdf -filetype:xls -filetype:xlsx site:https://www.nseindia.com/ "{stripped_vendor_name}"'
         await google_page.search_and_download(search_term, pages, f"{schedule_id}/{self.get_category()}/NSE",
-                                              search_url=self.get_search_engine_url(), use_proxy=False)
+                                              search_url=self.get_search_engine_url(), use_proxy=False,
+                                              actor_names=[stripped_vendor_name],
+                                              budget=new_search_budget(time_budget))
 
-        await super().crawl(actor_name, directors, schedule_id, pages, site_url)
+        await super().crawl(actor_name, directors, schedule_id, pages, site_url, time_budget)
 
 
 
@@ -139,18 +170,23 @@ class OfficialWebsiteCrawler(BaseCrawler):
     def should_crawl_for_director(self):
         return False
 
-    async def crawl(self, actor_name, directors, schedule_id, pages, site_url: None):
+    def count_searches(self, directors, site_url) -> int:
+        return 1 if site_url else 0
+
+    async def crawl(self, actor_name, directors, schedule_id, pages, site_url: None, time_budget: TimeBudget = None):
         if not site_url:
             logger.info('Website URL not specified, skipping official website search.')
             return
-        google_page = CrawlerPage()
+        google_page = CrawlerPage(schedule_id)
         logger.info(f"Performing official website search for {actor_name} on site {site_url}...")
         search_term = f'site:{site_url} "{actor_name}" ("facilitation payment" | litigation | judicial | fine | launder | OFAC | '
         f'terror | manipulate | counterfeit | traffic | court | appeal | investigate | guilty | illegal | '
         f'arrest | evasion | sentence | kickback | prison | jail | corruption | corrupt | "grease payment" '
         f'| crime | bribe | fraud | condemn | accuse | implicate)'
         await google_page.search_and_download(search_term, pages, f"{schedule_id}/{self.get_category()}",
-                                              search_url=self.get_search_engine_url())
+                                              search_url=self.get_search_engine_url(),
+                                              actor_names=[actor_name], risk_terms=RISK_TERMS,
+                                              budget=new_search_budget(time_budget))
         logger.info("Completed official website search")
 
 
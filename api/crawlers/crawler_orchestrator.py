@@ -1,11 +1,56 @@
-from api.handlers.s3_handler import upload_files_to_s3
-from api.crawlers.Crawlers import CRAWLER_REGISTRY, BaseCrawler
-import os
+from api.crawlers.Crawlers import CRAWLER_REGISTRY, BaseCrawler, RISK_TERMS, HINDI_RISK_TERMS
+from api.config import DEADLINE_FINALIZE_RESERVE_SECONDS, DEFERRED_RETRY_ENABLED
+from api.crawlers.deduplicator import deduplicate_schedule
+from api.modules.artifact_storage import ArtifactStorage, open_schedule_storage, get_schedule_storage, close_schedule_storage
+from api.page_objects.google_crawler_page import run_deferred_retries
+from api.page_objects.resource_governor import resource_governor
+from api.util.BandwidthUtils import open_schedule_bandwidth_meter, get_schedule_bandwidth_meter, close_schedule_bandwidth_meter
+from api.util.BudgetUtils import TimeBudget, SearchBudget, NOT_FETCHED_DEADLINE, MIN_SECONDS_PER_URL
+from api.util.FairScheduler import fair_scheduler
+from api.util.RetryUtils import open_schedule_retry_queue, close_schedule_retry_queue
+from api.util.TextIndexUtils import TEXT_INDEX_NAME, open_schedule_text_index, close_schedule_text_index
+from asyncio import TimeoutError as ForcedTimeoutError
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger('orchestrator')
 
 
+def create_schedule_budget(deadline_minutes, crawlers, directors, website_url) -> TimeBudget | None:
+    if not deadline_minutes:
+        return None
+    deadline_seconds = deadline_minutes * 60
+    reserve_seconds = min(DEADLINE_FINALIZE_RESERVE_SECONDS, deadline_seconds / 2)
+    total_searches = 0
+    for crawler_requested in crawlers:
+        crawler: BaseCrawler | None = CRAWLER_REGISTRY.get(crawler_requested.lower())
+        if crawler is not None and crawler.get_search_engine_url() is not None:
+            total_searches += crawler.count_searches(directors, website_url)
+    return TimeBudget(deadline_seconds - reserve_seconds, total_searches)
+
+
+def write_schedule_manifest(storage: ArtifactStorage, schedule_id, schedule_manifest):
+    storage.write_text(f'{schedule_id}/schedule_manifest.json', json.dumps(schedule_manifest, indent=4))
+
+
+async def retry_deferred_urls(schedule_id, schedule_budget: TimeBudget | None):
+    if schedule_budget is None:
+        return await run_deferred_retries(schedule_id, SearchBudget())
+    if schedule_budget.expired():
+        logger.info(f"Deadline reached, not retrying deferred URLs of schedule {schedule_id}.")
+        return None
+    try:
+        return await asyncio.wait_for(
+            run_deferred_retries(schedule_id, SearchBudget(max_seconds=schedule_budget.remaining_seconds(),
+                                                           time_limit_reason=NOT_FETCHED_DEADLINE,
+                                                           min_seconds_per_url=MIN_SECONDS_PER_URL)),
+            timeout=schedule_budget.remaining_seconds())
+    except ForcedTimeoutError:
+        logger.error(f"Deadline reached, stopped retrying deferred URLs of schedule {schedule_id}.")
+        return None
+
+
 async def perform_due_diligence_v2(json_payload):
     vendor_name = json_payload["vendor_name"]
     schedule_id = json_payload["schedule_id"]
@@ -13,6 +58,37 @@ async def perform_due_diligence_v2(json_payload):
     directors = json_payload["directors"]
     website_url = json_payload["website_url"]
     crawlers = json_payload["crawlers"]
+    deadline_minutes = json_payload.get("deadline_minutes")
+    priority = json_payload.get("priority")
+
+    fair_scheduler.register(schedule_id, priority)
+    storage = open_schedule_storage(schedule_id)
+    open_schedule_text_index(schedule_id, {"en": RISK_TERMS, "hi": HINDI_RISK_TERMS})
+    open_schedule_bandwidth_meter(schedule_id)
+    if DEFERRED_RETRY_ENABLED:
+        open_schedule_retry_queue(schedule_id)
+    try:
+        await crawl_schedule(vendor_name, schedule_id, pages, directors, website_url, crawlers, deadline_minutes, priority)
+        await storage.finalize(schedule_id)
+    finally:
+        close_schedule_retry_queue(schedule_id)
+        close_schedule_bandwidth_meter(schedule_id)
+        close_schedule_text_index(schedule_id)
+        close_schedule_storage(schedule_id)
+        scheduling_stats = fair_scheduler.unregister(schedule_id)
+        logger.info(f"Scheduling stats for {schedule_id}: {json.dumps(scheduling_stats)}")
+
+
+async def crawl_schedule(vendor_name, schedule_id, pages, directors, website_url, crawlers, deadline_minutes, priority):
+    schedule_budget = create_schedule_budget(deadline_minutes, crawlers, directors, website_url)
+    schedule_manifest = {
+        "schedule_id": schedule_id,
+        "vendor_name": vendor_name,
+        "deadline_minutes": deadline_minutes,
+        "deadline_reached": False,
+        "priority": priority,
+        "crawlers": {},
+    }
 
     for crawler_requested in crawlers:
         crawler: BaseCrawler | None = CRAWLER_REGISTRY.get(crawler_requested.lower())
@@ -22,19 +98,52 @@ async def perform_due_diligence_v2(json_payload):
             if crawler.get_search_engine_url() is None:
                 logger.error(f"Search engine for {crawler.get_category()} not set, skipping this crawler.")
                 continue
-            logger.info(f"Starting {beautified_crawler_requested} search for schedule {schedule_id}...")
-            await crawler.crawl(vendor_name, directors, schedule_id, pages, website_url)
+            searches = crawler.count_searches(directors, website_url)
+            cut_short = False
+            # A crawler without searches (e.g. no website URL) takes no share of the deadline and can't be cut
+            if schedule_budget is None or searches == 0:
+                logger.info(f"Starting {beautified_crawler_requested} search for schedule {schedule_id}...")
+                await crawler.crawl(vendor_name, directors, schedule_id, pages, website_url)
+            elif schedule_budget.expired():
+                logger.info(f"Deadline reached, skipping {beautified_crawler_requested} search for schedule {schedule_id}.")
+                schedule_manifest["deadline_reached"] = True
+                schedule_manifest["crawlers"][crawler_requested] = NOT_FETCHED_DEADLINE
+                continue
+            else:
+                crawler_budget = schedule_budget.sub_budget(searches)
+                logger.info(f"Starting {beautified_crawler_requested} search for schedule {schedule_id} "
+                            f"with {int(crawler_budget.remaining_seconds())}s budget...")
+                try:
+                    await asyncio.wait_for(crawler.crawl(vendor_name, directors, schedule_id, pages, website_url, crawler_budget),
+                                           timeout=schedule_budget.remaining_seconds())
+                except ForcedTimeoutError:
+                    logger.error(f"Deadline reached, stopped {beautified_crawler_requested} search for schedule {schedule_id}.")
+                    schedule_manifest["deadline_reached"] = True
+                    schedule_manifest["crawlers"][crawler_requested] = NOT_FETCHED_DEADLINE
+                    continue
+                # Time running low by the end doesn't mean anything was dropped
+                cut_short = crawler_budget.cut_short
+                if cut_short:
+                    schedule_manifest["deadline_reached"] = True
+            schedule_manifest["crawlers"][crawler_requested] = "partially completed" if cut_short else "completed"
             logger.info(f"Completed {beautified_crawler_requested} search for schedule {schedule_id}.")
         else:
             logger.error(f"Crawler requested isn't supported: {crawler_requested}")
 
-    logger.info("Uploading files to S3...")
-    await upload_files_to_s3(os.environ.get('BUCKET_NAME', "vdd-crawler"), schedule_id)
-    logger.info("Upload to S3 complete")
-    #logger.info("Cleaning up local file system")
-    #shutil.rmtree(f"./tmp/{schedule_id}", onexc=handle_cleanup_exception)
-    #Test after demo
-    #logger.info(f"All done for {schedule_id}.")
+    schedule_manifest["retries"] = await retry_deferred_urls(schedule_id, schedule_budget)
+    resource_governor.reap_orphaned_chromium()
+    storage = get_schedule_storage(schedule_id)
+    try:
+        schedule_manifest["duplicates"] = await deduplicate_schedule(storage, schedule_id, vendor_name)
+    except Exception as e:
+        logger.error(f"Error detecting near-duplicates for schedule {schedule_id}: {e}")
+    schedule_manifest["bandwidth"] = get_schedule_bandwidth_meter(schedule_id).summary()
+    logger.info(f"Bandwidth used by {schedule_id}: {json.dumps(schedule_manifest['bandwidth'])}")
+    schedule_manifest["scheduling"] = fair_scheduler.get_stats(schedule_id)
+    await asyncio.to_thread(write_schedule_manifest, storage, schedule_id, schedule_manifest)
+    text_index = close_schedule_text_index(schedule_id)
+    if text_index is not None:
+        await asyncio.to_thread(storage.write_bytes, f'{schedule_id}/{TEXT_INDEX_NAME}', text_index)
 
 
 
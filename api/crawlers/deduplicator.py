@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Dict, List, Tuple
+
+from api.config import (
+    DEDUPLICATION_MODE, DEDUPLICATION_VENDOR_HISTORY, DEDUPLICATION_HISTORY_LIMIT, BUCKET_NAME
+)
+from api.modules.artifact_storage import ArtifactStorage
+from api.modules.aws_clients import get_s3_client
+from api.util.PdfUtils import run_in_pdf_pool
+from api.util.SimilarityUtils import LshIndex, minhash_signature
+from api.util.TextIndexUtils import get_schedule_text_index
+
+logger = logging.getLogger('Deduplicator')
+
+MANIFEST_NAME = "manifest.json"
+HISTORY_PREFIX = "history:"
+# Files written per result; dropped together when the result is a duplicate
+RESULT_EXTENSIONS = (".pdf", ".txt", ".json")
+
+
+class ResultText:
+
+    def __init__(self, manifest_key, entry, base_key, order):
+        self.manifest_key = manifest_key
+        self.entry = entry
+        # `<category>/<file_number>`, relative to the schedule
+        self.base_key = base_key
+        self.item_id = f"{base_key}.pdf"
+        self.order = order
+        self.signature = None
+
+    def preference(self):
+        # Canonical pick: best relevance score, then the earlier crawler / rank
+        return -(self.entry.get("score") or 0.0), self.order
+
+
+def vendor_history_key(vendor_name):
+    return f"history/{re.sub(r'[^a-z0-9]+', '-', vendor_name.lower()).strip('-')}/signatures.json"
+
+
+def load_vendor_history(vendor_name) -> List[Dict]:
+    try:
+        response = get_s3_client().get_object(Bucket=BUCKET_NAME, Key=vendor_history_key(vendor_name))
+        return json.loads(response['Body'].read())
+    except Exception as e:
+        logger.info(f"No similarity history loaded for {vendor_name}: {e}")
+        return []
+
+
+def save_vendor_history(vendor_name, history: List[Dict]):
+    try:
+        get_s3_client().put_object(Bucket=BUCKET_NAME, Key=vendor_history_key(vendor_name),
+                                   Body=json.dumps(history[-DEDUPLICATION_HISTORY_LIMIT:]).encode('utf-8'))
+    except Exception as e:
+        logger.error(f"Error saving similarity history for {vendor_name}: {e}")
+
+
+def load_results(storage: ArtifactStorage, schedule_id) -> Tuple[Dict[str, Dict], List[ResultText]]:
+    manifests = {}
+    results = []
+    for manifest_key in sorted(storage.list_keys(schedule_id)):
+        if not manifest_key.endswith(f'/{MANIFEST_NAME}'):
+            continue
+        manifest = json.loads(storage.read_bytes(manifest_key))
+        manifests[manifest_key] = manifest
+        dir_key = manifest_key[:-len(MANIFEST_NAME) - 1]
+        for entry in manifest.get("entries", []):
+            if entry.get("status"):
+                base_key = f"{dir_key[len(schedule_id) + 1:]}/{entry['file_number']}"
+                results.append(ResultText(manifest_key, entry, base_key, len(results)))
+    return manifests, results
+
+
+async def deduplicate_schedule(storage: ArtifactStorage, schedule_id, vendor_name) -> Dict | None:
+    """
+    Clusters near-duplicate result texts across the schedule's manifests (and, with DEDUPLICATION_VENDOR_HISTORY,
+    the vendor's earlier schedules). The best scored result of a cluster is kept as canonical; the others get
+    `duplicate_of` set and, in DROP mode, their files removed before upload.
+
+    Returns a summary for the schedule manifest, or None when deduplication is off.
+    """
+    if DEDUPLICATION_MODE not in ("MARK", "DROP"):
+        return None
+
+    manifests, results = await asyncio.to_thread(load_results, storage, schedule_id)
+
+    async def sign(result: ResultText):
+        text = await asyncio.to_thread(storage.read_bytes, f"{schedule_id}/{result.base_key}.txt")
+        if text:
+            result.signature = await run_in_pdf_pool(minhash_signature, text.decode('utf-8', errors='ignore'))
+
+    await asyncio.gather(*(sign(result) for result in results))
+
+    index = LshIndex()
+    history = await asyncio.to_thread(load_vendor_history, vendor_name) if DEDUPLICATION_VENDOR_HISTORY else []
+    for item in history:
+        index.add(f"{HISTORY_PREFIX}{item['id']}", item['signature'])
+
+    clusters = set()
+    duplicates = []
+    canonicals = []
+    for result in sorted((result for result in results if result.signature), key=ResultText.preference):
+        matches = index.query(result.signature)
+        if matches:
+            canonical_id = matches[0]
+            result.entry["duplicate_of"] = canonical_id
+            result.entry["cluster"] = canonical_id
+            clusters.add(canonical_id)
+            duplicates.append(result)
+        else:
+            index.add(result.item_id, result.signature)
+            canonicals.append(result)
+
+    clustered_canonicals = [result for result in canonicals if result.item_id in clusters]
+    for result in clustered_canonicals:
+        result.entry["cluster"] = result.item_id
+
+    dropped = 0
+    if DEDUPLICATION_MODE == "DROP":
+        text_index = get_schedule_text_index(schedule_id)
+        for result in duplicates:
+            base_key = f"{schedule_id}/{result.base_key}"
+            for extension in RESULT_EXTENSIONS:
+                await asyncio.to_thread(storage.delete, base_key + extension)
+            if text_index is not None:
+                category, file_number = result.base_key.rsplit('/', 1)
+                await asyncio.to_thread(text_index.remove_document, category, file_number)
+            result.entry["dropped"] = True
+            dropped += 1
+
+    changed_manifests = {result.manifest_key for result in duplicates + clustered_canonicals}
+    for manifest_key in changed_manifests:
+        await asyncio.to_thread(storage.write_text, manifest_key, json.dumps(manifests[manifest_key]))
+
+    if DEDUPLICATION_VENDOR_HISTORY:
+        history.extend({"id": f"{schedule_id}/{result.item_id}", "signature": result.signature} for result in canonicals)
+        await asyncio.to_thread(save_vendor_history, vendor_name, history)
+
+    summary = {
+        "mode": DEDUPLICATION_MODE,
+        "compared": len(canonicals) + len(duplicates),
+        "clusters": len(clusters),
+        "duplicates": len(duplicates),
+        "dropped": dropped,
+    }
+    logger.info(f"Near-duplicates for {schedule_id}: {json.dumps(summary)}")
+    return summary
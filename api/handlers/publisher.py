@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+from api.config import MSG_PUBLISHER, PUBLISH_BATCH_CONCURRENCY
+from api.modules.aws_clients import get_sns_client
+
+logger = logging.getLogger('publisher')
+
+# SNS accepts at most 10 entries per PublishBatch call
+SNS_BATCH_SIZE = 10
+
+
+def publish(message, subject=None) -> str:
+    kwargs = dict(TopicArn=MSG_PUBLISHER, Message=message)
+    if subject:
+        kwargs["Subject"] = subject
+    response = get_sns_client().publish(**kwargs)
+    logger.info(f"Message sent to topic {MSG_PUBLISHER}")
+    logger.debug(f"Message ID: {response['MessageId']}")
+    return response['MessageId']
+
+
+def publish_batch(entries: List[Tuple[str, str, str]]) -> Dict[str, Tuple[str | None, str | None]]:
+    """
+    Publishes up to 10 (entry id, message, subject) entries with one PublishBatch call.
+    Returns entry id -> (message id, error).
+    """
+    request_entries = []
+    for entry_id, message, subject in entries:
+        request_entry = {"Id": entry_id, "Message": message}
+        if subject:
+            request_entry["Subject"] = subject
+        request_entries.append(request_entry)
+
+    try:
+        response = get_sns_client().publish_batch(TopicArn=MSG_PUBLISHER, PublishBatchRequestEntries=request_entries)
+    except Exception as e:
+        logger.error(f"Error sending batch to topic {MSG_PUBLISHER}: {e}")
+        return {entry_id: (None, str(e)) for entry_id, _, _ in entries}
+
+    results = {}
+    for successful in response.get("Successful", []):
+        results[successful["Id"]] = (successful["MessageId"], None)
+    for failed in response.get("Failed", []):
+        logger.error(f"Error sending message {failed['Id']} to topic {MSG_PUBLISHER}: {failed.get('Message')}")
+        results[failed["Id"]] = (None, f"{failed.get('Code')}: {failed.get('Message')}")
+    logger.info(f"Batch of {len(entries)} sent to topic {MSG_PUBLISHER}, {len(response.get('Failed', []))} failed")
+    return results
+
+
+async def schedule_run(message, subject=None) -> str:
+    """
+    Publishes one schedule without blocking the event loop. Raises if SNS rejects it.
+    """
+    return await asyncio.to_thread(publish, message, subject)
+
+
+async def schedule_runs(entries: List[Tuple[str, str, str]]) -> Dict[str, Tuple[str | None, str | None]]:
+    """
+    Publishes many (entry id, message, subject) entries in SNS batches of 10, a few batches at a time.
+    Returns entry id -> (message id, error).
+    """
+    semaphore = asyncio.Semaphore(PUBLISH_BATCH_CONCURRENCY)
+
+    async def send(chunk):
+        async with semaphore:
+            return await asyncio.to_thread(publish_batch, chunk)
+
+    chunks = [entries[start:start + SNS_BATCH_SIZE] for start in range(0, len(entries), SNS_BATCH_SIZE)]
+    results = {}
+    for chunk_results in await asyncio.gather(*(send(chunk) for chunk in chunks)):
+        results.update(chunk_results)
+    return results
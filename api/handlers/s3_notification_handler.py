@@ -8,6 +8,7 @@ sys.path.append("/app")
 
 from api.config import REGION_NAME, SQS_QUEUE_NAME
 from api.crawlers.crawler_orchestrator import perform_due_diligence_v2
+from api.modules.schedule_ledger import run_schedule_once, IN_FLIGHT
 
 
 def schedule_run(topic_arn, message, subject=None):
@@ -53,6 +54,7 @@ async def listen_to_s3_notifications():
 
             for message in messages:
                 try:
+                    keep_message = False
                     body = json.loads(message['Body'])
                     # If the notification came via SNS, the S3 event is in the 'Message' body
                     if 'Sns' in body and 'Message' in body['Sns']:
@@ -72,7 +74,10 @@ async def listen_to_s3_notifications():
                         print(f"Message ID {msg_id}")
                         if msg_id and vendor_name:
                             print(f"Schedule Code should be implemented for {msg_id}")
-                            await perform_due_diligence_v2(body)
+                            claim = await run_schedule_once(msg_id, lambda: perform_due_diligence_v2(s3_msg))
+                            print(f"Schedule {msg_id}: {claim.outcome}")
+                            # Running on another worker: leave the message to come back after its visibility timeout
+                            keep_message = claim.outcome == IN_FLIGHT
                         else:
                             print(f"Could not find required info (vendor, schedule id) from the message")
                     elif subject == "Amazon S3 Notification":
@@ -87,6 +92,9 @@ async def listen_to_s3_notifications():
                                 print(f"  Bucket: {bucket_name}")
                                 print(f"  Object Key: {object_key}")
 
+                    if keep_message:
+                        continue
+
                     # Delete the message from the queue to prevent reprocessing
                     sqs.delete_message(
                         QueueUrl=queue_url,
@@ -1,53 +1,30 @@
 import sys
-import boto3
 import json
 import asyncio
 import logging
 
 sys.path.append("/app")
 
-from api.config import REGION_NAME, MSG_PUBLISHER, USE_LOCALSTACK, SQS_QUEUE_NAME, LOCAL_AWS_ENDPOINT_URL
+from api.config import MAX_CONCURRENT_SCHEDULES, SCHEDULE_LEASE_SECONDS
 from api.crawlers.crawler_orchestrator import perform_due_diligence_v2
 from api.logger_config import setup_logging
+from api.modules.aws_clients import get_sqs_client, get_queue_url
+from api.modules.schedule_ledger import run_schedule_once, Claim, CLAIMED, IN_FLIGHT
+from api.page_objects.resource_governor import resource_governor
 
 logger = logging.getLogger('listener')
 
-sqs = boto3.client(
-    "sqs",
-    region_name=REGION_NAME,
-    endpoint_url=f"{LOCAL_AWS_ENDPOINT_URL}" if USE_LOCALSTACK else None,
-)
+# Longest visibility timeout SQS accepts
+MAX_VISIBILITY_TIMEOUT = 12 * 60 * 60
+# How long the message of a failed run stays hidden before it is delivered again
+FAILED_RUN_RETRY_SECONDS = 60
 
-queue_url = sqs.get_queue_url(QueueName=SQS_QUEUE_NAME)['QueueUrl']
 
-
-def schedule_run(message, subject=None):
-    logger.debug(f"Using LocalStack {USE_LOCALSTACK}")
-    sns_client = boto3.client(
-        'sns',
-        region_name=REGION_NAME,
-        endpoint_url=f"{LOCAL_AWS_ENDPOINT_URL}" if USE_LOCALSTACK else None,
-    )
-
-    try:
-        if subject:
-            response = sns_client.publish(
-                TopicArn=MSG_PUBLISHER,
-                Message=message,
-                Subject=subject
-            )
-        else:
-            response = sns_client.publish(
-                TopicArn=MSG_PUBLISHER,
-                Message=message
-            )
-        logger.info(f"Message sent to topic {MSG_PUBLISHER}")
-        logger.debug(f"Message ID: {response['MessageId']}")
-    except Exception as e:
-        logger.error(f"Error sending message to topic {MSG_PUBLISHER}: {e}")
-
-
-async def process_message(message_body, message_id):
+async def process_message(message_body, message_id, on_lease_renewed=None) -> Claim | None:
+    """
+    Runs the schedule in the message. Returns None for a message that can't be parsed, which no redelivery
+    would fix; a run that fails raises.
+    """
     try:
         # SNS wraps your payload inside another JSON structure under "Message"
         outer = json.loads(message_body)
@@ -59,49 +36,77 @@ async def process_message(message_body, message_id):
         directors = payload["directors"]
         website_url = payload["website_url"]
         crawlers = payload["crawlers"]
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Discarding malformed message {message_id}: {e}")
+        return None
+
+    logger.debug(f"Received message with ID {message_id} for vendor: {vendor_name}")
+    logger.info(f"Schedule ID: {schedule_id}")
+    logger.info(f"Pages to process: {pages}")
+    logger.info(f"Directors for {vendor_name}: {directors}")
+    logger.info(f"Website URL of {vendor_name}: {website_url}")
+    logger.info(f"Crawlers chosen: {crawlers}")
+    logger.info(f"Deadline (minutes): {payload.get('deadline_minutes')}")
+
+    claim = await run_schedule_once(schedule_id, lambda: perform_due_diligence_v2(payload), on_lease_renewed)
+    if claim.outcome == CLAIMED:
+        logger.info(f"Completed processing message with ID {message_id}.")
+    else:
+        logger.info(f"Skipped message with ID {message_id}: schedule {schedule_id} is {claim.outcome}.")
+    return claim
 
-        logger.debug(f"Received message with ID {message_id} for vendor: {vendor_name}")
-        logger.info(f"Schedule ID: {schedule_id}")
-        logger.info(f"Pages to process: {pages}")
-        logger.info(f"Directors for {vendor_name}: {directors}")
-        logger.info(f"Website URL of {vendor_name}: {website_url}")
-        logger.info(f"Crawlers chosen: {crawlers}")
 
-        await perform_due_diligence_v2(payload)
-        logger.info(f"Completed processing message with ID {message_id}.")
+async def process_and_delete_message(sqs, queue_url, message):
+    def extend_visibility():
+        # Keep the message hidden while the schedule runs, so SQS doesn't hand it to another worker meanwhile
+        sqs.change_message_visibility(QueueUrl=queue_url, ReceiptHandle=message["ReceiptHandle"],
+                                      VisibilityTimeout=SCHEDULE_LEASE_SECONDS)
 
+    try:
+        claim = await process_message(message["Body"], message["MessageId"], extend_visibility)
     except Exception as e:
-        logger.error(f"Failed to process message: {e}")
+        logger.error(f"Failed to process message {message['MessageId']}: {e}")
+        # The ledger released the schedule; keep the message so its redelivery runs it again
+        await asyncio.to_thread(sqs.change_message_visibility, QueueUrl=queue_url,
+                                ReceiptHandle=message["ReceiptHandle"], VisibilityTimeout=FAILED_RUN_RETRY_SECONDS)
+        return
+    if claim is not None and claim.outcome == IN_FLIGHT:
+        # Another worker is running it: let the message come back once that worker's lease would run out,
+        # to take the schedule over if the worker died or to skip it once completed
+        visibility_timeout = min(int(claim.lease_remaining_seconds) + 1, MAX_VISIBILITY_TIMEOUT)
+        await asyncio.to_thread(sqs.change_message_visibility, QueueUrl=queue_url,
+                                ReceiptHandle=message["ReceiptHandle"], VisibilityTimeout=visibility_timeout)
+        return
+    await asyncio.to_thread(sqs.delete_message, QueueUrl=queue_url, ReceiptHandle=message["ReceiptHandle"])
 
 
 async def poll_messages():
-    logger.info("Polling for messages...")
+    logger.info(f"Polling for messages, running up to {MAX_CONCURRENT_SCHEDULES} schedule(s) at once...")
+    running = set()
 
     try:
+        sqs = get_sqs_client()
+        queue_url = get_queue_url()
         while True:
-            response = sqs.receive_message(
+            free_slots = MAX_CONCURRENT_SCHEDULES - len(running)
+            if free_slots <= 0:
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            # Receive off the event loop so schedules already running keep going during long polling
+            response = await asyncio.to_thread(
+                sqs.receive_message,
                 QueueUrl=queue_url,
-                MaxNumberOfMessages=1,
+                MaxNumberOfMessages=min(free_slots, 10),
                 WaitTimeSeconds=10  # Long polling
             )
 
             messages = response.get("Messages", [])
-            if not messages:
-                continue
-
-            tasks = []
-            to_delete = []
             for message in messages:
                 logger.info(f"Received message: {message['MessageId']}")
-                tasks.append(process_message(message["Body"], message["MessageId"]))
-                to_delete.append(message["ReceiptHandle"])
-            await asyncio.gather(*tasks)
-
-            for receipt_handle in to_delete:
-                sqs.delete_message(
-                    QueueUrl=queue_url,
-                    ReceiptHandle=receipt_handle
-                )
+                task = asyncio.create_task(process_and_delete_message(sqs, queue_url, message))
+                running.add(task)
+                task.add_done_callback(running.discard)
     except Exception as e:
         logger.error(f"Polling error: {e}")
         await asyncio.sleep(5)
@@ -109,4 +114,5 @@ async def poll_messages():
 
 if __name__ == "__main__":
     setup_logging()
+    resource_governor.reap_orphaned_chromium()
     asyncio.run(poll_messages())
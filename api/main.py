@@ -1,11 +1,27 @@
-import uvicorn
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
-from api.handlers.s3_notification_handler import listen_to_s3_notifications
+from api.config import CAPTURE_WARM_BROWSERS
+from api.modules.aws_clients import get_sns_client
 from api.routes.crawler import crawler_router
-from api.routes.websites import website_router
+from api.routes.websites import website_router, warm_capture_browsers, close_capture_browsers
 
-app = FastAPI()
 
-app.include_router(crawler_router)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Creating the client doesn't call AWS, so the API still boots when SNS/SQS aren't reachable
+    get_sns_client()
+    # Warmed in the background for the same reason: a missing or slow Chromium mustn't hold up startup
+    warm_up = asyncio.create_task(warm_capture_browsers()) if CAPTURE_WARM_BROWSERS > 0 else None
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
+    await close_capture_browsers()
+
 
+app = FastAPI(lifespan=lifespan)
+
+app.include_router(crawler_router)
+app.include_router(website_router)
@@ -0,0 +1,97 @@
+import json
+import logging
+import zipfile
+from typing import Callable, Dict, List
+
+from api.util.TextIndexUtils import TEXT_INDEX_NAME
+
+logger = logging.getLogger('Artifact Archive')
+
+ARCHIVE_NAME = "artifacts.zip"
+INDEX_NAME = "artifacts.index.json"
+# Kept as loose objects: the schedule manifest is where consumers start, and the search endpoint downloads
+# the text index on its own
+LOOSE_NAMES = ("schedule_manifest.json", TEXT_INDEX_NAME)
+
+PACKAGING_SCHEDULE = "SCHEDULE"
+PACKAGING_CATEGORY = "CATEGORY"
+
+# Fixed part of a zip local file header; the file name and extra field follow it
+LOCAL_HEADER_SIZE = 30
+
+
+def group_keys(schedule_id: str, keys: List[str], packaging: str) -> Dict[str, List[str]]:
+    """
+    Groups a schedule's keys by the prefix of the archive they go into: the schedule folder, or
+    with CATEGORY packaging the crawler category folder (`<schedule_id>/<category>`).
+    """
+    groups: Dict[str, List[str]] = {}
+    for key in sorted(keys):
+        relative_key = key[len(schedule_id) + 1:]
+        if relative_key in LOOSE_NAMES or relative_key.endswith(ARCHIVE_NAME) or relative_key.endswith(INDEX_NAME):
+            continue
+        prefix = schedule_id
+        if packaging == PACKAGING_CATEGORY and '/' in relative_key:
+            prefix = f"{schedule_id}/{relative_key.split('/', 1)[0]}"
+        groups.setdefault(prefix, []).append(key)
+    return groups
+
+
+def write_archive(writer, prefix: str, keys: List[str], read_bytes: Callable[[str], bytes]) -> Dict:
+    """
+    Writes `keys` uncompressed into a zip on `writer`, one member in memory at a time, and returns the
+    index of where each member's content starts. Members are stored rather than deflated so a member
+    is a plain byte range of the archive.
+    """
+    members = {}
+    with zipfile.ZipFile(writer, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for key in keys:
+            data = read_bytes(key)
+            if data is None:
+                continue
+            name = key[len(prefix) + 1:]
+            archive.writestr(name, data)
+            member = archive.getinfo(name)
+            members[name] = {
+                "offset": member.header_offset + LOCAL_HEADER_SIZE + len(member.filename.encode('utf-8')) + len(member.extra),
+                "size": member.file_size,
+            }
+    return {"archive": ARCHIVE_NAME, "members": members}
+
+
+def package_artifacts(schedule_id: str, keys: List[str], packaging: str, read_bytes: Callable[[str], bytes],
+                      open_writer, write_index: Callable[[str, str], None]) -> List[str]:
+    """
+    Packs the schedule's artifacts into `<prefix>/artifacts.zip` archives, each with an
+    `<prefix>/artifacts.index.json` next to it. `open_writer(key)` is a context manager for the archive
+    content. Returns the keys that were packed.
+    """
+    packed = []
+    for prefix, group in group_keys(schedule_id, keys, packaging).items():
+        archive_key = f"{prefix}/{ARCHIVE_NAME}"
+        logger.info(f"Packing {len(group)} artifacts into {archive_key}")
+        with open_writer(archive_key) as writer:
+            index = write_archive(writer, prefix, group, read_bytes)
+        write_index(f"{prefix}/{INDEX_NAME}", json.dumps(index, separators=(',', ':')))
+        packed.extend(group)
+    return packed
+
+
+def load_archive_index(s3_client, bucket_name: str, prefix: str) -> Dict:
+    response = s3_client.get_object(Bucket=bucket_name, Key=f"{prefix}/{INDEX_NAME}")
+    return json.loads(response['Body'].read())
+
+
+def read_archive_member(s3_client, bucket_name: str, prefix: str, index: Dict, name: str) -> bytes | None:
+    """
+    Reads one member of the archive under `prefix` with a single ranged GET.
+    `name` is relative to the prefix, e.g. `Hindi/3.pdf`. Returns None if the archive has no such member.
+    """
+    member = index["members"].get(name)
+    if member is None:
+        return None
+    if member["size"] == 0:
+        return b''
+    byte_range = f"bytes={member['offset']}-{member['offset'] + member['size'] - 1}"
+    response = s3_client.get_object(Bucket=bucket_name, Key=f"{prefix}/{index['archive']}", Range=byte_range)
+    return response['Body'].read()
@@ -0,0 +1,318 @@
+import asyncio
+import logging
+import os
+import shutil
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List
+
+from botocore.exceptions import ClientError
+
+from api.config import (
+    ARTIFACT_STORAGE, LOCAL_ARTIFACT_ROOT, CLEANUP_LOCAL_ARTIFACTS, S3_MULTIPART_PART_SIZE_MB, BUCKET_NAME,
+    ARTIFACT_PACKAGING
+)
+from api.handlers.s3_handler import upload_files_to_s3
+from api.modules.artifact_archive import package_artifacts
+from api.modules.aws_clients import get_s3_client
+
+logger = logging.getLogger('Artifact Storage')
+
+MB = 1024 * 1024
+S3_DELETE_BATCH_SIZE = 1000
+
+
+class ArtifactUploadError(Exception):
+    pass
+
+
+class ArtifactStorage(ABC):
+    """
+    Where a schedule's artifacts are written. Keys look like `<schedule_id>/<category>/<file name>`,
+    which is also their S3 object key.
+    """
+
+    @abstractmethod
+    def write_bytes(self, key: str, data: bytes):
+        pass
+
+    @abstractmethod
+    def open_writer(self, key: str):
+        """
+        Context manager yielding a binary writer for streaming content into `key`. Nothing is kept if the block raises.
+        """
+        pass
+
+    @abstractmethod
+    def read_bytes(self, key: str) -> bytes | None:
+        """
+        Returns the content stored at `key`, or None if there is none.
+        """
+        pass
+
+    @abstractmethod
+    def size(self, key: str) -> int | None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def list_keys(self, prefix: str) -> List[str]:
+        pass
+
+    @abstractmethod
+    async def finalize(self, schedule_id: str):
+        """
+        Makes the schedule's artifacts available in the bucket and releases anything held locally.
+        """
+        pass
+
+    def write_text(self, key: str, text: str):
+        self.write_bytes(key, text.encode('utf-8'))
+
+    def exists(self, key: str) -> bool:
+        return self.size(key) is not None
+
+    def package(self, schedule_id: str, open_archive_writer, write_index) -> List[str]:
+        """
+        Packs the schedule's artifacts into archives per ARTIFACT_PACKAGING and returns the keys that were packed.
+        """
+        return package_artifacts(schedule_id, self.list_keys(schedule_id), ARTIFACT_PACKAGING, self.read_bytes,
+                                 open_archive_writer, write_index)
+
+
+class LocalDiskStorage(ArtifactStorage):
+    """
+    Stages artifacts under a local folder and uploads them to S3 when the schedule finishes.
+    """
+
+    def __init__(self, root=LOCAL_ARTIFACT_ROOT, bucket_name=BUCKET_NAME, cleanup=CLEANUP_LOCAL_ARTIFACTS):
+        self.root = root
+        self.bucket_name = bucket_name
+        self.cleanup = cleanup
+
+    def local_path(self, key):
+        return os.path.join(self.root, key)
+
+    def write_bytes(self, key, data):
+        file_path = self.local_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as file:
+            file.write(data)
+
+    @contextmanager
+    def open_writer(self, key):
+        file_path = self.local_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        try:
+            with open(file_path, 'wb') as file:
+                yield file
+        except BaseException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
+    def read_bytes(self, key):
+        file_path = self.local_path(key)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'rb') as file:
+            return file.read()
+
+    def size(self, key):
+        file_path = self.local_path(key)
+        return os.path.getsize(file_path) if os.path.exists(file_path) else None
+
+    def delete(self, key):
+        file_path = self.local_path(key)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    def list_keys(self, prefix):
+        keys = []
+        for current_root, dirs, files in os.walk(self.local_path(prefix)):
+            for filename in files:
+                keys.append(os.path.relpath(os.path.join(current_root, filename), self.root).replace(os.sep, '/'))
+        return keys
+
+    def package_to_s3(self, schedule_id):
+        """
+        Streams the archives straight into the bucket and removes the packed files, leaving only the loose
+        ones for the regular upload.
+        """
+        s3_client = get_s3_client()
+        packed = self.package(
+            schedule_id,
+            lambda key: s3_object_writer(s3_client, self.bucket_name, key, S3_MULTIPART_PART_SIZE_MB * MB),
+            lambda key, text: s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=text.encode('utf-8')))
+        for key in packed:
+            self.delete(key)
+
+    async def finalize(self, schedule_id):
+        if ARTIFACT_PACKAGING != "NONE":
+            try:
+                await asyncio.to_thread(self.package_to_s3, schedule_id)
+            except Exception as e:
+                logger.error(f"Error packaging artifacts of {schedule_id}, uploading them unpacked: {e}")
+        logger.info("Uploading files to S3...")
+        uploaded = await upload_files_to_s3(self.bucket_name, schedule_id, self.root)
+        if not uploaded:
+            # Raised so the run fails and the schedule is released for its redelivery, rather than marked completed
+            raise ArtifactUploadError(f"Upload of {schedule_id} to S3 incomplete, keeping {self.local_path(schedule_id)}")
+        logger.info("Upload to S3 complete")
+        if self.cleanup:
+            logger.info("Cleaning up local file system")
+            shutil.rmtree(self.local_path(schedule_id), ignore_errors=True)
+
+
+class S3MultipartWriter:
+    """
+    Streams content into an S3 object holding at most one part in memory. Small content goes up with a
+    single PutObject; a multipart upload is only started once the content outgrows one part.
+    """
+
+    def __init__(self, s3_client, bucket_name, key, part_size):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = []
+        self.written = 0
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.written += len(data)
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def tell(self):
+        # zipfile records member offsets from this; without seek() it writes the archive as a stream
+        return self.written
+
+    def flush(self):
+        # Parts are uploaded as they fill up; whatever is buffered goes up in complete()
+        pass
+
+    def _upload_part(self, data):
+        if self.upload_id is None:
+            self.upload_id = self.s3_client.create_multipart_upload(Bucket=self.bucket_name, Key=self.key)['UploadId']
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id,
+                                              PartNumber=part_number, Body=data)
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
+    def complete(self):
+        if self.upload_id is None:
+            self.s3_client.put_object(Bucket=self.bucket_name, Key=self.key, Body=bytes(self.buffer))
+        else:
+            if self.buffer:
+                self._upload_part(bytes(self.buffer))
+            self.s3_client.complete_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id,
+                                                     MultipartUpload={'Parts': self.parts})
+        self.buffer = bytearray()
+
+    def abort(self):
+        self.buffer = bytearray()
+        if self.upload_id is not None:
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id)
+            except Exception as e:
+                logger.error(f"Error aborting multipart upload of {self.key}: {e}")
+
+
+@contextmanager
+def s3_object_writer(s3_client, bucket_name, key, part_size):
+    writer = S3MultipartWriter(s3_client, bucket_name, key, part_size)
+    try:
+        yield writer
+    except BaseException:
+        writer.abort()
+        raise
+    writer.complete()
+
+
+class S3StreamingStorage(ArtifactStorage):
+    """
+    Writes artifacts straight to S3; nothing is staged on local disk.
+    """
+
+    def __init__(self, bucket_name=BUCKET_NAME, part_size=S3_MULTIPART_PART_SIZE_MB * MB):
+        self.bucket_name = bucket_name
+        self.part_size = part_size
+        self.s3_client = get_s3_client()
+
+    def write_bytes(self, key, data):
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=data)
+
+    def open_writer(self, key):
+        return s3_object_writer(self.s3_client, self.bucket_name, key, self.part_size)
+
+    def read_bytes(self, key):
+        try:
+            return self.s3_client.get_object(Bucket=self.bucket_name, Key=key)['Body'].read()
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+
+    def size(self, key):
+        try:
+            return self.s3_client.head_object(Bucket=self.bucket_name, Key=key)['ContentLength']
+        except ClientError:
+            return None
+
+    def delete(self, key):
+        self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+
+    def list_keys(self, prefix):
+        keys = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"{prefix}/"):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return keys
+
+    def package_in_place(self, schedule_id):
+        packed = self.package(schedule_id, self.open_writer, self.write_text)
+        for start in range(0, len(packed), S3_DELETE_BATCH_SIZE):
+            batch = packed[start:start + S3_DELETE_BATCH_SIZE]
+            self.s3_client.delete_objects(Bucket=self.bucket_name,
+                                          Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True})
+
+    async def finalize(self, schedule_id):
+        if ARTIFACT_PACKAGING != "NONE":
+            try:
+                await asyncio.to_thread(self.package_in_place, schedule_id)
+            except Exception as e:
+                logger.error(f"Error packaging artifacts of {schedule_id}, leaving them unpacked: {e}")
+        logger.info(f"Artifacts for {schedule_id} were streamed to s3://{self.bucket_name}, nothing to upload")
+
+
+_schedule_storages: Dict[str, ArtifactStorage] = {}
+
+
+def create_storage() -> ArtifactStorage:
+    if ARTIFACT_STORAGE == "S3":
+        return S3StreamingStorage()
+    return LocalDiskStorage()
+
+
+def open_schedule_storage(schedule_id) -> ArtifactStorage:
+    storage = create_storage()
+    _schedule_storages[schedule_id] = storage
+    return storage
+
+
+def get_schedule_storage(schedule_id) -> ArtifactStorage:
+    """
+    Storage the schedule was opened with; a fresh default one for work outside a schedule.
+    """
+    storage = _schedule_storages.get(schedule_id)
+    return storage if storage is not None else create_storage()
+
+
+def close_schedule_storage(schedule_id):
+    _schedule_storages.pop(schedule_id, None)
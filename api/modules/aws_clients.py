@@ -0,0 +1,45 @@
+import logging
+from functools import lru_cache
+
+from api.config import (
+    AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, REGION_NAME, USE_LOCALSTACK, LOCAL_AWS_ENDPOINT_URL, SQS_QUEUE_NAME
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Clients are created on first use and shared; boto3 clients are thread safe. boto3 is imported here rather than
+# at module level so that importing the API doesn't pay for it until a client is actually needed.
+
+def _create_client(service_name, **kwargs):
+    import boto3
+
+    logger.debug(f"Creating {service_name} client, using LocalStack: {USE_LOCALSTACK}")
+    return boto3.client(
+        service_name,
+        region_name=REGION_NAME,
+        endpoint_url=f"{LOCAL_AWS_ENDPOINT_URL}" if USE_LOCALSTACK else None,
+        **kwargs,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_sns_client():
+    return _create_client('sns')
+
+
+@lru_cache(maxsize=None)
+def get_sqs_client():
+    return _create_client('sqs')
+
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY:
+        raise RuntimeError("Cannot proceed with S3 due to required ID and/or KEY missing!!")
+    return _create_client('s3', aws_access_key_id=AWS_ACCESS_KEY_ID, aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
+
+
+@lru_cache(maxsize=None)
+def get_queue_url(queue_name=SQS_QUEUE_NAME):
+    return get_sqs_client().get_queue_url(QueueName=queue_name)['QueueUrl']
@@ -1,11 +1,7 @@
-import os
 import logging
 
-import boto3
 from botocore.exceptions import ClientError
-from api.config import (
-    AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, REGION_NAME, USE_LOCALSTACK, LOCAL_AWS_ENDPOINT_URL
-)
+from api.modules.aws_clients import get_s3_client
 
 logger = logging.getLogger(__name__)
 
@@ -13,18 +9,9 @@ logger = logging.getLogger(__name__)
 class S3Handler:
     def __init__(self):
         """
-        Initializes the S3Handler with AWS credentials and region.
+        Initializes the S3Handler with the shared S3 client.
         """
-        if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY:
-            raise RuntimeError(f"Cannot proceed with S3 due to required ID and/or KEY missing!!")
-
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=REGION_NAME,
-            endpoint_url=f"{LOCAL_AWS_ENDPOINT_URL}" if USE_LOCALSTACK else None,
-        )
+        self.s3_client = get_s3_client()
 
     def list_buckets(self):
         """
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict
+
+from api.config import SCHEDULE_LEDGER, SCHEDULE_LEDGER_PATH, SCHEDULE_LEASE_SECONDS
+
+logger = logging.getLogger('Schedule Ledger')
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Outcomes of asking to run a schedule
+CLAIMED = "claimed"
+ALREADY_COMPLETED = "already completed"
+IN_FLIGHT = "in flight"
+ATTACHED = "attached"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Claim:
+
+    def __init__(self, outcome, lease_remaining_seconds=0.0):
+        self.outcome = outcome
+        # For IN_FLIGHT: how long until the other worker's lease runs out if it isn't renewed
+        self.lease_remaining_seconds = lease_remaining_seconds
+
+
+class ScheduleLedger(ABC):
+    """
+    Records which worker runs which schedule, so a schedule delivered more than once runs once.
+    A claim is a lease: the holder renews it while running, and a lease that isn't renewed (dead worker)
+    can be claimed by another worker.
+    """
+
+    @abstractmethod
+    def claim(self, schedule_id: str, worker_id: str, lease_seconds: float) -> Claim:
+        """
+        Atomically takes the schedule unless it is completed or another worker holds a live lease on it.
+        """
+        pass
+
+    @abstractmethod
+    def renew(self, schedule_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """
+        Extends the worker's lease. False if the worker no longer holds it.
+        """
+        pass
+
+    @abstractmethod
+    def complete(self, schedule_id: str, worker_id: str):
+        pass
+
+    @abstractmethod
+    def release(self, schedule_id: str, worker_id: str):
+        """
+        Gives up the lease after a failed run so a redelivery can claim the schedule again.
+        """
+        pass
+
+
+class SqliteScheduleLedger(ScheduleLedger):
+    """
+    Ledger in a SQLite file. Shared by the workers of one host; a shared database is needed to cover workers
+    on several hosts.
+    """
+
+    def __init__(self, db_path=SCHEDULE_LEDGER_PATH):
+        self.db_path = db_path
+        with self.connect() as connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS schedules(
+                schedule_id TEXT PRIMARY KEY, status TEXT NOT NULL, worker_id TEXT, lease_expires_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)""")
+
+    def connect(self):
+        # Autocommit mode, so BEGIN IMMEDIATE below takes the write lock before the row is read
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def claim(self, schedule_id, worker_id, lease_seconds):
+        now = time.time()
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute("SELECT status, worker_id, lease_expires_at FROM schedules WHERE schedule_id = ?",
+                                     (schedule_id,)).fetchone()
+            if row is not None:
+                status, holder, lease_expires_at = row
+                if status == COMPLETED:
+                    connection.execute("ROLLBACK")
+                    return Claim(ALREADY_COMPLETED)
+                if status == RUNNING and holder != worker_id and lease_expires_at > now:
+                    connection.execute("ROLLBACK")
+                    return Claim(IN_FLIGHT, lease_expires_at - now)
+                if status == RUNNING and holder != worker_id:
+                    logger.info(f"Lease of {holder} on {schedule_id} expired, taking over")
+            connection.execute("""INSERT INTO schedules(schedule_id, status, worker_id, lease_expires_at, attempts, updated_at)
+                                  VALUES (?, ?, ?, ?, 1, ?)
+                                  ON CONFLICT(schedule_id) DO UPDATE SET status = excluded.status,
+                                      worker_id = excluded.worker_id, lease_expires_at = excluded.lease_expires_at,
+                                      attempts = attempts + 1, updated_at = excluded.updated_at""",
+                               (schedule_id, RUNNING, worker_id, now + lease_seconds, now))
+            connection.execute("COMMIT")
+            return Claim(CLAIMED)
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def update_holder(self, schedule_id, worker_id, status, lease_expires_at) -> bool:
+        connection = self.connect()
+        try:
+            cursor = connection.execute("""UPDATE schedules SET status = ?, lease_expires_at = ?, updated_at = ?
+                                           WHERE schedule_id = ? AND worker_id = ? AND status = ?""",
+                                        (status, lease_expires_at, time.time(), schedule_id, worker_id, RUNNING))
+            return cursor.rowcount == 1
+        finally:
+            connection.close()
+
+    def renew(self, schedule_id, worker_id, lease_seconds):
+        return self.update_holder(schedule_id, worker_id, RUNNING, time.time() + lease_seconds)
+
+    def complete(self, schedule_id, worker_id):
+        if not self.update_holder(schedule_id, worker_id, COMPLETED, None):
+            logger.error(f"Completed {schedule_id} without holding its lease")
+
+    def release(self, schedule_id, worker_id):
+        self.update_holder(schedule_id, worker_id, FAILED, None)
+
+
+class NoScheduleLedger(ScheduleLedger):
+    """
+    Every claim succeeds; duplicates are only caught within one process.
+    """
+
+    def claim(self, schedule_id, worker_id, lease_seconds):
+        return Claim(CLAIMED)
+
+    def renew(self, schedule_id, worker_id, lease_seconds):
+        return True
+
+    def complete(self, schedule_id, worker_id):
+        pass
+
+    def release(self, schedule_id, worker_id):
+        pass
+
+
+_ledger: ScheduleLedger | None = None
+_in_flight: Dict[str, asyncio.Future] = {}
+
+
+def get_schedule_ledger() -> ScheduleLedger:
+    global _ledger
+    if _ledger is None:
+        _ledger = SqliteScheduleLedger() if SCHEDULE_LEDGER == "SQLITE" else NoScheduleLedger()
+    return _ledger
+
+
+async def keep_lease(ledger: ScheduleLedger, schedule_id, on_renew: Callable[[], None] = None):
+    while True:
+        await asyncio.sleep(SCHEDULE_LEASE_SECONDS / 3)
+        try:
+            if not await asyncio.to_thread(ledger.renew, schedule_id, WORKER_ID, SCHEDULE_LEASE_SECONDS):
+                # Renewing can't succeed again, and the message must be left to the worker now holding the lease
+                logger.error(f"Lost the lease on {schedule_id}; another worker may run it too")
+                return
+            if on_renew is not None:
+                await asyncio.to_thread(on_renew)
+        except Exception as e:
+            logger.error(f"Error renewing the lease on {schedule_id}: {e}")
+
+
+async def run_schedule_once(schedule_id, run, on_renew: Callable[[], None] = None) -> Claim:
+    """
+    Awaits `run()` while holding the schedule's lease, renewing it (and calling `on_renew`) as it goes until
+    the lease is lost.
+    A schedule this process is already running is waited for instead (ATTACHED); one that is completed or
+    leased by another worker isn't run.
+    """
+    running = _in_flight.get(schedule_id)
+    if running is not None:
+        logger.info(f"{schedule_id} is already running in this worker, waiting for it")
+        await asyncio.shield(running)
+        return Claim(ATTACHED)
+
+    # Registered before claiming, so a copy arriving while the claim is in progress waits for this one
+    finished = asyncio.get_running_loop().create_future()
+    _in_flight[schedule_id] = finished
+    heartbeat = None
+    try:
+        ledger = get_schedule_ledger()
+        claim = await asyncio.to_thread(ledger.claim, schedule_id, WORKER_ID, SCHEDULE_LEASE_SECONDS)
+        if claim.outcome != CLAIMED:
+            logger.info(f"Not running {schedule_id}: {claim.outcome}")
+            return claim
+        heartbeat = asyncio.create_task(keep_lease(ledger, schedule_id, on_renew))
+        try:
+            await run()
+        except BaseException:
+            await asyncio.to_thread(ledger.release, schedule_id, WORKER_ID)
+            raise
+        await asyncio.to_thread(ledger.complete, schedule_id, WORKER_ID)
+        return claim
+    finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
+        _in_flight.pop(schedule_id, None)
+        finished.set_result(None)
@@ -0,0 +1,283 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from api.config import (
+    PACKETSTREAM_USERNAME, PACKETSTREAM_PASSWORD, CAPTURE_MAX_CONCURRENCY, CAPTURE_WARM_BROWSERS,
+    CAPTURE_BROWSER_MAX_PAGES, CAPTURE_TIMEOUT_SECONDS, CAPTURE_CACHE_TTL_SECONDS, CAPTURE_CACHE_SIZE,
+    CAPTURE_CACHE_MAX_MB
+)
+from api.page_objects.google_crawler_page import (
+    get_browser, get_browser_with_proxy, intercept_request, download_pdf, render_result, finalize_fetched_pdf
+)
+from api.page_objects.resource_governor import resource_governor
+from api.util.AddressUtils import LOCAL_SCHEMES, BlockedAddressError, ResponseAddressWatch, check_public_url
+from api.util.DownloadUtils import MB
+
+logger = logging.getLogger('Capture')
+
+CAPTURE_PREFIX = "captures"
+BROWSER_CHECK_SECONDS = 2
+
+
+class CaptureBusyError(Exception):
+    pass
+
+
+class CaptureResult:
+
+    def __init__(self, url, pdf_bytes, text, partial):
+        self.url = url
+        self.pdf_bytes = pdf_bytes
+        self.text = text
+        self.partial = partial
+        self.captured_at = datetime.datetime.now(datetime.timezone.utc)
+        # Set once the capture has been uploaded
+        self.pdf_key = None
+        self.text_key = None
+
+    def size(self):
+        # What the capture holds in memory, counting the text a byte per character
+        return len(self.pdf_bytes) + len(self.text or '')
+
+    def upload(self, storage):
+        if self.pdf_key is not None:
+            return
+        base_key = (f"{CAPTURE_PREFIX}/{hashlib.sha256(self.url.encode('utf-8')).hexdigest()[:32]}/"
+                    f"{self.captured_at.strftime('%Y%m%dT%H%M%SZ')}")
+        storage.write_bytes(f"{base_key}.pdf", self.pdf_bytes)
+        if self.text is not None:
+            storage.write_text(f"{base_key}.txt", self.text)
+            self.text_key = f"{base_key}.txt"
+        self.pdf_key = f"{base_key}.pdf"
+
+
+class WarmBrowser:
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages = 0
+
+
+class BrowserPool:
+    """
+    Browsers kept launched between captures, so a capture only has to open a page. Each capture gets a
+    browser to itself and a fresh incognito context; a browser is retired after CAPTURE_BROWSER_MAX_PAGES
+    captures, or once it stops answering (e.g. recycled by the resource governor).
+    """
+
+    def __init__(self, launch, use_proxy, size):
+        self.launch = launch
+        self.use_proxy = use_proxy
+        self.size = size
+        self.idle: List[WarmBrowser] = []
+
+    async def warm(self, count):
+        while len(self.idle) < min(count, self.size):
+            await resource_governor.ensure_host_memory()
+            self.idle.append(WarmBrowser(await self.launch()))
+
+    async def is_alive(self, warm_browser: WarmBrowser) -> bool:
+        try:
+            await asyncio.wait_for(warm_browser.browser.version(), timeout=BROWSER_CHECK_SECONDS)
+            return True
+        except Exception:
+            return False
+
+    async def acquire(self) -> WarmBrowser:
+        while self.idle:
+            warm_browser = self.idle.pop()
+            if await self.is_alive(warm_browser):
+                return warm_browser
+            await resource_governor.close_browser(warm_browser.browser)
+        await resource_governor.ensure_host_memory()
+        logger.info(f"Launching a {'proxied' if self.use_proxy else 'direct'} capture browser")
+        return WarmBrowser(await self.launch())
+
+    async def release(self, warm_browser: WarmBrowser):
+        warm_browser.pages += 1
+        if warm_browser.pages >= CAPTURE_BROWSER_MAX_PAGES or len(self.idle) >= self.size:
+            await resource_governor.close_browser(warm_browser.browser)
+        else:
+            self.idle.append(warm_browser)
+
+    async def close(self):
+        idle, self.idle = self.idle, []
+        for warm_browser in idle:
+            await resource_governor.close_browser(warm_browser.browser)
+
+    async def guard_request(self, request):
+        """
+        Aborts requests to hosts that aren't on public addresses; the proxied pool also drops the resource types
+        crawls drop.
+        """
+        if urlsplit(request.url).scheme not in LOCAL_SCHEMES:
+            try:
+                await check_public_url(request.url)
+            except BlockedAddressError as e:
+                logger.warning(f"Blocked capture request to {request.url}: {e}")
+                await request.abort('addressunreachable')
+                return
+        if self.use_proxy:
+            await intercept_request(request)
+        else:
+            await request.continue_()
+
+    async def capture(self, url) -> CaptureResult:
+        warm_browser = await self.acquire()
+        try:
+            async with resource_governor.govern(warm_browser.browser):
+                context = await warm_browser.browser.createIncognitoBrowserContext()
+                try:
+                    page = await context.newPage()
+                    # Every request is checked, redirects and subresources included, not only the captured URL
+                    await page.setRequestInterception(True)
+                    page.on('request', lambda request: asyncio.create_task(self.guard_request(request)))
+                    # Proxied requests are resolved and connected by the proxy, away from this host's network
+                    address_watch = None if self.use_proxy else ResponseAddressWatch(page)
+                    if self.use_proxy:
+                        await page.authenticate({"username": f"{PACKETSTREAM_USERNAME}",
+                                                 "password": f"{PACKETSTREAM_PASSWORD}"})
+                    pdf_bytes, text = await render_result(page, url, None, None, CAPTURE_TIMEOUT_SECONDS,
+                                                          CAPTURE_TIMEOUT_SECONDS)
+                    if address_watch is not None:
+                        # Nothing served from a host that rebound to a private address is returned
+                        address_watch.check()
+                finally:
+                    await context.close()
+        finally:
+            await self.release(warm_browser)
+        if text is not None:
+            return CaptureResult(url, pdf_bytes, text, False)
+        finalized = await finalize_fetched_pdf(pdf_bytes, extract_text=True)
+        return CaptureResult(url, finalized.content, finalized.text, False)
+
+
+class CaptureCache:
+    """
+    Captures by URL for CAPTURE_CACHE_TTL_SECONDS, least recently used dropped first. Bounded by the number of
+    captures and by their total size; a capture larger than the whole budget isn't cached.
+    """
+
+    def __init__(self, ttl_seconds, max_entries, max_bytes):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: OrderedDict[Tuple[str, bool], Tuple[float, CaptureResult]] = OrderedDict()
+
+    def get(self, key) -> CaptureResult | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            self.remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return result
+
+    def remove(self, key):
+        _, result = self.entries.pop(key)
+        self.size -= result.size()
+
+    def put(self, key, result: CaptureResult):
+        if key in self.entries:
+            self.remove(key)
+        if result.size() > self.max_bytes:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, result)
+        self.size += result.size()
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+
+
+_pools = {
+    False: BrowserPool(get_browser, False, CAPTURE_MAX_CONCURRENCY),
+    True: BrowserPool(get_browser_with_proxy, True, CAPTURE_MAX_CONCURRENCY),
+}
+_cache = CaptureCache(CAPTURE_CACHE_TTL_SECONDS, CAPTURE_CACHE_SIZE, CAPTURE_CACHE_MAX_MB * MB)
+_in_flight: Dict[Tuple[str, bool], asyncio.Future] = {}
+_slots = asyncio.Semaphore(CAPTURE_MAX_CONCURRENCY)
+
+
+def cache_key(url, use_proxy):
+    # The fragment never reaches the server
+    return urlsplit(url)._replace(fragment='').geturl(), use_proxy
+
+
+async def fetch_capture(url, use_proxy) -> CaptureResult:
+    if urlsplit(url).path.lower().endswith('.pdf'):
+        cancelled = threading.Event()
+        try:
+            pdf_bytes, partial = await asyncio.wait_for(
+                asyncio.to_thread(download_pdf, url, cancelled, use_proxy, public_only=True),
+                timeout=CAPTURE_TIMEOUT_SECONDS)
+        finally:
+            cancelled.set()
+        finalized = await finalize_fetched_pdf(pdf_bytes, cover=True, partial=partial, extract_text=True)
+        return CaptureResult(url, finalized.content, finalized.text, finalized.partial)
+    return await _pools[use_proxy].capture(url)
+
+
+async def capture_url(url, use_proxy=False) -> Tuple[CaptureResult, bool]:
+    """
+    Captures `url` as a PDF with its text. Served from the cache when it was captured recently, and a
+    capture of the same URL already under way is shared. Returns the capture and whether it came from
+    the cache (a shared capture is fresh, so it didn't); raises CaptureBusyError when every capture slot is taken.
+    """
+    key = cache_key(url, use_proxy)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached, True
+    running = _in_flight.get(key)
+    if running is not None:
+        return await asyncio.shield(running), False
+    if _slots.locked():
+        raise CaptureBusyError(f"All {CAPTURE_MAX_CONCURRENCY} capture slots are busy")
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key] = future
+    try:
+        async with _slots:
+            started_at = time.perf_counter()
+            result = await fetch_capture(url, use_proxy)
+            logger.info(f"Captured {url} in {time.perf_counter() - started_at:.1f}s")
+        _cache.put(key, result)
+        future.set_result(result)
+        return result, False
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Waiters, if any, get the error; otherwise it shouldn't be reported as never retrieved
+        future.exception()
+        raise
+    finally:
+        _in_flight.pop(key, None)
+
+
+async def upload_capture(result: CaptureResult):
+    from api.modules.artifact_storage import S3StreamingStorage
+
+    await asyncio.to_thread(result.upload, S3StreamingStorage())
+
+
+async def warm_capture_browsers():
+    try:
+        await _pools[False].warm(CAPTURE_WARM_BROWSERS)
+        logger.info(f"{len(_pools[False].idle)} capture browser(s) warmed up")
+    except Exception as e:
+        logger.error(f"Error warming up capture browsers: {e}")
+
+
+async def close_capture_browsers():
+    for pool in _pools.values():
+        await pool.close()
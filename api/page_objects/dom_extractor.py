@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+from os import path
+
+logger = logging.getLogger('DOM Extractor')
+
+# Runs inside the page. Boilerplate inside the chosen content root is hidden while innerText is read
+# (so block layout still yields line breaks) and restored before the archival PDF is rendered.
+EXTRACT_CONTENT_SCRIPT = '''() => {
+    const firstValue = (selectors) => {
+        for (const selector of selectors) {
+            const element = document.querySelector(selector);
+            if (element) {
+                const value = element.getAttribute('content') || element.getAttribute('datetime') || element.textContent;
+                if (value && value.trim()) {
+                    return value.trim();
+                }
+            }
+        }
+        return null;
+    };
+
+    const jsonLdDate = () => {
+        for (const script of document.querySelectorAll('script[type="application/ld+json"]')) {
+            try {
+                const data = JSON.parse(script.textContent);
+                const items = Array.isArray(data) ? data : (data['@graph'] || [data]);
+                for (const item of items) {
+                    if (item && item.datePublished) {
+                        return item.datePublished;
+                    }
+                }
+            } catch (e) {}
+        }
+        return null;
+    };
+
+    let root = document.body;
+    for (const selector of ['article', 'main', '[role="main"]', '#content', '.content']) {
+        const candidate = document.querySelector(selector);
+        if (candidate && candidate.innerText && candidate.innerText.trim().length > 500) {
+            root = candidate;
+            break;
+        }
+    }
+
+    const hidden = [];
+    if (root) {
+        root.querySelectorAll('script, style, noscript, nav, header, footer, aside, form, iframe, svg, ' +
+                              '[role="navigation"], [role="banner"], [role="contentinfo"], [aria-hidden="true"]')
+            .forEach((element) => {
+                hidden.push([element, element.style.display]);
+                element.style.display = 'none';
+            });
+    }
+    const text = root ? root.innerText : '';
+    hidden.forEach(([element, display]) => { element.style.display = display; });
+
+    const links = [];
+    const seen = new Set();
+    for (const anchor of document.querySelectorAll('a[href]')) {
+        const href = anchor.href;
+        if (!href.startsWith('http') || seen.has(href)) {
+            continue;
+        }
+        try {
+            if (new URL(href).host === location.host) {
+                continue;
+            }
+        } catch (e) {
+            continue;
+        }
+        seen.add(href);
+        links.push({url: href, text: (anchor.innerText || '').trim()});
+    }
+
+    return {
+        url: location.href,
+        title: firstValue(['meta[property="og:title"]', 'meta[name="twitter:title"]']) || document.title || firstValue(['h1']),
+        published: firstValue(['meta[property="article:published_time"]', 'meta[name="pubdate"]',
+                                'meta[name="publishdate"]', 'meta[name="date"]', 'meta[itemprop="datePublished"]',
+                                'time[datetime]']) || jsonLdDate(),
+        text: text,
+        links: links,
+    };
+}'''
+
+
+def format_extracted_content(content: dict) -> str:
+    lines = [
+        f"Title: {content.get('title') or ''}",
+        f"Published: {content.get('published') or 'Unknown'}",
+        f"URL: {content.get('url') or ''}",
+        '',
+        (content.get('text') or '').strip(),
+    ]
+    links = content.get('links') or []
+    if links:
+        lines.extend(['', 'Outbound links:'])
+        lines.extend(f"{link['url']} {link['text']}".strip() for link in links)
+    return '\n'.join(lines) + '\n'
+
+
+async def extract_content_from_dom(page):
+    """
+    Extracts title, publish date, main content text and outbound links from the live page.
+
+    Returns the extracted content, or None when the page could not be read.
+    """
+    try:
+        return await page.evaluate(EXTRACT_CONTENT_SCRIPT)
+    except Exception as e:
+        logger.error(f'Error extracting content from DOM: {e}')
+        return None
+
+
+async def write_extracted_content(storage, pdf_key: str, content, write_sidecar=False):
+    """
+    Writes extracted content next to the PDF as `<file_number>.txt` (and `<file_number>.json` when
+    `write_sidecar` is set).
+    """
+    base_key = path.splitext(pdf_key)[0]
+    text_key = base_key + '.txt'
+    await asyncio.to_thread(storage.write_text, text_key, format_extracted_content(content))
+    if write_sidecar:
+        await asyncio.to_thread(storage.write_text, base_key + '.json', json.dumps(content, ensure_ascii=False, indent=4))
+    logger.info(f"Text extracted from DOM and saved to {text_key}")
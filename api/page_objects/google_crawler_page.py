@@ -1,42 +1,77 @@
+import io
 import json
-import os.path
-import ssl
 from contextlib import asynccontextmanager
 from bs4 import BeautifulSoup
-from typing import Dict
-from typing import Set
+from typing import Callable, Dict
+from typing import List
+from urllib.parse import quote
 from pyppeteer.errors import PageError, TimeoutError, NetworkError
 from pyppeteer_stealth import stealth
-from urllib.request import urlopen
 from api.config import DEFAULT_SEARCH_ENGINE_URL, PACKETSTREAM_USERNAME, PACKETSTREAM_PASSWORD, PACKETSTREAM_PROXY_DOMAIN, PACKETSTREAM_HTTPS_PORT, PACKETSTREAM_HTTP_PORT
+from api.config import TEXT_EXTRACTION_MODE, WRITE_TEXT_SIDECAR
+from api.config import PDF_OPTIMIZATION_ENABLED, PDF_OPTIMIZATION_IMAGE_DPI, PDF_OPTIMIZATION_IMAGE_QUALITY
+from api.config import DEFERRED_RETRY_ROUNDS
+from api.config import LARGE_PDF_THRESHOLD_MB, PARTIAL_PDF_BYTES_MB, PARTIAL_PDF_MAX_PAGES
 from pyppeteer import launch
 from asyncio import TimeoutError as ForcedTimeoutError
-from os import path, makedirs
+from os import path
 import asyncio
 import logging
-import fitz
-import pymupdf
 import datetime
+import threading
 import humanize
-from pymupdf import utils
 
+from api.modules.artifact_storage import ArtifactStorage, get_schedule_storage
+from api.util.BandwidthUtils import PROXIED, DIRECT, DownloadMeter, get_schedule_bandwidth_meter, meter_page
+from api.page_objects.dom_extractor import extract_content_from_dom, format_extracted_content, write_extracted_content
+from api.page_objects.resource_governor import resource_governor, HostMemoryExhaustedError
+from api.util.BudgetUtils import SearchBudget, new_search_budget, NOT_FETCHED_DEADLINE
+from api.util.FairScheduler import fair_scheduler, BROWSER_PAGE, PDF_DOWNLOAD, TEXT_EXTRACTION
 from api.util.ManifestUtils import Manifest, ManifestEntry
+from api.util.DownloadUtils import MB, build_url_opener, probe_pdf, download_document
+from api.util.PdfUtils import FinalizedPdf, finalize_pdf, run_in_pdf_pool
+from api.util.RelevanceUtils import SearchResult, rank_search_results
+from api.util.RetryUtils import (
+    RetryPolicy, HttpStatusError, DeferredRetry, RETRYABLE_STATUSES, is_retryable, get_schedule_retry_queue
+)
+from api.util.TextIndexUtils import get_schedule_text_index
 
 logger = logging.getLogger('Google Page')
 
-async def extract_urls(page) -> Set[str]:
+async def extract_urls(page) -> List[SearchResult]:
+    """
+    Extracts the results on the current CSE page in the order shown, with title and snippet.
+    Ranks are relative to the page; the caller offsets them across pages.
+    """
     try:
         await page.waitForSelector('body')
         content = await page.content()
         soup = BeautifulSoup(content, "html.parser")
-        list_anchors = []
-        for anchor in soup.find_all("a", {'class': 'gs-title'}, href=True):
-            list_anchors.append(anchor['href'])
-
-        return set(list_anchors)
+        search_results = []
+        for result in soup.find_all("div", {'class': 'gsc-webResult'}):
+            anchor = result.find("a", {'class': 'gs-title'}, href=True)
+            if anchor is None:
+                continue
+            snippet = result.find("div", {'class': 'gs-snippet'})
+            search_results.append(SearchResult(anchor['href'], len(search_results) + 1,
+                                               anchor.get_text(" ", strip=True),
+                                               snippet.get_text(" ", strip=True) if snippet else ''))
+
+        if not search_results:
+            for anchor in soup.find_all("a", {'class': 'gs-title'}, href=True):
+                search_results.append(SearchResult(anchor['href'], len(search_results) + 1,
+                                                   anchor.get_text(" ", strip=True)))
+        return search_results
     except Exception as e:
         logger.error(f'Error extracting URLs: {e}')
-        return set()
+        return []
+
+
+def add_search_results(search_results: Dict[str, SearchResult], page_results: List[SearchResult]):
+    for result in page_results:
+        if result.url not in search_results:
+            result.rank = len(search_results) + 1
+            search_results[result.url] = result
 
 
 async def can_paginate(page):
@@ -72,55 +107,91 @@ async def intercept_request (request):
         await request.continue_()
 
 
-async def extract_text_from_pdf(pdf_path: str):
-    try:
-        if os.path.exists(pdf_path):
-            file_size_in_bytes = os.path.getsize(pdf_path)
-            file_size = humanize.naturalsize(file_size_in_bytes)
-            logger.info (f'Extracting text from PDF may take some time depending on the size of the PDF. Size: {file_size}')
-            doc = fitz.open(pdf_path)
-            text_file_path = path.splitext(pdf_path)[0] + '.txt'
-            with open(text_file_path, 'w') as text_file:
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text_file.write(page.get_text())
-            logger.info(f"Text extracted and saved to {text_file_path}")
-    except Exception as e:
-        logger.error(f"Error extracting text from {pdf_path}: {e}")
-
-
-async def create_manifest_for_urls(urls: Set, category: str):
-    manifest_file_path = path.join('./tmp', category, 'manifest.txt')
+async def create_manifest_for_urls(storage: ArtifactStorage, urls: List[str], category: str):
     manifest_map = {}
-    with open(manifest_file_path, 'w') as manifest_file:
-        file_number = 1
-        for url in urls:
-            manifest_map[url] = f"{file_number}"
-            manifest_file.write(f"{file_number} -> {url}\n")
-            file_number += 1
+    lines = []
+    file_number = 1
+    for url in urls:
+        manifest_map[url] = f"{file_number}"
+        lines.append(f"{file_number} -> {url}\n")
+        file_number += 1
+    await asyncio.to_thread(storage.write_text, f'{category}/manifest.txt', ''.join(lines))
     return manifest_map
 
-def insert_date_to_pdf(pdf_path):
-    date_now = datetime.datetime.now().strftime("%I:%M%p on %B %d, %Y")
-    text_to_write = f'''
+def generated_at():
+    return datetime.datetime.now().strftime("%I:%M%p on %B %d, %Y")
+
+
+def cover_page_text():
+    return f'''
     \n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n
-                                Generated by VDD Crawler at {date_now} 
+                                Generated by VDD Crawler at {generated_at()} 
     '''
-    doc = pymupdf.open(pdf_path)
-    utils.insert_page(doc, 0, text_to_write)
-    doc.save(pdf_path, incremental=True, encryption=0)
-    doc.close()
 
-async def write_pdf_file(url, file_path):
-    unverified_context = ssl._create_unverified_context()
-    pdf_content = urlopen(url, context=unverified_context)
-    with open(file_path, 'wb') as f:
-        f.write(pdf_content.read())
-    insert_date_to_pdf(file_path)
-    logger.info(f'Converted page: {url} to PDF {file_path}')
 
-
-async def to_textised_pdf(page, url, pdf_path):
+def stamp_header_template():
+    return (f'<div style="width: 100%; font-size: 9px; text-align: center; color: #555;">'
+            f'Generated by VDD Crawler at {generated_at()}</div>')
+
+
+def is_pdf_url(url):
+    return url.lower().endswith('.pdf')
+
+
+def packetstream_proxy_url():
+    # urllib unquotes the credentials, so characters like '@' in the password survive
+    return (f'http://{quote(PACKETSTREAM_USERNAME or "", safe="")}:{quote(PACKETSTREAM_PASSWORD or "", safe="")}@'
+            f'{PACKETSTREAM_PROXY_DOMAIN}:{PACKETSTREAM_HTTP_PORT}')
+
+
+def download_pdf(url, cancelled: threading.Event = None, use_proxy=False,
+                 on_received: Callable[[int], None] = None, public_only=False) -> tuple[bytes, bool]:
+    """
+    Downloads the PDF at `url`, through the rotating proxy when `use_proxy` is set, and with `public_only` only
+    from servers on public addresses. A document over LARGE_PDF_THRESHOLD_MB is cut to its first
+    PARTIAL_PDF_BYTES_MB; the second value tells whether that happened. Stops between chunks once `cancelled`
+    is set; `on_received` is called with every chunk's size.
+    """
+    opener = build_url_opener(packetstream_proxy_url() if use_proxy else None, public_only)
+    probe = probe_pdf(url, opener)
+    content = io.BytesIO()
+    if probe.size is not None and probe.size > LARGE_PDF_THRESHOLD_MB * MB:
+        logger.info(f'{url} is {humanize.naturalsize(probe.size)}, keeping only its first {PARTIAL_PDF_BYTES_MB}MB')
+        download_document(url, content, probe, PARTIAL_PDF_BYTES_MB * MB, cancelled, opener, on_received)
+        return content.getvalue(), True
+
+    # With the size unknown, a document only turns out to be too large while it is read
+    if download_document(url, content, probe, LARGE_PDF_THRESHOLD_MB * MB, cancelled, opener, on_received):
+        logger.info(f'{url} is over {LARGE_PDF_THRESHOLD_MB}MB, keeping only its first {PARTIAL_PDF_BYTES_MB}MB')
+        return content.getbuffer()[:PARTIAL_PDF_BYTES_MB * MB].tobytes(), True
+    return content.getvalue(), False
+
+
+async def finalize_fetched_pdf(pdf_bytes, cover=False, partial=False, extract_text=True) -> FinalizedPdf:
+    """
+    A single pass in the PDF pool that stamps a cover page on downloads, trims partial downloads, extracts
+    the text and optimizes when enabled.
+    """
+    return await run_in_pdf_pool(finalize_pdf, pdf_bytes, cover_page_text() if cover else None,
+                                 PARTIAL_PDF_MAX_PAGES if partial else None, PDF_OPTIMIZATION_ENABLED,
+                                 PDF_OPTIMIZATION_IMAGE_DPI, PDF_OPTIMIZATION_IMAGE_QUALITY, extract_text)
+
+
+async def finalize_pdf_file(storage: ArtifactStorage, pdf_key, pdf_bytes, cover=False, partial=False,
+                            extract_text=True) -> FinalizedPdf:
+    """
+    Stores a fetched PDF after finalizing it, with its text in the matching `.txt`.
+    """
+    finalized = await finalize_fetched_pdf(pdf_bytes, cover, partial, extract_text)
+    await asyncio.to_thread(storage.write_bytes, pdf_key, finalized.content)
+    if finalized.text is not None:
+        text_key = path.splitext(pdf_key)[0] + '.txt'
+        await asyncio.to_thread(storage.write_text, text_key, finalized.text)
+        logger.info(f"Text extracted and saved to {text_key}")
+    return finalized
+
+
+async def to_textised_pdf(page, url, storage: ArtifactStorage, pdf_key):
     logger.debug ('Textising the content...')
     await page.goto('https://www.textise.net/')
     await page.type('input[name="in"]', url)
@@ -128,36 +199,60 @@ async def to_textised_pdf(page, url, pdf_path):
     await page.waitForSelector('div[textise="block"]')
     logger.debug('Done textising')
 
-    await to_pdf(page, pdf_path)
-    logger.info(f'Converted: {url} to PDF {pdf_path}')
+    await to_pdf(page, storage, pdf_key)
+    logger.info(f'Converted: {url} to PDF {pdf_key}')
 
-async def to_pdf(page, pdf_path):
+async def render_pdf(page) -> bytes:
+    # The stamp is printed in the page header, so the PDF doesn't have to be reopened to add a cover page
     await page.emulateMedia('print')
-    await page.pdf(path=pdf_path, options={'landscape':True, 'format':'Tabloid'})
-    insert_date_to_pdf(pdf_path)
-
-async def goto_with_retries(page, url, max_retries=3, delay_seconds=5, **kwargs):
-    for attempt in range(1, max_retries + 1):
-        try:
-            logger.info(f"Attempt {attempt} to go to {url}...")
-            response = await page.goto(url, **kwargs)
-
-            if response and response.status < 400:
-               return response
-            else:
-                status_code = response.status if response else "No response"
-                logger.info(f"Google request failed, retrying...")
-
-        except (TimeoutError, NetworkError, PageError) as e:
-            logger.error(f"Navigation to {url} failed: {e}. Retrying...")
-        except Exception as e:
-            logger.error(f"An unexpected error occurred during navigation: {e}. Retrying...")
-
-        if attempt < max_retries:
-            await asyncio.sleep(delay_seconds)
+    return await page.pdf(options={'landscape': True, 'format': 'Tabloid', 'displayHeaderFooter': True,
+                                   'headerTemplate': stamp_header_template(), 'footerTemplate': '<div></div>',
+                                   'margin': {'top': '40px'}})
+
+async def render_result(page, url, storage: ArtifactStorage | None, pdf_key, load_timeout,
+                        render_timeout) -> tuple[bytes, str | None]:
+    """
+    Loads `url` in the page and renders it to PDF. With DOM text extraction the page's content is extracted
+    first, and written next to `pdf_key` once the PDF has rendered, when there is storage. Returns the PDF
+    and the text, if extracted.
+    """
+    await stealth(page)
+    logger.info(f'Loading page :{url}')
+    response = await page.goto(url, {'waituntil': 'networkidle0', 'timeout': int(load_timeout * 1000)})
+    if response is not None and response.status in RETRYABLE_STATUSES:
+        raise HttpStatusError(url, response.status)
+    await asyncio.sleep(3)
+    content = None
+    if TEXT_EXTRACTION_MODE == 'DOM':
+        content = await extract_content_from_dom(page)
+    logger.info(f'Converting to PDF')
+    pdf_bytes = await asyncio.wait_for(render_pdf(page), timeout=render_timeout)
+    if content is None:
+        return pdf_bytes, None
+    # Only now, so a failed render doesn't leave a text without its PDF
+    if storage is not None:
+        await write_extracted_content(storage, pdf_key, content, WRITE_TEXT_SIDECAR)
+    return pdf_bytes, format_extracted_content(content)
+
+async def to_pdf(page, storage: ArtifactStorage, pdf_key) -> bytes:
+    pdf_bytes = await render_pdf(page)
+    await asyncio.to_thread(storage.write_bytes, pdf_key, pdf_bytes)
+    return pdf_bytes
+
+async def goto_with_retries(page, url, retry_policy: RetryPolicy = None, **kwargs):
+    retry_policy = retry_policy or RetryPolicy()
+
+    async def navigate():
+        response = await page.goto(url, **kwargs)
+        if response is None or response.status >= 400:
+            raise HttpStatusError(url, response.status if response else None)
+        return response
 
-    logger.error(f"Failed to navigate to {url} after {max_retries} attempts.")
-    return None
+    try:
+        return await retry_policy.run(navigate, f"Navigation to {url}")
+    except Exception as e:
+        logger.error(f"Failed to navigate to {url}: {e}")
+        return None
 
 
 async def dump_markup(page, dump_path):
@@ -189,22 +284,26 @@ async def get_browser():
     return _browser
 
 
-async def perform_google_search(page, search_term: str, working_dir, num_pages_to_crawl, search_url=DEFAULT_SEARCH_ENGINE_URL):
-    search_page_urls = set()
+async def perform_google_search(page, search_term: str, storage: ArtifactStorage, working_dir, num_pages_to_crawl,
+                                search_url=DEFAULT_SEARCH_ENGINE_URL, budget: SearchBudget = None) -> List[SearchResult]:
+    search_page_results: Dict[str, SearchResult] = {}
     await stealth(page)
     page_number = 1
 
     try:
-        await goto_with_retries(page, search_url, 3, 5)
+        await goto_with_retries(page, search_url)
         await page.type('input[name="search"]', search_term)
         await page.keyboard.press('Enter')
         await page.waitForSelector('div[id="resInfo-0"]')
-        search_page_urls.update(await extract_urls(page))
+        add_search_results(search_page_results, await extract_urls(page))
         pdf_path = working_dir + f'/google_results_{page_number}.pdf'
-        await to_pdf(page, pdf_path)
+        await to_pdf(page, storage, pdf_path)
 
         page_number = 2
         while page_number <= num_pages_to_crawl:
+            if budget and budget.exhausted_reason():
+                logger.info(f'Stopping at results page {page_number - 1}: {budget.exhausted_reason()}')
+                break
             if await can_paginate(page):
                 logger.debug(f'Navigating to page {page_number}...')
                 await page.waitForXPath(f'//div[@class="gsc-cursor-page"][{page_number}]')
@@ -225,118 +324,334 @@ async def perform_google_search(page, search_term: str, working_dir, num_pages_t
                     #await dump_markup(page, f'{working_dir}/markup_dump_error.html')
                     #await to_pdf(page, f'{working_dir}/google_navigation_error.pdf')
 
-                search_page_urls.update(await extract_urls(page))
+                add_search_results(search_page_results, await extract_urls(page))
                 logger.debug('Generating google search results PDF...')
                 pdf_path = working_dir + f'/google_results_{page_number}.pdf'
-                await to_pdf(page, pdf_path)
+                await to_pdf(page, storage, pdf_path)
                 page_number += 1
             else:
                 break
     except TimeoutError as te:
         logger.error(f'Timeout error occurred while performing search: {te}')
         pdf_path = working_dir + '/google_error.pdf'
-        await to_pdf(page, pdf_path)
+        await to_pdf(page, storage, pdf_path)
     except Exception as e:
         logger.error(f'Error occurred searching Google: {e}')
         #await dump_markup(page, f'{working_dir}/markup_dump_search_error.html')
-    logger.info(f'Found {len(search_page_urls)} URLs')
-    return search_page_urls
+    logger.info(f'Found {len(search_page_results)} URLs')
+    return list(search_page_results.values())
 
 
-def create_final_manifest(manifest, path):
-    manifest_file_path = f'{path}/manifest.json'
-    with open (manifest_file_path, 'w') as manifest_file:
-        manifest_file.write(json.dumps(manifest, default=vars))
+def create_final_manifest(manifest, storage: ArtifactStorage, path):
+    storage.write_text(f'{path}/manifest.json', json.dumps(manifest, default=vars))
 
 
 class CrawlerPage:
 
+    def __init__(self, schedule_id=None):
+        self.schedule_id = schedule_id
+        self.storage = get_schedule_storage(schedule_id)
+        self.text_index = get_schedule_text_index(schedule_id)
+        self.bandwidth = get_schedule_bandwidth_meter(schedule_id)
+
+    def category_of(self, working_dir):
+        return working_dir[len(self.schedule_id) + 1:] if working_dir.startswith(f'{self.schedule_id}/') else working_dir
+
     @asynccontextmanager
     async def new_intercepted_page(self):
-        browser = await get_browser_with_proxy()
-        page = await browser.newPage()
-        await page.setRequestInterception(True)
-        page.on('request', handle_request)
-        await page.authenticate({"username":f"{PACKETSTREAM_USERNAME}", "password":f"{PACKETSTREAM_PASSWORD}"})
-        try:
-            yield page
-        finally:
-            await browser.close()
+        async with fair_scheduler.slot(BROWSER_PAGE, self.schedule_id):
+            await resource_governor.ensure_host_memory()
+            browser = await get_browser_with_proxy()
+            try:
+                async with resource_governor.govern(browser):
+                    page = await browser.newPage()
+                    await page.setRequestInterception(True)
+                    page.on('request', handle_request)
+                    await page.authenticate({"username":f"{PACKETSTREAM_USERNAME}", "password":f"{PACKETSTREAM_PASSWORD}"})
+                    yield page
+            finally:
+                await resource_governor.close_browser(browser)
 
     @asynccontextmanager
     async def new_page(self):
-        browser = await get_browser()
-        page = await browser.newPage()
-        try:
-            yield page
-        finally:
+        async with fair_scheduler.slot(BROWSER_PAGE, self.schedule_id):
+            await resource_governor.ensure_host_memory()
+            browser = await get_browser()
             try:
-                await browser.close()
-            except Exception as e:
-                logger.info('Error while closing browser.', e)
-
-
-    async def prepare_pdfs(self, urls_manifest: Dict, working_dir, use_proxy):
-        manifest = Manifest()
+                async with resource_governor.govern(browser):
+                    page = await browser.newPage()
+                    yield page
+            finally:
+                await resource_governor.close_browser(browser)
+
+
+    async def prepare_pdfs(self, urls_manifest: Dict, working_dir, use_proxy, budget: SearchBudget = None,
+                           search_results: Dict[str, SearchResult] = None, manifest: Manifest = None):
+        """
+        Fetches the URLs best first into `manifest` (a new one if not given), so a caller cut off part way
+        still holds the entries done so far.
+        """
+        if manifest is None:
+            manifest = Manifest()
+        if budget is None:
+            budget = SearchBudget()
+        retry_queue = get_schedule_retry_queue(self.schedule_id)
         for url, file_name in urls_manifest.items():
             manifest_entry = ManifestEntry(url, file_name)
-            file_path = f"{working_dir}/{file_name}.pdf"
-            if url.lower().endswith('.pdf'):
-                try:
-                    logger.info(f'Processing {file_name} -> {url}')
-                    await asyncio.wait_for(write_pdf_file(url, file_path), timeout=120)
-                    manifest_entry.set_status(True)
-                except ForcedTimeoutError as e:
-                    logger.error('PDF either too large or it is taking too long to load. Skipping.')
-                except Exception as e:
-                    logger.error(f'Error occurred while downloading PDF: {e}')
+            if search_results and url in search_results:
+                manifest_entry.set_search_result(search_results[url])
+            not_fetched_reason = budget.exhausted_reason() or self.bandwidth.exhausted_reason()
+            if not_fetched_reason:
+                logger.info(f'Not fetching {file_name} -> {url}: {not_fetched_reason}')
+                manifest_entry.mark_not_fetched(not_fetched_reason)
+                manifest.add(manifest_entry)
+                continue
+            budget.consume_url()
+            error = await self.fetch_result(manifest_entry, working_dir, use_proxy, budget)
+            manifest.add(manifest_entry)
+            if retry_queue is not None:
+                retry_queue.record_attempt()
+                if error is not None and is_retryable(error):
+                    logger.info(f'Deferring retry of {file_name} -> {url}')
+                    # PDFs are downloaded directly on the first pass, whatever the search's route
+                    retry_queue.defer(DeferredRetry(manifest, manifest_entry, working_dir,
+                                                    use_proxy and not is_pdf_url(url), error))
+        return manifest
+
+    async def fetch_result(self, manifest_entry: ManifestEntry, working_dir, use_proxy, budget: SearchBudget,
+                           proxy_downloads=False):
+        """
+        Renders or downloads one result to `<working_dir>/<file_number>.pdf`, extracts and indexes its text and
+        records the attempt on the entry. Returns the error when it failed. Pages go through the proxy with
+        `use_proxy`, PDF downloads only with `proxy_downloads`.
+        """
+        url = manifest_entry.url
+        file_name = manifest_entry.file_number
+        file_path = f"{working_dir}/{file_name}.pdf"
+        text = None
+        pdf_bytes = None
+        downloaded = is_pdf_url(url)
+        partial = False
+        stopped = False
+        error = None
+        bytes_received = 0
+        category = self.category_of(working_dir)
+        if downloaded:
+            # Counts bytes as they are read, so failed and timed out downloads are on the meter too
+            download_meter = DownloadMeter(self.bandwidth, category, url, PROXIED if proxy_downloads else DIRECT)
+            try:
+                logger.info(f'Processing {file_name} -> {url}')
+                async with fair_scheduler.slot(PDF_DOWNLOAD, self.schedule_id):
+                    # Blocking I/O runs off the event loop so concurrent schedules keep moving
+                    cancelled = threading.Event()
+                    try:
+                        pdf_bytes, partial = await asyncio.wait_for(
+                            asyncio.to_thread(download_pdf, url, cancelled, proxy_downloads, download_meter.add),
+                            timeout=budget.timeout(120))
+                    finally:
+                        # wait_for can't stop the thread; this makes it give up at the next chunk
+                        cancelled.set()
+            except ForcedTimeoutError as e:
+                error = e
+                logger.error('PDF either too large or it is taking too long to load. Skipping.')
+            except Exception as e:
+                error = e
+                logger.error(f'Error occurred while downloading PDF: {e}')
+            bytes_received = download_meter.received
+        else:
+            if use_proxy:
+                chosen_page = self.new_intercepted_page()
             else:
-                if use_proxy:
-                    chosen_page = self.new_intercepted_page()
-                else:
-                    chosen_page = self.new_page()
+                chosen_page = self.new_page()
 
+            try:
                 async with chosen_page as page:
                     logger.info(f'Processing {file_name} -> {url}')
-                    await stealth(page)
+                    page_meter = meter_page(page, self.bandwidth, category, PROXIED if use_proxy else DIRECT)
                     try:
-                        pdf_path = path.join(working_dir, f'{file_name}.pdf')
-                        logger.info(f'Loading page :{url}')
-                        await page.goto(url, {'waituntil': 'networkidle0', 'timeout': 120000})
-                        await asyncio.sleep(3)
-                        logger.info(f'Converting to PDF')
-                        await asyncio.wait_for(to_pdf(page, pdf_path), timeout=90)
-                        manifest_entry.set_status(True)
+                        pdf_bytes, text = await render_result(page, url, self.storage, file_path,
+                                                              budget.timeout(120), budget.timeout(90))
                     except ForcedTimeoutError as e:
+                        error = e
                         logger.error('Page taking too long to load. Skipping')
                     except PageError as e:
+                        error = e
                         logger.error(f'Page error converting page to PDF: {url}: {e}')
                     except NetworkError as e:
+                        error = e
                         logger.error(f'Network error converting page to PDF: {url}: {e}')
                     except Exception as e:
+                        error = e
                         logger.error(f'Error occurred while converting page to PDF {url}: {e}')
-            manifest.add(manifest_entry)
-            await extract_text_from_pdf(file_path)
-        return manifest
+                    bytes_received = page_meter.received
+                    stopped = page_meter.aborted
+                    # A load stopped for the byte budget would only burn it again if retried
+                    if error is not None and stopped:
+                        error = page_meter.error(url)
+            except HostMemoryExhaustedError as e:
+                error = e
+                logger.error(f'Skipping {url}: {e}')
+
+        if pdf_bytes is not None:
+            try:
+                extracted_text = await self.store_pdf(manifest_entry, file_path, pdf_bytes, downloaded, partial,
+                                                      extract_text=text is None)
+                text = text if text is not None else extracted_text
+                manifest_entry.set_status(True)
+                if stopped:
+                    # Rendered after its load was stopped for the byte budget, so the page may be incomplete
+                    manifest_entry.set_partial(True)
+                logger.info(f'Converted: {url} to PDF {file_path}')
+            except Exception as e:
+                error = e
+                logger.error(f'Error occurred while storing PDF of {url}: {e}')
+        manifest_entry.record_attempt(error, bytes_received)
+        if not manifest_entry.status:
+            return error
+        if text:
+            await self.index_text(working_dir, manifest_entry, text)
+        return None
+
+    async def store_pdf(self, manifest_entry: ManifestEntry, file_path, pdf_bytes, downloaded, partial, extract_text):
+        """
+        Stores a rendered or downloaded PDF and returns its text when `extract_text` is set. Rendered pages
+        already carry the stamp, so unless they need text or optimizing they are written as they are.
+        """
+        if not downloaded and not extract_text and not PDF_OPTIMIZATION_ENABLED:
+            await asyncio.to_thread(self.storage.write_bytes, file_path, pdf_bytes)
+            return None
+        async with fair_scheduler.slot(TEXT_EXTRACTION, self.schedule_id):
+            logger.info(f'Finalizing {file_path}, size: {humanize.naturalsize(len(pdf_bytes))}')
+            finalized = await finalize_pdf_file(self.storage, file_path, pdf_bytes, cover=downloaded, partial=partial,
+                                                extract_text=extract_text)
+        if PDF_OPTIMIZATION_ENABLED:
+            manifest_entry.set_sizes(finalized.original_size, len(finalized.content))
+        manifest_entry.set_partial(finalized.partial)
+        return finalized.text
+
+    async def index_text(self, working_dir, manifest_entry: ManifestEntry, text):
+        if self.text_index is None:
+            return
+        try:
+            await asyncio.to_thread(self.text_index.add_document, self.schedule_id, self.category_of(working_dir),
+                                    manifest_entry.file_number, manifest_entry.url, manifest_entry.title, text)
+        except Exception as e:
+            logger.error(f'Error indexing text of {manifest_entry.url}: {e}')
 
 
     async def search_and_download(self, search_term: str,
         num_of_results_pages_to_scrape: int,
         category: str,
-        search_url=DEFAULT_SEARCH_ENGINE_URL, use_proxy=True):
+        search_url=DEFAULT_SEARCH_ENGINE_URL, use_proxy=True,
+        actor_names: List[str] = None, risk_terms: List[str] = None, budget: SearchBudget = None):
 
-        dir_path = f'./tmp/{category}'
-        makedirs(dir_path, exist_ok=True)
+        dir_path = category
+        if budget is None:
+            budget = new_search_budget()
+        manifest = Manifest()
+        manifest_map = None
 
         try:
+            not_searched_reason = budget.exhausted_reason() or self.bandwidth.exhausted_reason()
+            if not_searched_reason:
+                logger.info(f'Skipping search for {category}: {not_searched_reason}')
+                manifest = Manifest()
+                manifest.mark_not_searched(not_searched_reason)
+                await asyncio.to_thread(create_final_manifest, manifest, self.storage, dir_path)
+                return
+
             async with self.new_intercepted_page() as page:
+                meter_page(page, self.bandwidth, self.category_of(dir_path), PROXIED)
                 logger.info(f'Using search term: {search_term}')
-                search_page_urls = await perform_google_search(page, search_term, dir_path, num_of_results_pages_to_scrape, search_url=search_url)
+                search_results = await perform_google_search(page, search_term, self.storage, dir_path, num_of_results_pages_to_scrape,
+                                                             search_url=search_url, budget=budget)
 
+            logger.info("Ranking search results...")
+            ranked_results = rank_search_results(search_results, risk_terms or [], actor_names or [])
             logger.info("Preparing manifest...")
-            manifest_map = await create_manifest_for_urls(search_page_urls, category)
+            manifest_map = await create_manifest_for_urls(self.storage, [result.url for result in ranked_results], category)
             logger.info("Downloading...")
-            manifest = await self.prepare_pdfs(manifest_map, dir_path, use_proxy)
-            create_final_manifest(manifest, dir_path)
+            await self.prepare_pdfs(manifest_map, dir_path, use_proxy, budget,
+                                    {result.url: result for result in ranked_results}, manifest)
+            manifest.set_bandwidth(self.bandwidth.category_summary(self.category_of(dir_path)))
+            await asyncio.to_thread(create_final_manifest, manifest, self.storage, dir_path)
+        except asyncio.CancelledError:
+            # The schedule deadline cancelled the search: keep what was fetched, and list the rest as cut
+            logger.info(f'Deadline reached during search for {category}, writing its partial manifest')
+            await self.write_cut_manifest(manifest, manifest_map, dir_path)
+            raise
         except Exception as e:
             logger.error('Error occurred in search and download', e)
+
+    async def write_cut_manifest(self, manifest: Manifest, manifest_map: Dict | None, dir_path):
+        try:
+            if manifest_map is None:
+                manifest.mark_not_searched(NOT_FETCHED_DEADLINE)
+            else:
+                done = {entry.url for entry in manifest.entries}
+                for url, file_name in manifest_map.items():
+                    if url not in done:
+                        manifest_entry = ManifestEntry(url, file_name)
+                        manifest_entry.mark_not_fetched(NOT_FETCHED_DEADLINE)
+                        manifest.add(manifest_entry)
+            manifest.set_bandwidth(self.bandwidth.category_summary(self.category_of(dir_path)))
+            await asyncio.to_thread(create_final_manifest, manifest, self.storage, dir_path)
+        except Exception as e:
+            logger.error(f'Error writing the partial manifest of {dir_path}: {e}')
+
+
+async def run_deferred_retries(schedule_id, budget: SearchBudget, rounds=DEFERRED_RETRY_ROUNDS) -> Dict | None:
+    """
+    Tries the schedule's deferred URLs again once its searches are done. Each try goes the other route
+    (proxied pages direct and the other way round; PDFs, first downloaded directly, through the proxy), rounds are spaced by jittered backoff and no page is held
+    while waiting. Manifests of retried results are rewritten.
+
+    Returns a summary for the schedule manifest, or None if nothing was deferred.
+    """
+    retry_queue = get_schedule_retry_queue(schedule_id)
+    if retry_queue is None or not retry_queue.pending:
+        return None
+    retry_policy = RetryPolicy(max_attempts=rounds)
+    crawler_page = CrawlerPage(schedule_id)
+    deferred = len(retry_queue.pending)
+    pending, retry_queue.pending = retry_queue.pending, []
+    retried: Dict[int, DeferredRetry] = {}
+    recovered = []
+    for round_number in range(1, rounds + 1):
+        if (not pending or budget.exhausted_reason() or crawler_page.bandwidth.exhausted_reason()
+                or retry_queue.retries_used >= retry_queue.retry_budget()):
+            break
+        delay = retry_policy.delay(round_number)
+        logger.info(f'Retrying {len(pending)} deferred URLs of {schedule_id} in {delay:.1f}s (round {round_number})')
+        await asyncio.sleep(delay)
+        still_failing = []
+        for retry in pending:
+            if budget.exhausted_reason() or crawler_page.bandwidth.exhausted_reason() or not retry_queue.try_spend():
+                break
+            retry.use_proxy = not retry.use_proxy
+            logger.info(f'Retrying {retry.manifest_entry.url} {"through" if retry.use_proxy else "without"} the proxy')
+            error = await crawler_page.fetch_result(retry.manifest_entry, retry.working_dir, retry.use_proxy, budget,
+                                                    proxy_downloads=retry.use_proxy)
+            retried[id(retry.manifest_entry)] = retry
+            if error is None:
+                recovered.append(retry)
+            elif is_retryable(error):
+                still_failing.append(retry)
+        pending = still_failing
+
+    manifests = {}
+    for retry in retried.values():
+        retry.manifest.retried(retry.manifest_entry)
+        manifests[id(retry.manifest)] = retry
+    for retry in manifests.values():
+        retry.manifest.set_bandwidth(crawler_page.bandwidth.category_summary(crawler_page.category_of(retry.working_dir)))
+        await asyncio.to_thread(create_final_manifest, retry.manifest, crawler_page.storage, retry.working_dir)
+
+    summary = {
+        "deferred": deferred,
+        "retried": len(retried),
+        "recovered": len(recovered),
+        "retry_budget": retry_queue.retry_budget(),
+    }
+    logger.info(f'Deferred retries for {schedule_id}: {json.dumps(summary)}')
+    return summary
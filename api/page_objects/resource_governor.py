@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import humanize
+import psutil
+
+from api.config import (
+    BROWSER_PAGE_MEMORY_LIMIT_MB, BROWSER_MEMORY_POLL_SECONDS, MIN_HOST_AVAILABLE_MEMORY_MB, HOST_MEMORY_WAIT_SECONDS
+)
+
+logger = logging.getLogger('Resource Governor')
+
+CHROMIUM_PROCESS_NAMES = ('chromium', 'chromium-browser', 'chrome', 'headless_shell')
+MB = 1024 * 1024
+
+
+class HostMemoryExhaustedError(RuntimeError):
+    pass
+
+
+def process_tree(pid):
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return []
+
+
+def process_tree_rss(pid) -> int:
+    total = 0
+    for process in process_tree(pid):
+        try:
+            total += process.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total
+
+
+def kill_process_tree(pid):
+    processes = process_tree(pid)
+    for process in processes:
+        try:
+            process.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    # Waiting reaps the ones that are our children so they don't linger as zombies
+    psutil.wait_procs(processes, timeout=5)
+
+
+def is_headless_chromium(process: psutil.Process) -> bool:
+    try:
+        name = (process.name() or '').lower()
+        return name in CHROMIUM_PROCESS_NAMES and '--headless' in process.cmdline()
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        return False
+
+
+def get_browser_pid(browser):
+    process = getattr(browser, 'process', None)
+    return process.pid if process is not None else None
+
+
+class ResourceGovernor:
+    """
+    Keeps Chromium from taking the worker down: refuses new browsers when the host is low on memory,
+    recycles browsers whose process tree goes over the per-page budget and kills leftover processes.
+    """
+
+    def __init__(self, page_memory_limit_mb, min_host_available_mb, poll_seconds, host_memory_wait_seconds):
+        self.page_memory_limit = page_memory_limit_mb * MB
+        self.min_host_available = min_host_available_mb * MB
+        self.poll_seconds = poll_seconds
+        self.host_memory_wait_seconds = host_memory_wait_seconds
+        self.recycled_pages = 0
+
+    async def ensure_host_memory(self):
+        waited = 0
+        while psutil.virtual_memory().available < self.min_host_available:
+            if waited >= self.host_memory_wait_seconds:
+                available = humanize.naturalsize(psutil.virtual_memory().available)
+                raise HostMemoryExhaustedError(f'Host memory too low to open a new page ({available} available)')
+            logger.info('Host memory low, waiting before opening a new page...')
+            await asyncio.sleep(self.poll_seconds)
+            waited += self.poll_seconds
+
+    @asynccontextmanager
+    async def govern(self, browser):
+        pid = get_browser_pid(browser)
+        watchdog = asyncio.create_task(self._watch(pid)) if pid and self.page_memory_limit else None
+        try:
+            yield
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+
+    async def _watch(self, pid):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            rss = await asyncio.to_thread(process_tree_rss, pid)
+            if rss > self.page_memory_limit:
+                logger.error(f'Browser {pid} is using {humanize.naturalsize(rss)}, over the per-page budget of '
+                             f'{humanize.naturalsize(self.page_memory_limit)}. Recycling it.')
+                self.recycled_pages += 1
+                await asyncio.to_thread(kill_process_tree, pid)
+                return
+
+    async def close_browser(self, browser):
+        try:
+            await browser.close()
+        except Exception as e:
+            logger.info(f'Error while closing browser, killing its processes: {e}')
+        pid = get_browser_pid(browser)
+        if pid and process_tree(pid):
+            await asyncio.to_thread(kill_process_tree, pid)
+
+    def reap_orphaned_chromium(self):
+        """
+        Reaps zombie children of this process and kills headless Chromium trees whose parent is gone.
+        Browsers still owned by this process are left alone.
+        """
+        own_process = psutil.Process()
+        own_descendants = set()
+        for child in own_process.children(recursive=True):
+            own_descendants.add(child.pid)
+            try:
+                if child.status() == psutil.STATUS_ZOMBIE:
+                    child.wait(timeout=0)
+            except (psutil.NoSuchProcess, psutil.TimeoutExpired, ChildProcessError):
+                pass
+
+        killed = 0
+        for process in psutil.process_iter(['pid', 'ppid']):
+            if process.pid in own_descendants or process.info['ppid'] not in (0, 1):
+                continue
+            if is_headless_chromium(process):
+                logger.info(f'Killing orphaned Chromium process {process.pid}')
+                kill_process_tree(process.pid)
+                killed += 1
+        if killed:
+            logger.info(f'Killed {killed} orphaned Chromium process tree(s)')
+
+
+resource_governor = ResourceGovernor(BROWSER_PAGE_MEMORY_LIMIT_MB, MIN_HOST_AVAILABLE_MEMORY_MB,
+                                     BROWSER_MEMORY_POLL_SECONDS, HOST_MEMORY_WAIT_SECONDS)
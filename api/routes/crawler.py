@@ -1,12 +1,19 @@
 import json
+import re
+import time
 import uuid
+import logging
 
-from pydantic import BaseModel, Field, model_validator
-from fastapi import APIRouter
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+from fastapi import APIRouter, Query, Response, status
 from fastapi.responses import RedirectResponse
-from typing import List, Literal, Optional, Any, Self
+from typing import Dict, List, Literal, Optional, Any, Self
 
-from api.handlers.web_event_handler import schedule_run
+from api.config import MAX_DUE_DILIGENCE_BATCH_SIZE
+from api.handlers.publisher import schedule_run, schedule_runs
+from api.util.TextIndexUtils import MAX_SEARCH_LIMIT, search_schedule_text
+
+logger = logging.getLogger('crawler routes')
 
 crawler_router = APIRouter(
     prefix="/crawler",
@@ -14,6 +21,9 @@ crawler_router = APIRouter(
 )
 
 ALLOWED_CRAWLERS = Literal["GOOGLE", "NEWS", "REGULATORY_DATABASES", "OFFICIAL_WEBSITE"]
+ALLOWED_PRIORITIES = Literal["HIGH", "NORMAL", "LOW"]
+# Schedule ids name folders and index files, so path separators and leading dots are refused
+SCHEDULE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
 
 class CreateDueDiligenceArtifactsRequest(BaseModel):
     vendor_name: str
@@ -22,6 +32,40 @@ class CreateDueDiligenceArtifactsRequest(BaseModel):
     schedule_id: str = None
     website_url: str = None
     directors: List[str] = []
+    deadline_minutes: Optional[int] = Field(default=None, gt=0)
+    priority: ALLOWED_PRIORITIES = "NORMAL"
+
+    @field_validator("schedule_id")
+    @classmethod
+    def check_schedule_id(cls, schedule_id):
+        # Left empty, an id is generated
+        if schedule_id and not SCHEDULE_ID_PATTERN.match(schedule_id):
+            raise ValueError("may only hold letters, digits, '_', '-' and '.', and not start with '.'")
+        return schedule_id
+
+
+class CreateDueDiligenceArtifactsBatchRequest(BaseModel):
+    vendors: List[Dict[str, Any]] = Field(min_length=1, max_length=MAX_DUE_DILIGENCE_BATCH_SIZE)
+
+
+def to_schedule_message(due_diligence_request: CreateDueDiligenceArtifactsRequest):
+    if not due_diligence_request.schedule_id:
+        due_diligence_request.schedule_id = str(uuid.uuid4())
+    message = json.dumps({
+        "vendor_name": due_diligence_request.vendor_name,
+        "schedule_id": due_diligence_request.schedule_id,
+        "directors": due_diligence_request.directors,
+        "pages": due_diligence_request.pages,
+        "website_url": due_diligence_request.website_url,
+        "crawlers": due_diligence_request.crawlers,
+        "deadline_minutes": due_diligence_request.deadline_minutes,
+        "priority": due_diligence_request.priority,
+    })
+    return message, f"Scheduling {due_diligence_request.schedule_id}!"
+
+
+def describe_validation_error(error: ValidationError):
+    return "; ".join(f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors())
 
 @crawler_router.get("", include_in_schema=False)
 def hello():
@@ -45,19 +89,110 @@ def hello():
                      - `crawlers` - list of allowed crawlers supported by the system; 
                                     `GOOGLE, NEWS, REGULATORY_DATABASES,OFFICIAL_WEBSITE` 
                      - `website_url` - website URL of the vendor for official websites search.
+                     - `deadline_minutes` - optional; time limit for the whole schedule. Work is shared out across
+                                            crawlers and searches, and whatever is done by then is uploaded with
+                                            the cut URLs marked "not fetched" in the manifest.
+                     - `priority` - optional; `HIGH, NORMAL, LOW`. Share of browser, download and extraction
+                                    slots a schedule gets when a worker runs several schedules at once.
                      """)
-async def create_vendor_artifacts(due_diligence_request: CreateDueDiligenceArtifactsRequest):
-    if not due_diligence_request.schedule_id:
-        due_diligence_request.schedule_id = uuid.uuid4()
-    schedule_run(json.dumps({
-        "vendor_name": due_diligence_request.vendor_name,
-        "schedule_id": due_diligence_request.schedule_id,
-        "directors": due_diligence_request.directors,
-        "pages": due_diligence_request.pages,
-        "website_url": due_diligence_request.website_url,
-        "crawlers": due_diligence_request.crawlers,
-    }), f"Scheduling {due_diligence_request.schedule_id}!")
+async def create_vendor_artifacts(due_diligence_request: CreateDueDiligenceArtifactsRequest, response: Response):
+    message, subject = to_schedule_message(due_diligence_request)
+    try:
+        await schedule_run(message, subject)
+    except Exception as e:
+        logger.error(f"Error scheduling {due_diligence_request.schedule_id}: {e}")
+        response.status_code = status.HTTP_502_BAD_GATEWAY
+        return {
+            "schedule_id": due_diligence_request.schedule_id,
+            "message": f"Could not start crawling for {due_diligence_request.vendor_name}",
+            "error": str(e),
+        }
     return {
         "schedule_id": due_diligence_request.schedule_id,
         "message": f"Crawling for {due_diligence_request.vendor_name} started...",
+        "error": None,
+    }
+
+
+@crawler_router.post("/due-diligence/batch",
+                     summary="Start due diligence crawling for many vendors",
+                     description=f"""
+                     Create due diligence artifacts for each vendor in `vendors`; each item takes the same fields as
+                     `POST /crawler/due-diligence`. Up to {MAX_DUE_DILIGENCE_BATCH_SIZE} vendors per call.
+                     
+                     Items are validated and scheduled independently. `results` holds one entry per item, in
+                     request order, with its `schedule_id`, `status` (`SCHEDULED`, `INVALID` or `FAILED`) and `error`.
+                     """)
+async def create_vendor_artifacts_batch(batch_request: CreateDueDiligenceArtifactsBatchRequest):
+    results = []
+    entries = []
+    seen_schedule_ids = set()
+    for index, vendor in enumerate(batch_request.vendors):
+        result = {"index": index, "vendor_name": vendor.get("vendor_name"), "schedule_id": vendor.get("schedule_id"),
+                  "status": "INVALID", "error": None}
+        results.append(result)
+        try:
+            due_diligence_request = CreateDueDiligenceArtifactsRequest.model_validate(vendor)
+        except ValidationError as e:
+            result["error"] = describe_validation_error(e)
+            continue
+        if due_diligence_request.schedule_id in seen_schedule_ids:
+            result["error"] = f"Duplicate schedule_id in batch: {due_diligence_request.schedule_id}"
+            continue
+
+        message, subject = to_schedule_message(due_diligence_request)
+        seen_schedule_ids.add(due_diligence_request.schedule_id)
+        result.update(schedule_id=due_diligence_request.schedule_id, status="FAILED", error="Not acknowledged by SNS")
+        entries.append((str(index), message, subject))
+
+    published = await schedule_runs(entries) if entries else {}
+    for entry_id, (message_id, error) in published.items():
+        result = results[int(entry_id)]
+        result["status"] = "FAILED" if error else "SCHEDULED"
+        result["error"] = error
+
+    scheduled = sum(1 for result in results if result["status"] == "SCHEDULED")
+    logger.info(f"Scheduled {scheduled} of {len(results)} vendors in batch")
+    return {
+        "scheduled": scheduled,
+        "failed": len(results) - scheduled,
+        "results": results,
+    }
+
+
+@crawler_router.get("/due-diligence/{schedule_id}/search",
+                    summary="Search a schedule's extracted text",
+                    description="""
+                    Full-text search over the text of every result a finished schedule fetched, English and Hindi.
+                    
+                    - `q` - words to look for; all must match unless `match_any` is set
+                    - `category` - optional; limit to one crawler folder, e.g. `Google` or `Google/Hindi`
+                    - `limit` - most hits to return
+                    
+                    Hits are ranked best first and carry the `category`, `file_number` and `url` of the result, the risk
+                    keywords found in it and a snippet with matches in `[brackets]`.
+                    """)
+async def search_schedule(schedule_id: str, response: Response, q: str = Query(min_length=1),
+                          category: Optional[str] = None, limit: int = Query(default=20, gt=0, le=MAX_SEARCH_LIMIT),
+                          match_any: bool = False):
+    if not SCHEDULE_ID_PATTERN.match(schedule_id):
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"schedule_id": schedule_id, "hits": [], "error": "Invalid schedule_id"}
+
+    started_at = time.perf_counter()
+    try:
+        hits = await search_schedule_text(schedule_id, q, limit, category, match_any)
+    except Exception as e:
+        logger.error(f"Error searching {schedule_id}: {e}")
+        response.status_code = status.HTTP_502_BAD_GATEWAY
+        return {"schedule_id": schedule_id, "hits": [], "error": str(e)}
+    if hits is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {"schedule_id": schedule_id, "hits": [], "error": "No text index for this schedule; it may still be running"}
+    return {
+        "schedule_id": schedule_id,
+        "query": q,
+        "took_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        "hits": hits,
+        "error": None,
     }
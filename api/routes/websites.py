@@ -1,11 +1,94 @@
-from fastapi import APIRouter
+import logging
+import sys
+import time
+from typing import Literal
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, Query, Response, status
+from fastapi.responses import PlainTextResponse
+
+from api.config import CAPTURE_CACHE_TTL_SECONDS
+from api.util.AddressUtils import BlockedAddressError, check_public_url
+
+logger = logging.getLogger('website routes')
 
 website_router = APIRouter(
     prefix="/websites",
     tags=["Websites"]
 )
 
+CAPTURE_MODULE = 'api.page_objects.capture_page'
+
+
+async def warm_capture_browsers():
+    # The browser stack is imported on first use, so the rest of the API doesn't pay for it
+    from api.page_objects.capture_page import warm_capture_browsers
+    await warm_capture_browsers()
+
+
+async def close_capture_browsers():
+    if CAPTURE_MODULE in sys.modules:
+        await sys.modules[CAPTURE_MODULE].close_capture_browsers()
+
+
+@website_router.get("/capture",
+                    summary="Capture a single URL",
+                    description=f"""
+                    Renders one page (or downloads one PDF) to a PDF with its text, the same way a crawl does,
+                    on browsers kept warm by the API. Takes seconds rather than a whole schedule.
+
+                    - `url` - http(s) URL to capture, on a public address; the page's own requests to private,
+                              loopback, link-local or metadata addresses are blocked too
+                    - `output` - `pdf` returns the PDF, `text` its text, `s3` uploads both under `captures/` in
+                                 the bucket and returns their keys
+                    - `use_proxy` - optional; load the page, or download the PDF, through the rotating proxy
+
+                    Captures are cached by URL for {CAPTURE_CACHE_TTL_SECONDS}s (`X-Capture-Cached` tells whether
+                    the response came from the cache). When every capture slot is busy the call is refused with
+                    429 and should be retried shortly.
+                    """)
+async def capture(response: Response, url: str = Query(min_length=1), output: Literal["pdf", "text", "s3"] = "pdf",
+                  use_proxy: bool = False):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"url": url, "error": "Only http and https URLs can be captured"}
+    try:
+        # Keeps the API from being used to reach the host's own network or the cloud metadata service
+        await check_public_url(url)
+    except BlockedAddressError as e:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"url": url, "error": str(e)}
+
+    from api.page_objects.capture_page import CaptureBusyError, capture_url, upload_capture
+
+    started_at = time.perf_counter()
+    try:
+        result, cached = await capture_url(url, use_proxy)
+        if output == "s3":
+            await upload_capture(result)
+    except CaptureBusyError as e:
+        response.status_code = status.HTTP_429_TOO_MANY_REQUESTS
+        response.headers["Retry-After"] = "5"
+        return {"url": url, "error": str(e)}
+    except Exception as e:
+        logger.error(f"Error capturing {url}: {e}")
+        response.status_code = status.HTTP_502_BAD_GATEWAY
+        return {"url": url, "error": str(e) or type(e).__name__}
 
-@website_router.get("/{path}")
-def homepage(path: str, url: str):
-    return f"We will start hitting {url}!!!"
+    headers = {"X-Capture-Cached": str(cached).lower(), "X-Capture-Partial": str(result.partial).lower()}
+    if output == "pdf":
+        return Response(content=result.pdf_bytes, media_type="application/pdf", headers=headers)
+    if output == "text":
+        return PlainTextResponse(content=result.text or '', headers=headers)
+    response.headers.update(headers)
+    return {
+        "url": url,
+        "pdf_key": result.pdf_key,
+        "text_key": result.text_key,
+        "partial": result.partial,
+        "captured_at": result.captured_at.isoformat(),
+        "cached": cached,
+        "took_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        "error": None,
+    }
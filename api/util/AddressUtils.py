@@ -0,0 +1,146 @@
+import asyncio
+import http.client
+import ipaddress
+import socket
+from typing import List
+from urllib.parse import urlsplit
+from urllib.request import HTTPHandler, HTTPSHandler
+
+# Cloud instance metadata endpoints, refused even where they would count as public
+METADATA_ADDRESSES = {
+    ipaddress.ip_address('169.254.169.254'),
+    ipaddress.ip_address('fd00:ec2::254'),
+    ipaddress.ip_address('100.100.100.200'),
+}
+# Schemes the browser loads without reaching out to a host
+LOCAL_SCHEMES = ('data', 'blob', 'about')
+
+
+class BlockedAddressError(Exception):
+    pass
+
+
+def is_public_address(address) -> bool:
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    # is_global rules out loopback, private, link-local, shared, reserved and unspecified addresses
+    return ip.is_global and not ip.is_multicast and ip not in METADATA_ADDRESSES
+
+
+def check_addresses(host, address_infos):
+    if not address_infos:
+        raise BlockedAddressError(f'{host} did not resolve')
+    for *_, sockaddr in address_infos:
+        if not is_public_address(sockaddr[0]):
+            raise BlockedAddressError(f'{host} resolves to {sockaddr[0]}, which is not a public address')
+    return address_infos
+
+
+def public_address_infos(host, port):
+    """
+    Resolves `host`, raising BlockedAddressError unless every address it resolves to is public.
+    """
+    try:
+        address_infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise BlockedAddressError(f'{host} did not resolve: {e}') from e
+    return check_addresses(host, address_infos)
+
+
+async def check_public_url(url):
+    """
+    Raises BlockedAddressError unless `url` is http(s) and its host resolves to public addresses only.
+    Resolved on the event loop's resolver, so the check doesn't block.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise BlockedAddressError(f'Only http and https URLs can be fetched: {url}')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    try:
+        address_infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise BlockedAddressError(f'{parts.hostname} did not resolve: {e}') from e
+    check_addresses(parts.hostname, address_infos)
+
+
+class ResponseAddressWatch:
+    """
+    Notes every response a browser page gets from an address that isn't public. Requests are checked before
+    the browser sends them, but the browser resolves the host again itself, so a host that rebinds to a private
+    address in between is only caught here, once its response has arrived.
+    """
+
+    def __init__(self, page):
+        self.blocked: List[str] = []
+        client = page._client
+        client.on('Network.requestWillBeSent', self.on_request)
+        client.on('Network.responseReceived', self.on_response)
+
+    def on_request(self, event):
+        # A redirect's response only shows up on the request it led to
+        if 'redirectResponse' in event:
+            self.check_response(event['redirectResponse'])
+
+    def on_response(self, event):
+        self.check_response(event['response'])
+
+    def check_response(self, response):
+        # Empty for responses that didn't come over the network (cache, data: URLs)
+        address = response.get('remoteIPAddress', '').strip('[]')
+        if not address:
+            return
+        try:
+            public = is_public_address(address)
+        except ValueError:
+            public = False
+        if not public:
+            self.blocked.append(f"{response.get('url')} was served from {address}, which is not a public address")
+
+    def check(self):
+        if self.blocked:
+            raise BlockedAddressError(self.blocked[0])
+
+
+def create_public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    # Connects to the addresses that were checked, so a second lookup can't swap in a private one
+    host, port = address
+    error = None
+    for *_, sockaddr in public_address_infos(host, port):
+        try:
+            return socket.create_connection(sockaddr[:2], timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = create_public_connection
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = create_public_connection
+
+
+class PublicHTTPHandler(HTTPHandler):
+    """
+    Opens http URLs, redirects included, only on public addresses.
+    """
+
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(HTTPSHandler):
+    """
+    Opens https URLs, redirects included, only on public addresses.
+    """
+
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context, check_hostname=self._check_hostname)
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import threading
+from typing import Dict
+from urllib.parse import urlsplit
+
+from api.config import SCHEDULE_BYTE_BUDGET_MB, PAGE_BYTE_BUDGET_MB, BANDWIDTH_TOP_HOSTS
+
+logger = logging.getLogger('Bandwidth')
+
+MB = 1024 * 1024
+
+PROXIED = "proxied"
+DIRECT = "direct"
+
+NOT_FETCHED_BYTE_LIMIT = "byte budget exhausted"
+
+
+class ByteBudgetExceededError(Exception):
+
+    def __init__(self, url, received):
+        super().__init__(f"Stopped loading {url} after {received} bytes: byte budget exhausted")
+        self.received = received
+
+
+class Traffic:
+
+    def __init__(self):
+        self.proxied_bytes = 0
+        self.direct_bytes = 0
+        self.requests = 0
+
+    def add(self, route, received, requests=1):
+        if route == PROXIED:
+            self.proxied_bytes += received
+        else:
+            self.direct_bytes += received
+        self.requests += requests
+
+    def as_dict(self):
+        return {"proxied_bytes": self.proxied_bytes, "direct_bytes": self.direct_bytes, "requests": self.requests}
+
+
+class BandwidthMeter:
+    """
+    Bytes a schedule pulled over the network, by category, host and route (through the proxy or direct).
+    Safe to update from download threads.
+    """
+
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = budget_bytes
+        self.total = Traffic()
+        self.categories: Dict[str, Traffic] = {}
+        self.hosts: Dict[str, Traffic] = {}
+        self.pages_aborted = 0
+        self.lock = threading.Lock()
+
+    def record(self, category, url, route, received, requests=1):
+        host = urlsplit(url).hostname or "unknown"
+        with self.lock:
+            self.total.add(route, received, requests)
+            self.categories.setdefault(category, Traffic()).add(route, received, requests)
+            self.hosts.setdefault(host, Traffic()).add(route, received, requests)
+
+    def bytes_used(self):
+        return self.total.proxied_bytes + self.total.direct_bytes
+
+    def exhausted_reason(self) -> str | None:
+        if self.budget_bytes is not None and self.bytes_used() >= self.budget_bytes:
+            return NOT_FETCHED_BYTE_LIMIT
+        return None
+
+    def category_summary(self, category):
+        with self.lock:
+            return self.categories.get(category, Traffic()).as_dict()
+
+    def summary(self):
+        with self.lock:
+            hosts = sorted(self.hosts.items(), key=lambda item: item[1].proxied_bytes + item[1].direct_bytes, reverse=True)
+            return {
+                **self.total.as_dict(),
+                "budget_bytes": self.budget_bytes,
+                "pages_aborted": self.pages_aborted,
+                "categories": {category: traffic.as_dict() for category, traffic in self.categories.items()},
+                "top_hosts": {host: traffic.as_dict() for host, traffic in hosts[:BANDWIDTH_TOP_HOSTS]},
+            }
+
+
+class PageMeter:
+    """
+    Counts what a browser page receives from the DevTools network events and records each finished
+    request on the schedule's meter. Loading is stopped once the page runs over its own budget or the
+    schedule over its budget.
+    """
+
+    def __init__(self, page, meter: BandwidthMeter, category, route, budget_bytes=None):
+        self.page = page
+        self.meter = meter
+        self.category = category
+        self.route = route
+        self.budget_bytes = budget_bytes
+        self.urls: Dict[str, str] = {}
+        self.in_progress: Dict[str, int] = {}
+        self.received = 0
+        self.aborted = False
+        client = page._client
+        client.on('Network.requestWillBeSent', self.on_request)
+        client.on('Network.dataReceived', self.on_data)
+        client.on('Network.loadingFinished', self.on_finished)
+        client.on('Network.loadingFailed', self.on_failed)
+
+    def on_request(self, event):
+        self.urls[event['requestId']] = event['request']['url']
+
+    def on_data(self, event):
+        request_id = event['requestId']
+        self.in_progress[request_id] = self.in_progress.get(request_id, 0) + event.get('encodedDataLength', 0)
+        self.check_budget(event.get('encodedDataLength', 0))
+
+    def on_finished(self, event):
+        # encodedDataLength of the finished request includes headers; it replaces the running count of its body
+        request_id = event['requestId']
+        streamed = self.in_progress.pop(request_id, 0)
+        total = int(event.get('encodedDataLength', 0))
+        self.settle(request_id, total)
+        self.check_budget(max(total - streamed, 0))
+
+    def on_failed(self, event):
+        request_id = event['requestId']
+        self.settle(request_id, self.in_progress.pop(request_id, 0))
+
+    def settle(self, request_id, received):
+        url = self.urls.pop(request_id, '')
+        if received:
+            self.meter.record(self.category, url, self.route, received)
+
+    def check_budget(self, received):
+        self.received += received
+        if self.aborted:
+            return
+        over_page_budget = self.budget_bytes is not None and self.received >= self.budget_bytes
+        # Bytes still in flight aren't on the schedule's meter yet
+        in_flight = sum(self.in_progress.values())
+        over_schedule_budget = (self.meter.budget_bytes is not None
+                                and self.meter.bytes_used() + in_flight >= self.meter.budget_bytes)
+        if over_page_budget or over_schedule_budget:
+            self.aborted = True
+            with self.meter.lock:
+                self.meter.pages_aborted += 1
+            logger.info(f"Stopping page load after {self.received} bytes: "
+                        f"{'page' if over_page_budget else 'schedule'} byte budget exhausted")
+            asyncio.ensure_future(self.stop_loading())
+
+    async def stop_loading(self):
+        try:
+            await self.page._client.send('Page.stopLoading')
+        except Exception as e:
+            logger.debug(f"Error stopping page load: {e}")
+
+    def error(self, url):
+        return ByteBudgetExceededError(url, self.received) if self.aborted else None
+
+
+class DownloadMeter:
+    """
+    Counts what a download reads, recording it on the schedule's meter as it arrives so that downloads which
+    fail, time out or are cut short are counted too. `add` is called from the download threads.
+    """
+
+    def __init__(self, meter: BandwidthMeter, category, url, route):
+        self.meter = meter
+        self.category = category
+        self.url = url
+        self.route = route
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def add(self, received):
+        with self.lock:
+            first = self.received == 0
+            self.received += received
+        # Counted as one request, on its first bytes
+        self.meter.record(self.category, self.url, self.route, received, requests=1 if first else 0)
+
+
+_schedule_meters: Dict[str, BandwidthMeter] = {}
+
+
+def open_schedule_bandwidth_meter(schedule_id) -> BandwidthMeter:
+    meter = BandwidthMeter(SCHEDULE_BYTE_BUDGET_MB * MB or None)
+    _schedule_meters[schedule_id] = meter
+    return meter
+
+
+def get_schedule_bandwidth_meter(schedule_id) -> BandwidthMeter:
+    """
+    The schedule's meter; pages of unregistered schedules get a throwaway one.
+    """
+    meter = _schedule_meters.get(schedule_id)
+    return meter if meter is not None else BandwidthMeter()
+
+
+def close_schedule_bandwidth_meter(schedule_id) -> BandwidthMeter | None:
+    return _schedule_meters.pop(schedule_id, None)
+
+
+def meter_page(page, meter: BandwidthMeter, category, route) -> PageMeter:
+    return PageMeter(page, meter, category, route, PAGE_BYTE_BUDGET_MB * MB or None)
@@ -0,0 +1,105 @@
+import time
+
+from api.config import MAX_URLS_PER_SEARCH, MAX_SECONDS_PER_SEARCH
+
+NOT_FETCHED_URL_LIMIT = "url budget exhausted"
+NOT_FETCHED_TIME_LIMIT = "time budget exhausted"
+NOT_FETCHED_DEADLINE = "schedule deadline reached"
+
+# Below this, a URL can't realistically be loaded and rendered, so it isn't started
+MIN_SECONDS_PER_URL = 10
+
+
+class TimeBudget:
+    """
+    Wall clock budget shared out over a known number of parts (crawlers, searches).
+    Each part gets an even share of what is left, so time a part doesn't use rolls over to the ones after it.
+    `cut_short` is set once a search on this budget dropped results pages or URLs for lack of time.
+    """
+
+    def __init__(self, seconds, parts=1):
+        self.seconds = seconds
+        self.parts_left = max(parts, 1)
+        self.started_at = time.monotonic()
+        self.cut_short = False
+
+    def remaining_seconds(self):
+        return max(self.seconds - (time.monotonic() - self.started_at), 0)
+
+    def expired(self):
+        return self.remaining_seconds() < MIN_SECONDS_PER_URL
+
+    def take(self, parts=1):
+        """
+        Returns the seconds allotted to the next `parts` parts.
+        """
+        parts = min(parts, self.parts_left)
+        allotted = self.remaining_seconds() * parts / self.parts_left
+        self.parts_left = max(self.parts_left - parts, 1)
+        return allotted
+
+    def sub_budget(self, parts):
+        return TimeBudget(self.take(parts), parts)
+
+
+class SearchBudget:
+    """
+    Caps how many search results are downloaded for one search, by count and/or wall clock time.
+    A limit of None means unlimited. `min_seconds_per_url` stops starting URLs once less than that is left.
+    Running out of time marks `time_budget`, the budget the seconds were taken from, as cut short.
+    """
+
+    def __init__(self, max_urls=None, max_seconds=None, time_limit_reason=NOT_FETCHED_TIME_LIMIT, min_seconds_per_url=0,
+                 time_budget: TimeBudget = None):
+        self.max_urls = max_urls
+        self.max_seconds = max_seconds
+        self.time_limit_reason = time_limit_reason
+        self.min_seconds_per_url = min_seconds_per_url
+        self.time_budget = time_budget
+        self.started_at = time.monotonic()
+        self.urls_used = 0
+
+    def elapsed_seconds(self):
+        return time.monotonic() - self.started_at
+
+    def remaining_seconds(self):
+        if self.max_seconds is None:
+            return None
+        return max(self.max_seconds - self.elapsed_seconds(), 0)
+
+    def timeout(self, default_seconds):
+        """
+        Per-URL timeout; shrinks to what is left of the budget as it runs out, but not below MIN_SECONDS_PER_URL.
+        """
+        remaining = self.remaining_seconds()
+        return default_seconds if remaining is None else max(min(default_seconds, remaining), MIN_SECONDS_PER_URL)
+
+    def consume_url(self):
+        self.urls_used += 1
+
+    def exhausted_reason(self) -> str | None:
+        if self.max_urls is not None and self.urls_used >= self.max_urls:
+            return NOT_FETCHED_URL_LIMIT
+        if self.max_seconds is not None and self.remaining_seconds() <= self.min_seconds_per_url:
+            # Only asked before starting more work, so running out here means some was dropped
+            if self.time_budget is not None:
+                self.time_budget.cut_short = True
+            return self.time_limit_reason
+        return None
+
+
+def new_search_budget(time_budget: TimeBudget = None) -> SearchBudget:
+    """
+    Builds the budget for the next search from the configured limits and, when the schedule has a deadline,
+    that search's share of the remaining time.
+    """
+    max_urls = MAX_URLS_PER_SEARCH or None
+    max_seconds = MAX_SECONDS_PER_SEARCH or None
+    if time_budget is None:
+        return SearchBudget(max_urls, max_seconds)
+
+    allotted = time_budget.take()
+    if max_seconds is not None and max_seconds < allotted:
+        return SearchBudget(max_urls, max_seconds)
+    # A URL started this close to the deadline would only be cut off by it
+    return SearchBudget(max_urls, allotted, NOT_FETCHED_DEADLINE, MIN_SECONDS_PER_URL, time_budget)
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from api.config import BROWSER_PAGE_SLOTS, PDF_DOWNLOAD_SLOTS, TEXT_EXTRACTION_SLOTS
+
+BROWSER_PAGE = "browser_page"
+PDF_DOWNLOAD = "pdf_download"
+TEXT_EXTRACTION = "text_extraction"
+
+PRIORITY_WEIGHTS = {"HIGH": 4, "NORMAL": 2, "LOW": 1}
+DEFAULT_PRIORITY = "NORMAL"
+UNSCHEDULED = "unscheduled"
+
+
+class SlotStats:
+
+    def __init__(self):
+        self.granted = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def queued(self):
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def dequeued(self, waited_seconds, granted):
+        self.queue_depth -= 1
+        if granted:
+            self.record_grant(waited_seconds)
+
+    def record_grant(self, waited_seconds):
+        self.granted += 1
+        self.total_wait_seconds += waited_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, waited_seconds)
+
+    def as_dict(self):
+        return {
+            "granted": self.granted,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "average_wait_seconds": round(self.total_wait_seconds / self.granted, 3) if self.granted else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+        }
+
+
+class ResourcePool:
+    """
+    Hands out a fixed number of slots of one resource. Waiters are queued per schedule and served by
+    weighted round robin: each schedule with waiters gets up to its weight in grants per turn.
+    """
+
+    def __init__(self, name, capacity, weights: Dict[str, int]):
+        self.name = name
+        self.capacity = capacity
+        self.weights = weights
+        self.in_use = 0
+        self.queues: Dict[str, deque] = {}
+        self.ring: deque = deque()
+        self.turn_grants = 0
+        self.stats: Dict[str, SlotStats] = {}
+
+    def stats_for(self, schedule_id) -> SlotStats:
+        return self.stats.setdefault(schedule_id, SlotStats())
+
+    async def acquire(self, schedule_id):
+        stats = self.stats_for(schedule_id)
+        if self.in_use < self.capacity and not self.ring:
+            self.in_use += 1
+            stats.record_grant(0.0)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        queued_at = time.monotonic()
+        queue = self.queues.setdefault(schedule_id, deque())
+        queue.append(waiter)
+        if schedule_id not in self.ring:
+            self.ring.append(schedule_id)
+        stats.queued()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                stats.dequeued(time.monotonic() - queued_at, granted=True)
+                self.release()
+            else:
+                if waiter in queue:
+                    queue.remove(waiter)
+                stats.dequeued(time.monotonic() - queued_at, granted=False)
+                self._drop_if_idle(schedule_id)
+            raise
+        stats.dequeued(time.monotonic() - queued_at, granted=True)
+
+    def release(self):
+        self.in_use -= 1
+        self._dispatch()
+
+    def _drop_if_idle(self, schedule_id):
+        if not self.queues.get(schedule_id) and schedule_id in self.ring:
+            if self.ring[0] == schedule_id:
+                self.turn_grants = 0
+            self.ring.remove(schedule_id)
+            self.queues.pop(schedule_id, None)
+
+    def _dispatch(self):
+        while self.in_use < self.capacity and self.ring:
+            schedule_id = self.ring[0]
+            queue = self.queues[schedule_id]
+            waiter = queue.popleft()
+            if not waiter.cancelled():
+                self.in_use += 1
+                waiter.set_result(None)
+                self.turn_grants += 1
+
+            if not queue:
+                self.turn_grants = 0
+                self.ring.popleft()
+                self.queues.pop(schedule_id)
+            elif self.turn_grants >= self.weights.get(schedule_id, PRIORITY_WEIGHTS[DEFAULT_PRIORITY]):
+                self.turn_grants = 0
+                self.ring.rotate(-1)
+
+
+class FairScheduler:
+    """
+    Shares browser pages, PDF downloads and text extraction between the schedules a worker runs at once,
+    so a large schedule can't starve small ones.
+    """
+
+    def __init__(self, capacities: Dict[str, int]):
+        self.weights: Dict[str, int] = {}
+        self.pools = {name: ResourcePool(name, capacity, self.weights) for name, capacity in capacities.items()}
+
+    def register(self, schedule_id, priority=DEFAULT_PRIORITY):
+        self.weights[schedule_id] = PRIORITY_WEIGHTS.get(priority or DEFAULT_PRIORITY, PRIORITY_WEIGHTS[DEFAULT_PRIORITY])
+
+    def unregister(self, schedule_id):
+        """
+        Forgets the schedule and returns its per-resource stats.
+        """
+        stats = self.get_stats(schedule_id)
+        self.weights.pop(schedule_id, None)
+        for pool in self.pools.values():
+            pool.stats.pop(schedule_id, None)
+        return stats
+
+    def get_stats(self, schedule_id):
+        return {name: pool.stats_for(schedule_id).as_dict() for name, pool in self.pools.items()}
+
+    @asynccontextmanager
+    async def slot(self, resource, schedule_id=None):
+        pool = self.pools[resource]
+        schedule_id = schedule_id or UNSCHEDULED
+        await pool.acquire(schedule_id)
+        try:
+            yield
+        finally:
+            pool.release()
+
+
+fair_scheduler = FairScheduler({
+    BROWSER_PAGE: BROWSER_PAGE_SLOTS,
+    PDF_DOWNLOAD: PDF_DOWNLOAD_SLOTS,
+    TEXT_EXTRACTION: TEXT_EXTRACTION_SLOTS,
+})
@@ -1,15 +1,57 @@
 import json
 
+FETCHED = "fetched"
+FAILED = "failed"
+NOT_FETCHED = "not fetched"
+
+
 class ManifestEntry :
 
     def __init__(self, url, file_number, status=False):
         self.url = url
         self.file_number = file_number
         self.status = status
+        self.original_size = None
+        self.optimized_size = None
+        self.rank = None
+        self.title = None
+        self.snippet = None
+        self.score = None
+        self.fetch_status = None
+        self.not_fetched_reason = None
+        self.cluster = None
+        self.duplicate_of = None
+        self.dropped = False
+        self.attempts = 0
+        self.last_error = None
+        self.partial = False
+        self.bytes_received = 0
 
     def set_status(self, status):
         self.status = status
 
+    def set_search_result(self, search_result):
+        self.rank = search_result.rank
+        self.title = search_result.title
+        self.snippet = search_result.snippet
+        self.score = search_result.score
+
+    def mark_not_fetched(self, reason):
+        self.fetch_status = NOT_FETCHED
+        self.not_fetched_reason = reason
+
+    def set_partial(self, partial):
+        self.partial = partial
+
+    def record_attempt(self, error=None, bytes_received=0):
+        self.attempts += 1
+        self.bytes_received += bytes_received
+        self.last_error = str(error) if error is not None else None
+
+    def set_sizes(self, original_size, optimized_size):
+        self.original_size = original_size
+        self.optimized_size = optimized_size
+
     def json_dump(self):
         return json.dumps(self.__dict__, indent=4)
 
@@ -17,17 +59,34 @@ class Manifest:
     def __init__(self):
         self.entries = []
         self.success_rate = 0.0
+        self.not_searched_reason = None
+        self.bandwidth = None
+
+    def mark_not_searched(self, reason):
+        self.not_searched_reason = reason
 
     def calculate_success_rate(self):
-        total_entries = len(self.entries)
-        total_success = len(list(filter(lambda obj: obj.status is True, self.entries)))
-        self.success_rate = (total_success/total_entries)*100
+        attempted_entries = list(filter(lambda obj: obj.fetch_status != NOT_FETCHED, self.entries))
+        total_success = len(list(filter(lambda obj: obj.status is True, attempted_entries)))
+        self.success_rate = (total_success/len(attempted_entries))*100 if attempted_entries else 0.0
+
 
+    def set_bandwidth(self, bandwidth):
+        self.bandwidth = bandwidth
 
     def add(self, entry: ManifestEntry):
+        if entry.fetch_status is None:
+            entry.fetch_status = FETCHED if entry.status else FAILED
         self.entries.append(entry)
         self.calculate_success_rate()
 
+    def retried(self, entry: ManifestEntry):
+        """
+        Updates the manifest after a failed entry was tried again.
+        """
+        entry.fetch_status = FETCHED if entry.status else FAILED
+        self.calculate_success_rate()
+
 
     def json_dump(self):
         return json.dumps(self.__dict__, indent=4)
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pymupdf
+
+from api.config import PDF_OPTIMIZATION_WORKERS
+
+logger = logging.getLogger('PDF Utils')
+
+_pdf_executor: ProcessPoolExecutor | None = None
+
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """
+    Returns the worker pool shared by CPU heavy PDF work; created on first use.
+    """
+    global _pdf_executor
+    if _pdf_executor is None:
+        _pdf_executor = ProcessPoolExecutor(max_workers=PDF_OPTIMIZATION_WORKERS)
+    return _pdf_executor
+
+
+async def run_in_pdf_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pdf_executor(), func, *args)
+
+
+class FinalizedPdf:
+
+    def __init__(self, content: bytes, text: str | None, original_size: int, partial: bool):
+        self.content = content
+        self.text = text
+        self.original_size = original_size
+        self.partial = partial
+
+
+def optimize_document(doc, image_dpi: int, image_quality: int) -> bytes:
+    """
+    Saves the document compactly: downsamples images above `image_dpi`, subsets embedded fonts,
+    drops unused objects and deflates streams.
+    """
+    if image_dpi and hasattr(doc, 'rewrite_images'):
+        doc.rewrite_images(dpi_threshold=int(image_dpi * 1.2), dpi_target=image_dpi, quality=image_quality)
+    doc.subset_fonts()
+    return doc.tobytes(garbage=4, deflate=True, deflate_images=True, deflate_fonts=True, clean=True)
+
+
+def finalize_pdf(pdf_bytes: bytes, cover_text: str = None, max_pages: int = None, optimize=False,
+                 image_dpi: int = None, image_quality: int = None, extract_text=True) -> FinalizedPdf:
+    """
+    Everything done to a fetched PDF before it is stored, in one open and one save:
+    keeps the first `max_pages` pages of a truncated download (MuPDF recovers the objects it finds when the
+    cross-reference table is missing), adds a cover page with `cover_text`, extracts the text and optionally
+    optimizes the result, kept only when it is smaller.
+    """
+    doc = pymupdf.open(stream=pdf_bytes, filetype='pdf')
+    try:
+        if max_pages is not None:
+            if doc.page_count == 0:
+                raise ValueError('No pages could be recovered from the partial download')
+            if doc.page_count > max_pages:
+                doc.select(list(range(max_pages)))
+        if cover_text:
+            doc.insert_page(0, cover_text)
+        text = ''.join(doc.load_page(page_num).get_text() for page_num in range(doc.page_count)) if extract_text else None
+        if cover_text or max_pages is not None:
+            content = doc.tobytes(garbage=3 if max_pages is not None else 0, deflate=max_pages is not None)
+        else:
+            content = pdf_bytes
+        if optimize:
+            optimized = optimize_document(doc, image_dpi, image_quality)
+            # Already compact documents can come out larger
+            if len(optimized) < len(content):
+                content = optimized
+    finally:
+        doc.close()
+    return FinalizedPdf(content, text, len(pdf_bytes), max_pages is not None)
@@ -0,0 +1,88 @@
+import math
+import re
+from functools import lru_cache
+from typing import List
+from urllib.parse import unquote, urlparse
+
+# Sites that list every company/person and rarely hold due diligence findings
+LOW_VALUE_DOMAINS = ["zaubacorp.com", "tofler.in", "justdial.com", "indiamart.com", "tradeindia.com",
+                     "linkedin.com", "facebook.com", "instagram.com", "twitter.com", "x.com", "youtube.com",
+                     "pinterest.com", "glassdoor.com", "ambitionbox.com", "naukri.com", "indeed.com",
+                     "thecompanycheck.com", "falconebiz.com", "instafinancials.com", "companydetails.in",
+                     "allbiz.in", "dnb.com", "crunchbase.com", "zoominfo.com", "opencorporates.com"]
+
+# Regulators, courts and government sources
+HIGH_VALUE_DOMAIN_SUFFIXES = [".gov", ".gov.in", ".nic.in", ".court", "sebi.gov.in", "rbi.org.in", "mca.gov.in",
+                              "bseindia.com", "nseindia.com", "indiankanoon.org", "ofac.treasury.gov"]
+
+KEYWORD_WEIGHT = 2.0
+MAX_KEYWORD_HITS = 5
+NAME_WEIGHT = 4.0
+DOMAIN_WEIGHT = 3.0
+RANK_WEIGHT = 3.0
+
+# Word characters, including Devanagari vowel signs and virama which \w doesn't cover
+WORD_CHARS = r'\w\u0900-\u097F'
+
+
+class SearchResult:
+
+    def __init__(self, url, rank, title='', snippet=''):
+        self.url = url
+        self.rank = rank
+        self.title = title
+        self.snippet = snippet
+        self.score = 0.0
+
+
+def domain_matches(host, domain):
+    domain = domain.lstrip('.')
+    return host == domain or host.endswith('.' + domain)
+
+
+def domain_quality(url) -> float:
+    host = (urlparse(url).hostname or '').lower()
+    if any(domain_matches(host, domain) for domain in LOW_VALUE_DOMAINS):
+        return -1.0
+    if any(domain_matches(host, suffix) for suffix in HIGH_VALUE_DOMAIN_SUFFIXES):
+        return 1.0
+    return 0.0
+
+
+def name_match(text, actor_names: List[str]) -> float:
+    best = 0.0
+    for name in actor_names:
+        name = name.lower().strip()
+        if not name:
+            continue
+        if name in text:
+            return 1.0
+        tokens = [token for token in name.split() if len(token) > 2]
+        if tokens:
+            best = max(best, sum(1 for token in tokens if token in text) / len(tokens))
+    return best
+
+
+@lru_cache(maxsize=1024)
+def term_pattern(term):
+    # Whole words only, so "fine" doesn't match "define" nor "ban" "bank"
+    return re.compile(rf'(?<![{WORD_CHARS}]){re.escape(term.lower())}(?![{WORD_CHARS}])')
+
+
+def score_search_result(result: SearchResult, risk_terms: List[str], actor_names: List[str]) -> float:
+    text = f'{result.title} {result.snippet} {unquote(result.url)}'.lower()
+    keyword_hits = sum(1 for term in risk_terms if term_pattern(term).search(text))
+    return (KEYWORD_WEIGHT * min(keyword_hits, MAX_KEYWORD_HITS)
+            + NAME_WEIGHT * name_match(text, actor_names)
+            + DOMAIN_WEIGHT * domain_quality(result.url)
+            + RANK_WEIGHT / math.sqrt(result.rank))
+
+
+def rank_search_results(results: List[SearchResult], risk_terms: List[str], actor_names: List[str]) -> List[SearchResult]:
+    """
+    Scores each result by risk keyword hits, vendor/director name match, domain quality and search rank,
+    and returns them best first. Ties keep the search engine's order.
+    """
+    for result in results:
+        result.score = round(score_search_result(result, risk_terms, actor_names), 3)
+    return sorted(results, key=lambda result: (-result.score, result.rank))
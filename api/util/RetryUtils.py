@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import random
+from typing import Dict, List
+from urllib.error import HTTPError, URLError
+
+from api.config import (
+    RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS, DEFERRED_RETRY_BUDGET_RATIO, DEFERRED_RETRY_MIN_BUDGET
+)
+from api.util.BandwidthUtils import ByteBudgetExceededError
+
+logger = logging.getLogger('Retry')
+
+# Worth another try later, possibly through another route
+RETRYABLE_STATUSES = {403, 408, 425, 429, 500, 502, 503, 504, 520, 521, 522, 523, 524}
+
+# Chromium net errors that won't go away by trying again
+PERMANENT_NET_ERRORS = ["ERR_NAME_NOT_RESOLVED", "ERR_INVALID_URL", "ERR_UNKNOWN_URL_SCHEME", "ERR_BLOCKED_BY_CLIENT",
+                        "ERR_BLOCKED_BY_RESPONSE", "ERR_INVALID_RESPONSE", "ERR_FILE_NOT_FOUND", "ERR_TOO_MANY_REDIRECTS",
+                        "ERR_UNSAFE_REDIRECT", "ERR_DISALLOWED_URL_SCHEME"]
+
+
+class HttpStatusError(Exception):
+
+    def __init__(self, url, status):
+        super().__init__(f"{url} answered with HTTP {status}")
+        self.status = status
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Classifies a fetch failure: True for transient ones (timeouts, dropped connections, proxy hiccups,
+    throttling, server errors), False for ones that will fail the same way again.
+    """
+    if isinstance(error, HttpStatusError):
+        # No status means no response came back at all
+        return error.status is None or error.status in RETRYABLE_STATUSES
+    if isinstance(error, HTTPError):
+        return error.code in RETRYABLE_STATUSES
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError, URLError)):
+        return True
+    if isinstance(error, (ValueError, TypeError, ByteBudgetExceededError)):
+        return False
+    message = str(error)
+    return not any(net_error in message for net_error in PERMANENT_NET_ERRORS)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: attempt n waits a random time up to base * 2^(n-1), capped at max.
+    """
+
+    def __init__(self, max_attempts=3, base_delay_seconds=RETRY_BASE_DELAY_SECONDS,
+                 max_delay_seconds=RETRY_MAX_DELAY_SECONDS):
+        self.max_attempts = max_attempts
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+
+    def delay(self, attempt) -> float:
+        """
+        Seconds to wait after the given (1-based) failed attempt.
+        """
+        return random.uniform(0, min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (attempt - 1)))
+
+    async def run(self, operation, description):
+        """
+        Awaits `operation()` until it succeeds, fails permanently or runs out of attempts, and returns
+        its result. The last error is raised.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await operation()
+            except Exception as e:
+                if attempt == self.max_attempts or not is_retryable(e):
+                    raise
+                delay = self.delay(attempt)
+                logger.info(f"{description} failed (attempt {attempt}): {e}. Retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+class DeferredRetry:
+
+    def __init__(self, manifest, manifest_entry, working_dir, use_proxy, error):
+        self.manifest = manifest
+        self.manifest_entry = manifest_entry
+        self.working_dir = working_dir
+        self.use_proxy = use_proxy
+        self.error = error
+
+
+class RetryQueue:
+    """
+    URLs of a schedule that failed for transient reasons, tried again once the schedule's searches are done.
+    Retries are capped at a share of the URLs attempted, so a bad proxy or site outage can't double the schedule.
+    """
+
+    def __init__(self, budget_ratio=DEFERRED_RETRY_BUDGET_RATIO, min_budget=DEFERRED_RETRY_MIN_BUDGET):
+        self.budget_ratio = budget_ratio
+        self.min_budget = min_budget
+        self.attempted = 0
+        self.retries_used = 0
+        self.pending: List[DeferredRetry] = []
+
+    def record_attempt(self):
+        self.attempted += 1
+
+    def defer(self, retry: DeferredRetry):
+        self.pending.append(retry)
+
+    def retry_budget(self) -> int:
+        return max(int(self.attempted * self.budget_ratio), self.min_budget)
+
+    def try_spend(self) -> bool:
+        if self.retries_used >= self.retry_budget():
+            return False
+        self.retries_used += 1
+        return True
+
+
+_schedule_retry_queues: Dict[str, RetryQueue] = {}
+
+
+def open_schedule_retry_queue(schedule_id) -> RetryQueue:
+    retry_queue = RetryQueue()
+    _schedule_retry_queues[schedule_id] = retry_queue
+    return retry_queue
+
+
+def get_schedule_retry_queue(schedule_id) -> RetryQueue | None:
+    return _schedule_retry_queues.get(schedule_id)
+
+
+def close_schedule_retry_queue(schedule_id) -> RetryQueue | None:
+    return _schedule_retry_queues.pop(schedule_id, None)
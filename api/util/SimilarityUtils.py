@@ -0,0 +1,82 @@
+import hashlib
+import random
+import re
+from typing import Dict, List, Set
+
+from api.config import DEDUPLICATION_THRESHOLD
+
+# Words per shingle
+SHINGLE_SIZE = 5
+# Texts shorter than this (error pages, paywalls, empty renders) are too thin to compare
+MIN_TOKENS = 50
+
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows make pairs above ~0.7 Jaccard likely candidates; candidates are then checked against the threshold
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+# Fixed seed so signatures stay comparable across workers and with stored vendor history
+_random = random.Random(1729)
+PERMUTATIONS = [(_random.randint(1, MERSENNE_PRIME - 1), _random.randint(0, MERSENNE_PRIME - 1))
+                for _ in range(NUM_PERMUTATIONS)]
+
+NON_WORD = re.compile(r'[^\w\u0900-\u097F]+')
+
+
+def tokenize(text: str) -> List[str]:
+    # Devanagari vowel signs aren't \w, so the block is kept whole to not split Hindi words
+    return NON_WORD.sub(' ', text.lower()).split()
+
+
+def shingles(tokens: List[str]) -> Set[int]:
+    hashed = set()
+    for start in range(len(tokens) - SHINGLE_SIZE + 1):
+        shingle = ' '.join(tokens[start:start + SHINGLE_SIZE]).encode('utf-8')
+        hashed.add(int.from_bytes(hashlib.blake2b(shingle, digest_size=4).digest(), 'little'))
+    return hashed
+
+
+def minhash_signature(text: str) -> List[int] | None:
+    """
+    MinHash signature of the text's word shingles, or None if the text is too short to compare.
+    """
+    tokens = tokenize(text)
+    if len(tokens) < MIN_TOKENS:
+        return None
+    hashed = shingles(tokens)
+    return [min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashed) for a, b in PERMUTATIONS]
+
+
+def estimated_similarity(signature: List[int], other: List[int]) -> float:
+    return sum(1 for x, y in zip(signature, other) if x == y) / NUM_PERMUTATIONS
+
+
+class LshIndex:
+    """
+    Banded LSH over MinHash signatures. `query` returns the ids already added whose estimated
+    Jaccard similarity to the signature is at least the threshold.
+    """
+
+    def __init__(self, threshold=DEDUPLICATION_THRESHOLD):
+        self.threshold = threshold
+        self.signatures: Dict[str, List[int]] = {}
+        self.buckets: List[Dict[tuple, List[str]]] = [{} for _ in range(LSH_BANDS)]
+
+    def bands(self, signature):
+        for band in range(LSH_BANDS):
+            yield band, tuple(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])
+
+    def add(self, item_id: str, signature: List[int]):
+        self.signatures[item_id] = signature
+        for band, key in self.bands(signature):
+            self.buckets[band].setdefault(key, []).append(item_id)
+
+    def query(self, signature: List[int]) -> List[str]:
+        candidates = set()
+        for band, key in self.bands(signature):
+            candidates.update(self.buckets[band].get(key, []))
+        matches = [(estimated_similarity(signature, self.signatures[item_id]), item_id) for item_id in candidates]
+        return [item_id for similarity, item_id in sorted(matches, reverse=True) if similarity >= self.threshold]
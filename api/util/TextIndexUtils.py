@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List
+
+from api.config import (
+    BUCKET_NAME, TEXT_INDEX_ENABLED, TEXT_INDEX_CACHE_DIR, TEXT_INDEX_CACHE_SIZE
+)
+
+logger = logging.getLogger('Text Index')
+
+TEXT_INDEX_NAME = "text_index.sqlite"
+
+# unicode61 treats Devanagari vowel signs, virama and nukta as separators, which splits Hindi words apart
+DEVANAGARI_MARKS = ''.join(chr(code) for first, last in [(0x0900, 0x0903), (0x093A, 0x094F), (0x0951, 0x0957),
+                                                        (0x0962, 0x0963)]
+                           for code in range(first, last + 1))
+TOKENIZER = f"unicode61 remove_diacritics 2 tokenchars '{DEVANAGARI_MARKS}'"
+
+SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+        schedule_id UNINDEXED, category UNINDEXED, file_number UNINDEXED, url UNINDEXED,
+        title, body, risk_terms, tokenize="{TOKENIZER}")""",
+    "CREATE TABLE IF NOT EXISTS risk_terms(term TEXT PRIMARY KEY, language TEXT)",
+]
+
+# bm25 weights for title, body and risk_terms; unindexed columns take 0
+BM25_WEIGHTS = "0, 0, 0, 0, 5.0, 1.0, 2.0"
+SNIPPET_TOKENS = 16
+MAX_SEARCH_LIMIT = 100
+
+
+def to_match_query(query: str, match_any=False) -> str | None:
+    """
+    Quotes each word so user input can't trip FTS5 query syntax. Words must all match unless `match_any`.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    if not terms:
+        return None
+    return (' OR ' if match_any else ' ').join(terms)
+
+
+class TextIndex:
+    """
+    SQLite FTS5 index over the texts of one schedule, one row per fetched result.
+    Safe to share between threads; writes are serialized.
+    """
+
+    def __init__(self, db_path, read_only=False):
+        self.db_path = db_path
+        if read_only:
+            self.connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(db_path, check_same_thread=False)
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+        self.lock = threading.Lock()
+        self.risk_terms: List[str] = []
+
+    def set_risk_terms(self, risk_terms: Dict[str, List[str]]):
+        """
+        Stores the risk keywords (by language) that each document is tagged with.
+        """
+        with self.lock, self.connection:
+            for language, terms in risk_terms.items():
+                self.connection.executemany("INSERT OR REPLACE INTO risk_terms(term, language) VALUES (?, ?)",
+                                            [(term, language) for term in terms])
+            self.risk_terms = [row[0] for row in self.connection.execute("SELECT term FROM risk_terms ORDER BY term")]
+
+    def add_document(self, schedule_id, category, file_number, url, title, text) -> List[str]:
+        """
+        Indexes a result's text and returns the risk keywords found in it.
+        """
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO documents(schedule_id, category, file_number, url, title, body) VALUES (?, ?, ?, ?, ?, ?)",
+                (schedule_id, category, str(file_number), url, title or '', text))
+            rowid = cursor.lastrowid
+            # Phrase match on whole tokens, so "court" doesn't tag "courtesy" and multi-word terms match in order
+            found = [term for term in self.risk_terms
+                     if self.connection.execute("SELECT 1 FROM documents WHERE rowid = ? AND documents MATCH ?",
+                                                (rowid, 'body:"' + term.replace('"', '""') + '"')).fetchone()]
+            if found:
+                self.connection.execute("UPDATE documents SET risk_terms = ? WHERE rowid = ?", ('; '.join(found), rowid))
+        return found
+
+    def remove_document(self, category, file_number):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM documents WHERE category = ? AND file_number = ?",
+                                    (category, str(file_number)))
+
+    def search(self, query, limit=20, category=None, match_any=False) -> List[Dict]:
+        match_query = to_match_query(query, match_any)
+        if match_query is None:
+            return []
+        sql = (f"SELECT category, file_number, url, title, risk_terms, bm25(documents, {BM25_WEIGHTS}) AS score, "
+               f"snippet(documents, 5, '[', ']', '…', {SNIPPET_TOKENS}) "
+               f"FROM documents WHERE documents MATCH ?")
+        parameters = [match_query]
+        if category:
+            sql += " AND category = ?"
+            parameters.append(category)
+        sql += " ORDER BY score LIMIT ?"
+        parameters.append(min(limit, MAX_SEARCH_LIMIT))
+        with self.lock:
+            rows = self.connection.execute(sql, parameters).fetchall()
+        return [{
+            "category": category,
+            "file_number": file_number,
+            "url": url,
+            "title": title,
+            "risk_terms": risk_terms.split('; ') if risk_terms else [],
+            # bm25() is lower for better matches
+            "score": round(-score, 4),
+            "snippet": snippet,
+        } for category, file_number, url, title, risk_terms, score, snippet in rows]
+
+    def serialize(self) -> bytes:
+        """
+        The database as the content of a SQLite file.
+        """
+        with self.lock:
+            return self.connection.serialize()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+_schedule_indexes: Dict[str, TextIndex] = {}
+
+
+def schedule_index_path(directory, schedule_id) -> str:
+    """
+    Path of the schedule's index file in `directory`; raises ValueError for an id that would leave it.
+    """
+    root = os.path.realpath(directory)
+    db_path = os.path.realpath(os.path.join(root, f"{schedule_id}.sqlite"))
+    if os.path.dirname(db_path) != root:
+        raise ValueError(f"Invalid schedule_id: {schedule_id}")
+    return db_path
+
+
+def open_schedule_text_index(schedule_id, risk_terms: Dict[str, List[str]]) -> TextIndex | None:
+    """
+    Opens the schedule's index. It is built in memory and only written out, through the schedule's storage,
+    when the schedule closes it; so nothing touches local disk in S3 mode.
+    """
+    if not TEXT_INDEX_ENABLED:
+        return None
+    text_index = TextIndex(':memory:')
+    text_index.set_risk_terms(risk_terms)
+    _schedule_indexes[schedule_id] = text_index
+    return text_index
+
+
+def get_schedule_text_index(schedule_id) -> TextIndex | None:
+    return _schedule_indexes.get(schedule_id)
+
+
+def close_schedule_text_index(schedule_id) -> bytes | None:
+    """
+    Closes the schedule's index and returns the database content, or None if it had none.
+    """
+    text_index = _schedule_indexes.pop(schedule_id, None)
+    if text_index is None:
+        return None
+    try:
+        return text_index.serialize()
+    finally:
+        text_index.close()
+
+
+def evict_cached_indexes():
+    cached = sorted((entry for entry in os.scandir(TEXT_INDEX_CACHE_DIR) if entry.name.endswith('.sqlite')),
+                    key=lambda entry: entry.stat().st_mtime)
+    for entry in cached[:max(len(cached) - TEXT_INDEX_CACHE_SIZE, 0)]:
+        os.remove(entry.path)
+
+
+def fetch_cached_index(schedule_id) -> str | None:
+    """
+    Local copy of the schedule's shipped index, downloaded on first use. None if the schedule has no index (yet).
+    """
+    from botocore.exceptions import ClientError
+    from api.modules.aws_clients import get_s3_client
+
+    db_path = schedule_index_path(TEXT_INDEX_CACHE_DIR, schedule_id)
+    if os.path.exists(db_path):
+        os.utime(db_path)
+        return db_path
+    os.makedirs(TEXT_INDEX_CACHE_DIR, exist_ok=True)
+    download_path = f"{db_path}.{threading.get_ident()}.part"
+    try:
+        get_s3_client().download_file(BUCKET_NAME, f"{schedule_id}/{TEXT_INDEX_NAME}", download_path)
+    except ClientError as e:
+        logger.info(f"No text index for {schedule_id}: {e}")
+        return None
+    os.replace(download_path, db_path)
+    evict_cached_indexes()
+    return db_path
+
+
+def search_schedule(schedule_id, query, limit=20, category=None, match_any=False) -> List[Dict] | None:
+    db_path = fetch_cached_index(schedule_id)
+    if db_path is None:
+        return None
+    text_index = TextIndex(db_path, read_only=True)
+    try:
+        return text_index.search(query, limit, category, match_any)
+    finally:
+        text_index.close()
+
+
+async def search_schedule_text(schedule_id, query, limit=20, category=None, match_any=False) -> List[Dict] | None:
+    return await asyncio.to_thread(search_schedule, schedule_id, query, limit, category, match_any)
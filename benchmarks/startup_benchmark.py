@@ -0,0 +1,61 @@
+"""
+Measures how long it takes to import the FastAPI app and checks that heavy libraries stay out of the import.
+
+    $ python benchmarks/startup_benchmark.py --runs 5 --max-seconds 2.0
+
+Each run imports `api.main` in a fresh interpreter. Exits non-zero when the median import time is over
+`--max-seconds` or when a deferred module got imported.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Crawler-only libraries, plus boto3 which the API only loads when its clients are created during startup
+DEFERRED_MODULES = ["pyppeteer", "pyppeteer_stealth", "bs4", "fitz", "pymupdf", "humanize", "psutil", "boto3",
+                    "api.crawlers.crawler_orchestrator", "api.handlers.web_event_handler",
+                    "api.page_objects.capture_page"]
+
+IMPORT_SCRIPT = f'''
+import json, sys, time
+started_at = time.perf_counter()
+import api.main
+elapsed = time.perf_counter() - started_at
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))
+'''
+
+
+def measure_once():
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=REPO_ROOT, capture_output=True, text=True,
+                            check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API startup time benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    measurements = [measure_once() for _ in range(args.runs)]
+    timings = [measurement["seconds"] for measurement in measurements]
+    loaded = sorted({module for measurement in measurements for module in measurement["loaded"]})
+    median = statistics.median(timings)
+
+    print(f"import api.main: median {median:.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s over {args.runs} runs")
+    failed = False
+    if loaded:
+        print(f"FAIL: deferred modules imported with the API: {', '.join(loaded)}")
+        failed = True
+    if median > args.max_seconds:
+        print(f"FAIL: median import time is over {args.max_seconds:.3f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
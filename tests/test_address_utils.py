@@ -0,0 +1,89 @@
+import asyncio
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api.util import AddressUtils
+from api.util.AddressUtils import BlockedAddressError, ResponseAddressWatch, check_public_url, is_public_address
+from api.util.DownloadUtils import PdfProbe, build_url_opener, download_document
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.0.0.5", "172.16.1.1", "192.168.1.1", "169.254.169.254",
+                                     "100.64.0.1", "0.0.0.0", "224.0.0.1", "::1", "fe80::1%eth0", "fd00:ec2::254",
+                                     "::ffff:127.0.0.1", "100.100.100.200"])
+def test_non_public_addresses_are_refused(address):
+    assert not is_public_address(address)
+
+
+@pytest.mark.parametrize("address", ["8.8.8.8", "151.101.1.69", "2001:4860:4860::8888"])
+def test_public_addresses_are_allowed(address):
+    assert is_public_address(address)
+
+
+@pytest.mark.parametrize("url", ["http://127.0.0.1:8000/", "http://localhost/admin", "http://169.254.169.254/latest/",
+                                 "http://[::1]/", "file:///etc/passwd", "http://0x7f000001/"])
+def test_urls_to_non_public_hosts_are_refused(url):
+    with pytest.raises(BlockedAddressError):
+        asyncio.run(check_public_url(url))
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(302)
+        self.send_header('Location', 'http://169.254.169.254/latest/meta-data/')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_public_only_download_refuses_a_redirect_to_a_private_address(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RedirectHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # The local server stands in for a public one
+    monkeypatch.setattr(AddressUtils, 'is_public_address', lambda address: address == '127.0.0.1')
+    try:
+        with pytest.raises(BlockedAddressError, match='169.254.169.254'):
+            download_document(f'http://127.0.0.1:{server.server_address[1]}/document.pdf', io.BytesIO(), PdfProbe(),
+                              opener=build_url_opener(public_only=True))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.handlers = {}
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+
+class FakePage:
+
+    def __init__(self):
+        self._client = FakeClient()
+
+
+def test_responses_from_rebound_private_addresses_are_caught():
+    page = FakePage()
+    watch = ResponseAddressWatch(page)
+    on_request, on_response = (page._client.handlers[event]
+                               for event in ('Network.requestWillBeSent', 'Network.responseReceived'))
+    on_request({'request': {'url': 'https://example.com/'}})
+    on_response({'response': {'url': 'https://example.com/', 'remoteIPAddress': '93.184.215.14'}})
+    on_response({'response': {'url': 'data:image/png;base64,', 'remoteIPAddress': ''}})
+    on_response({'response': {'url': 'https://example.com/v6', 'remoteIPAddress': '[2001:4860:4860::8888]'}})
+    watch.check()
+
+    on_request({'request': {'url': 'https://example.com/next'},
+                'redirectResponse': {'url': 'https://rebound.example.com/', 'remoteIPAddress': '127.0.0.1'}})
+    on_response({'response': {'url': 'https://rebound.example.com/api', 'remoteIPAddress': '[::1]'}})
+    assert len(watch.blocked) == 2
+    with pytest.raises(BlockedAddressError, match='127.0.0.1'):
+        watch.check()
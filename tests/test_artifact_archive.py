@@ -0,0 +1,94 @@
+import io
+import json
+import zipfile
+
+from api.modules.artifact_archive import INDEX_NAME, write_archive, load_archive_index, read_archive_member
+from api.modules.artifact_storage import s3_object_writer
+
+
+class FakeBody:
+
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+class FakeS3Client:
+    """
+    The S3 calls the archive writer and reader make, kept in memory.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body if isinstance(Body, bytes) else Body.encode('utf-8')
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        return {'ETag': f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(UploadId)
+        self.uploads.pop(UploadId, None)
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[Key]
+        if Range is not None:
+            start, end = Range[len('bytes='):].split('-')
+            data = data[int(start):int(end) + 1]
+        return {'Body': FakeBody(data)}
+
+
+ARTIFACTS = {
+    "schedule-1/Google/1.pdf": b"%PDF-1.7 first result" * 50,
+    "schedule-1/Google/1.txt": "पहला परिणाम, first result".encode('utf-8'),
+    "schedule-1/Google/Hindi/2.pdf": b"%PDF-1.7 second result" * 200,
+    "schedule-1/Google/empty.txt": b"",
+}
+
+
+def write_to_fake_s3(part_size):
+    s3_client = FakeS3Client()
+    with s3_object_writer(s3_client, "bucket", "schedule-1/artifacts.zip", part_size) as writer:
+        index = write_archive(writer, "schedule-1", sorted(ARTIFACTS), ARTIFACTS.get)
+    s3_client.put_object(Bucket="bucket", Key=f"schedule-1/{INDEX_NAME}", Body=json.dumps(index))
+    return s3_client
+
+
+def assert_members_round_trip(s3_client):
+    index = load_archive_index(s3_client, "bucket", "schedule-1")
+    assert sorted(index["members"]) == sorted(key[len("schedule-1/"):] for key in ARTIFACTS)
+    for key, data in ARTIFACTS.items():
+        assert read_archive_member(s3_client, "bucket", "schedule-1", index, key[len("schedule-1/"):]) == data
+    assert read_archive_member(s3_client, "bucket", "schedule-1", index, "Google/missing.pdf") is None
+
+    with zipfile.ZipFile(io.BytesIO(s3_client.objects["schedule-1/artifacts.zip"])) as archive:
+        assert archive.testzip() is None
+        for key, data in ARTIFACTS.items():
+            assert archive.read(key[len("schedule-1/"):]) == data
+
+
+def test_archive_in_a_single_put_round_trips():
+    s3_client = write_to_fake_s3(part_size=1024 * 1024)
+    assert not s3_client.uploads and not s3_client.aborted
+    assert_members_round_trip(s3_client)
+
+
+def test_archive_over_several_parts_round_trips():
+    s3_client = write_to_fake_s3(part_size=512)
+    assert not s3_client.aborted
+    assert_members_round_trip(s3_client)
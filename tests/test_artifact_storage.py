@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from api.modules import artifact_storage, schedule_ledger
+from api.modules.artifact_storage import ArtifactUploadError, LocalDiskStorage
+from api.modules.schedule_ledger import CLAIMED, SqliteScheduleLedger, WORKER_ID, run_schedule_once
+
+
+def staged_storage(tmp_path, monkeypatch, uploaded):
+    async def upload_files_to_s3(bucket_name, schedule_id, root):
+        return uploaded
+
+    monkeypatch.setattr(artifact_storage, "upload_files_to_s3", upload_files_to_s3)
+    monkeypatch.setattr(artifact_storage, "ARTIFACT_PACKAGING", "NONE")
+    storage = LocalDiskStorage(root=str(tmp_path / "artifacts"), bucket_name="bucket", cleanup=True)
+    storage.write_text("schedule-1/Google/1.txt", "first result")
+    return storage
+
+
+def test_incomplete_upload_fails_the_run_and_keeps_the_files(tmp_path, monkeypatch):
+    storage = staged_storage(tmp_path, monkeypatch, uploaded=False)
+    with pytest.raises(ArtifactUploadError):
+        asyncio.run(storage.finalize("schedule-1"))
+    assert storage.read_bytes("schedule-1/Google/1.txt") == b"first result"
+
+
+def test_incomplete_upload_leaves_the_schedule_to_its_redelivery(tmp_path, monkeypatch):
+    ledger = SqliteScheduleLedger(str(tmp_path / "ledger.sqlite"))
+    monkeypatch.setattr(schedule_ledger, "_ledger", ledger)
+    storage = staged_storage(tmp_path, monkeypatch, uploaded=False)
+
+    with pytest.raises(ArtifactUploadError):
+        asyncio.run(run_schedule_once("schedule-1", lambda: storage.finalize("schedule-1")))
+    assert ledger.claim("schedule-1", WORKER_ID, 60).outcome == CLAIMED
+
+
+def test_complete_upload_cleans_up(tmp_path, monkeypatch):
+    storage = staged_storage(tmp_path, monkeypatch, uploaded=True)
+    asyncio.run(storage.finalize("schedule-1"))
+    assert storage.read_bytes("schedule-1/Google/1.txt") is None
@@ -0,0 +1,99 @@
+import pytest
+
+from api.util import BudgetUtils
+from api.util.BudgetUtils import (
+    MIN_SECONDS_PER_URL, NOT_FETCHED_DEADLINE, NOT_FETCHED_TIME_LIMIT, NOT_FETCHED_URL_LIMIT, SearchBudget, TimeBudget,
+    new_search_budget
+)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(BudgetUtils, "time", clock)
+    monkeypatch.setattr(BudgetUtils, "MAX_URLS_PER_SEARCH", 0)
+    monkeypatch.setattr(BudgetUtils, "MAX_SECONDS_PER_SEARCH", 0)
+    return clock
+
+
+def test_unused_time_rolls_over_to_later_parts(clock):
+    budget = TimeBudget(300, parts=3)
+    assert budget.take() == 100
+    clock.now += 40
+    # 260 seconds left over 2 parts
+    assert budget.take() == 130
+    clock.now += 130
+    assert budget.take() == 130
+    assert budget.parts_left == 1
+
+
+def test_sub_budget_gets_its_parts_share(clock):
+    schedule = TimeBudget(600, parts=3)
+    crawler = schedule.sub_budget(2)
+    assert crawler.seconds == 400 and crawler.parts_left == 2
+    assert schedule.parts_left == 1 and schedule.remaining_seconds() == 600
+    assert crawler.take() == 200
+
+
+def test_zero_part_budget_takes_nothing_from_its_parent(clock):
+    schedule = TimeBudget(600, parts=2)
+    crawler = schedule.sub_budget(0)
+    assert crawler.seconds == 0 and crawler.expired()
+    assert schedule.parts_left == 2
+    assert schedule.take() == 300
+    # A budget with no parts hands everything to its first taker
+    assert TimeBudget(100, parts=0).take() == 100
+
+
+def test_search_budget_without_a_deadline_uses_the_configured_limits(clock, monkeypatch):
+    assert new_search_budget().exhausted_reason() is None
+    monkeypatch.setattr(BudgetUtils, "MAX_URLS_PER_SEARCH", 2)
+    monkeypatch.setattr(BudgetUtils, "MAX_SECONDS_PER_SEARCH", 60)
+    budget = new_search_budget()
+    budget.consume_url()
+    assert budget.exhausted_reason() is None
+    budget.consume_url()
+    assert budget.exhausted_reason() == NOT_FETCHED_URL_LIMIT
+
+    budget = new_search_budget()
+    clock.now += 60
+    assert budget.exhausted_reason() == NOT_FETCHED_TIME_LIMIT
+
+
+def test_search_budget_takes_its_share_of_the_deadline(clock):
+    crawler = TimeBudget(200, parts=2)
+    budget = new_search_budget(crawler)
+    assert budget.max_seconds == 100 and budget.time_limit_reason == NOT_FETCHED_DEADLINE
+    assert budget.timeout(120) == 100
+    clock.now += 95
+    # Never below what a URL needs, even right before the deadline
+    assert budget.timeout(120) == MIN_SECONDS_PER_URL
+    assert budget.exhausted_reason() == NOT_FETCHED_DEADLINE
+    assert crawler.cut_short
+
+
+def test_shorter_configured_limit_is_not_a_deadline_cut(clock, monkeypatch):
+    monkeypatch.setattr(BudgetUtils, "MAX_SECONDS_PER_SEARCH", 30)
+    crawler = TimeBudget(200, parts=2)
+    budget = new_search_budget(crawler)
+    assert budget.max_seconds == 30 and budget.time_limit_reason == NOT_FETCHED_TIME_LIMIT
+    clock.now += 30
+    assert budget.exhausted_reason() == NOT_FETCHED_TIME_LIMIT
+    assert not crawler.cut_short
+
+
+def test_search_budget_with_time_left_is_not_cut_short(clock):
+    crawler = TimeBudget(200, parts=1)
+    budget = SearchBudget(None, crawler.take(), NOT_FETCHED_DEADLINE, MIN_SECONDS_PER_URL, crawler)
+    clock.now += 100
+    assert budget.exhausted_reason() is None
+    assert not crawler.cut_short
@@ -0,0 +1,75 @@
+import asyncio
+
+from api.page_objects import capture_page
+from api.page_objects.capture_page import CaptureCache, CaptureResult, capture_url
+from api.util.PdfUtils import FinalizedPdf
+
+
+def capture(url, size):
+    return CaptureResult(url, b"%" * size, None, False)
+
+
+def test_cache_is_bounded_by_total_size():
+    cache = CaptureCache(ttl_seconds=60, max_entries=10, max_bytes=1000)
+    for number in range(4):
+        cache.put((f"https://example.com/{number}", False), capture(f"https://example.com/{number}", 300))
+    assert cache.size == 900
+    assert cache.get(("https://example.com/0", False)) is None
+    assert cache.get(("https://example.com/3", False)) is not None
+
+
+def test_capture_larger_than_the_cache_is_not_cached():
+    cache = CaptureCache(ttl_seconds=60, max_entries=10, max_bytes=1000)
+    cache.put(("https://example.com/small", False), capture("https://example.com/small", 300))
+    cache.put(("https://example.com/huge", False), capture("https://example.com/huge", 5000))
+    assert cache.get(("https://example.com/huge", False)) is None
+    assert cache.get(("https://example.com/small", False)) is not None
+    assert cache.size == 300
+
+
+def test_replacing_an_entry_keeps_the_size_right():
+    cache = CaptureCache(ttl_seconds=60, max_entries=10, max_bytes=1000)
+    cache.put(("https://example.com/", False), capture("https://example.com/", 300))
+    cache.put(("https://example.com/", False), capture("https://example.com/", 200))
+    assert cache.size == 200
+
+
+def test_waiting_on_a_capture_in_progress_is_not_reported_as_cached(monkeypatch):
+    monkeypatch.setattr(capture_page, "_cache", CaptureCache(60, 10, 1000))
+    started = asyncio.Event()
+
+    async def slow_fetch(url, use_proxy):
+        started.set()
+        await asyncio.sleep(0.05)
+        return capture(url, 100)
+
+    monkeypatch.setattr(capture_page, "fetch_capture", slow_fetch)
+
+    async def capture_twice():
+        first = asyncio.create_task(capture_url("https://example.com/"))
+        await started.wait()
+        second = await capture_url("https://example.com/")
+        third = await capture_url("https://example.com/")
+        return await first, second, third
+
+    (first, first_cached), (second, second_cached), (third, third_cached) = asyncio.run(capture_twice())
+    assert first is second is third
+    assert (first_cached, second_cached, third_cached) == (False, False, True)
+
+
+def test_pdf_capture_goes_through_the_proxy_when_asked(monkeypatch):
+    downloads = []
+
+    def fake_download_pdf(url, cancelled=None, use_proxy=False, on_received=None, public_only=False):
+        downloads.append((url, use_proxy, public_only))
+        return b"%PDF", False
+
+    async def fake_finalize(pdf_bytes, cover=False, partial=False, extract_text=True):
+        return FinalizedPdf(pdf_bytes, "text", len(pdf_bytes), partial)
+
+    monkeypatch.setattr(capture_page, "download_pdf", fake_download_pdf)
+    monkeypatch.setattr(capture_page, "finalize_fetched_pdf", fake_finalize)
+    for use_proxy in (False, True):
+        result = asyncio.run(capture_page.fetch_capture("https://example.com/report.pdf", use_proxy))
+        assert result.pdf_bytes == b"%PDF"
+    assert downloads == [("https://example.com/report.pdf", False, True), ("https://example.com/report.pdf", True, True)]
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from api.crawlers import crawler_orchestrator
+from api.crawlers.Crawlers import OfficialWebsiteCrawler
+from api.modules.artifact_storage import LocalDiskStorage
+from api.util.BudgetUtils import NOT_FETCHED_DEADLINE, new_search_budget
+
+
+class FakeCrawler:
+    """
+    Runs its searches instantly; `drop_urls` makes the last one find its time used up before a URL.
+    """
+
+    def __init__(self, searches=1, drop_urls=False, run_down_clock=False):
+        self.searches = searches
+        self.drop_urls = drop_urls
+        self.run_down_clock = run_down_clock
+
+    def get_category(self):
+        return "Fake"
+
+    def get_search_engine_url(self):
+        return "https://search.example"
+
+    def count_searches(self, directors, site_url):
+        return self.searches
+
+    async def crawl(self, actor_name, directors, schedule_id, pages, site_url, time_budget=None):
+        for _ in range(self.searches):
+            budget = new_search_budget(time_budget)
+            if self.drop_urls or self.run_down_clock:
+                budget.started_at -= budget.max_seconds
+            if self.drop_urls:
+                assert budget.exhausted_reason() == NOT_FETCHED_DEADLINE
+
+
+class OfficialWebsite(OfficialWebsiteCrawler):
+
+    def get_search_engine_url(self):
+        return "https://search.example"
+
+
+@pytest.fixture
+def run_crawl(monkeypatch, tmp_path):
+    manifests = []
+
+    async def no_retries(schedule_id, schedule_budget):
+        return None
+
+    async def no_duplicates(storage, schedule_id, vendor_name):
+        return {}
+
+    monkeypatch.setattr(crawler_orchestrator, "retry_deferred_urls", no_retries)
+    monkeypatch.setattr(crawler_orchestrator, "deduplicate_schedule", no_duplicates)
+    monkeypatch.setattr(crawler_orchestrator.resource_governor, "reap_orphaned_chromium", lambda: None)
+    monkeypatch.setattr(crawler_orchestrator, "get_schedule_storage",
+                        lambda schedule_id: LocalDiskStorage(root=str(tmp_path)))
+    monkeypatch.setattr(crawler_orchestrator, "write_schedule_manifest",
+                        lambda storage, schedule_id, manifest: manifests.append(manifest))
+
+    def run(crawlers, website_url=None, deadline_minutes=30):
+        monkeypatch.setattr(crawler_orchestrator, "CRAWLER_REGISTRY", crawlers)
+        asyncio.run(crawler_orchestrator.crawl_schedule("Vendor", "schedule-1", 1, [], website_url,
+                                                        [name.upper() for name in crawlers], deadline_minutes, None))
+        return manifests[-1]
+
+    return run
+
+
+def test_crawler_without_searches_is_not_reported_cut(run_crawl):
+    manifest = run_crawl({"google": FakeCrawler(searches=2), "official_website": OfficialWebsite()})
+    assert manifest["deadline_reached"] is False
+    assert manifest["crawlers"] == {"GOOGLE": "completed", "OFFICIAL_WEBSITE": "completed"}
+
+
+def test_running_low_on_time_without_dropping_urls_is_complete(run_crawl):
+    manifest = run_crawl({"google": FakeCrawler(run_down_clock=True)})
+    assert manifest["deadline_reached"] is False
+    assert manifest["crawlers"] == {"GOOGLE": "completed"}
+
+
+def test_dropping_urls_for_the_deadline_is_partial(run_crawl):
+    manifest = run_crawl({"google": FakeCrawler(drop_urls=True), "news": FakeCrawler()})
+    assert manifest["deadline_reached"] is True
+    assert manifest["crawlers"] == {"GOOGLE": "partially completed", "NEWS": "completed"}
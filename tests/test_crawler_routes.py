@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from api.routes import crawler
+from api.routes.crawler import CreateDueDiligenceArtifactsBatchRequest, CreateDueDiligenceArtifactsRequest
+from api.util.TextIndexUtils import schedule_index_path
+
+UNSAFE_SCHEDULE_IDS = ["../schedule_ledger", "../x", "a/b", ".hidden", "a\\b"]
+
+
+@pytest.mark.parametrize("schedule_id", UNSAFE_SCHEDULE_IDS)
+def test_unsafe_schedule_ids_are_refused(schedule_id):
+    with pytest.raises(ValidationError):
+        CreateDueDiligenceArtifactsRequest(vendor_name="Vendor", crawlers=["GOOGLE"], schedule_id=schedule_id)
+
+
+def test_missing_schedule_id_is_generated():
+    request = CreateDueDiligenceArtifactsRequest(vendor_name="Vendor", crawlers=["GOOGLE"], schedule_id="")
+    message, _ = crawler.to_schedule_message(request)
+    assert request.schedule_id and request.schedule_id in message
+
+
+def test_batch_schedules_only_safe_schedule_ids(monkeypatch):
+    published = []
+
+    async def schedule_runs(entries):
+        published.extend(entries)
+        return {entry_id: ("message-id", None) for entry_id, _, _ in entries}
+
+    monkeypatch.setattr(crawler, "schedule_runs", schedule_runs)
+    batch = CreateDueDiligenceArtifactsBatchRequest(vendors=[
+        {"vendor_name": "Vendor", "crawlers": ["GOOGLE"], "schedule_id": "../x"},
+        {"vendor_name": "Vendor", "crawlers": ["GOOGLE"], "schedule_id": "schedule-1.v2"},
+    ])
+    response = asyncio.run(crawler.create_vendor_artifacts_batch(batch))
+    assert [result["status"] for result in response["results"]] == ["INVALID", "SCHEDULED"]
+    assert "schedule_id" in response["results"][0]["error"]
+    assert len(published) == 1
+
+
+def test_index_path_stays_in_its_directory(tmp_path):
+    assert schedule_index_path(str(tmp_path), "schedule-1") == str(tmp_path.resolve() / "schedule-1.sqlite")
+    for schedule_id in UNSAFE_SCHEDULE_IDS[:3]:
+        with pytest.raises(ValueError):
+            schedule_index_path(str(tmp_path), schedule_id)
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from api.crawlers import deduplicator
+from api.crawlers.deduplicator import deduplicate_schedule
+from api.modules.artifact_storage import LocalDiskStorage
+from api.util.SimilarityUtils import LshIndex, estimated_similarity, minhash_signature, tokenize
+
+WORDS = ["vendor", "contract", "court", "bank", "notice", "tender", "supply", "audit", "report", "order", "board",
+         "annual", "penalty", "licence", "export", "ministry", "district", "payment", "invoice", "director"]
+
+
+def article(seed, length=300):
+    words = random.Random(seed)
+    return ' '.join(words.choice(WORDS) for _ in range(length))
+
+
+def edited(text, every):
+    # Replaces every `every`th word, as a syndicated copy with its own byline and ads would differ
+    return ' '.join("changed" if index % every == 0 else word for index, word in enumerate(text.split()))
+
+
+def test_near_duplicates_pass_the_threshold_and_unrelated_texts_do_not():
+    original = minhash_signature(article(1))
+    near_duplicate = minhash_signature(edited(article(1), 100))
+    loose_copy = minhash_signature(edited(article(1), 8))
+    unrelated = minhash_signature(article(2))
+    assert estimated_similarity(original, near_duplicate) >= 0.8
+    assert estimated_similarity(original, loose_copy) < 0.8
+    assert estimated_similarity(original, unrelated) < 0.2
+
+    index = LshIndex(threshold=0.8)
+    index.add("original", original)
+    assert index.query(near_duplicate) == ["original"]
+    assert index.query(loose_copy) == []
+    assert index.query(unrelated) == []
+    assert LshIndex(threshold=1.0).query(near_duplicate) == []
+
+
+def test_short_texts_are_not_compared():
+    assert minhash_signature("Access denied") is None
+
+
+def test_hindi_words_are_kept_whole():
+    assert tokenize("विक्रेता पर धोखाधड़ी, का आरोप!") == ["विक्रेता", "पर", "धोखाधड़ी", "का", "आरोप"]
+
+
+@pytest.fixture
+def schedule(tmp_path, monkeypatch):
+    """
+    A schedule whose Google and OfficialWebsite crawls fetched the same article, plus one result of their own each.
+    """
+    async def run_inline(func, *args):
+        return func(*args)
+
+    monkeypatch.setattr(deduplicator, "run_in_pdf_pool", run_inline)
+    monkeypatch.setattr(deduplicator, "DEDUPLICATION_VENDOR_HISTORY", False)
+    storage = LocalDiskStorage(root=str(tmp_path), bucket_name="bucket", cleanup=False)
+    texts = {
+        "Google": [(1, 0.4, article(1)), (2, 0.3, article(3))],
+        "OfficialWebsite": [(1, 0.9, edited(article(1), 100)), (2, 0.2, article(4))],
+    }
+    for category, results in texts.items():
+        entries = []
+        for file_number, score, text in results:
+            storage.write_bytes(f"schedule-1/{category}/{file_number}.pdf", b"%PDF")
+            storage.write_text(f"schedule-1/{category}/{file_number}.txt", text)
+            entries.append({"file_number": file_number, "url": f"https://example.com/{category}/{file_number}",
+                            "status": True, "score": score})
+        storage.write_text(f"schedule-1/{category}/manifest.json", json.dumps({"entries": entries}))
+    return storage
+
+
+def entries(storage, category):
+    return json.loads(storage.read_bytes(f"schedule-1/{category}/manifest.json"))["entries"]
+
+
+def test_cross_crawler_duplicates_are_kept_and_marked(schedule, monkeypatch):
+    monkeypatch.setattr(deduplicator, "DEDUPLICATION_MODE", "MARK")
+    summary = asyncio.run(deduplicate_schedule(schedule, "schedule-1", "Vendor"))
+    assert summary == {"mode": "MARK", "compared": 4, "clusters": 1, "duplicates": 1, "dropped": 0}
+
+    google, official = entries(schedule, "Google"), entries(schedule, "OfficialWebsite")
+    # The better scored copy is canonical, whichever crawler found it
+    assert google[0]["duplicate_of"] == "OfficialWebsite/1.pdf" and google[0]["cluster"] == "OfficialWebsite/1.pdf"
+    assert official[0]["cluster"] == "OfficialWebsite/1.pdf" and "duplicate_of" not in official[0]
+    assert "cluster" not in google[1] and "cluster" not in official[1]
+    assert schedule.read_bytes("schedule-1/Google/1.pdf") == b"%PDF"
+    assert "dropped" not in google[0]
+
+
+def test_dropped_duplicates_lose_their_files(schedule, monkeypatch):
+    monkeypatch.setattr(deduplicator, "DEDUPLICATION_MODE", "DROP")
+    summary = asyncio.run(deduplicate_schedule(schedule, "schedule-1", "Vendor"))
+    assert summary["dropped"] == 1
+    assert entries(schedule, "Google")[0]["dropped"] is True
+    assert not any(key.startswith("schedule-1/Google/1.") for key in schedule.list_keys("schedule-1"))
+    assert "schedule-1/OfficialWebsite/1.pdf" in schedule.list_keys("schedule-1")
+
+
+def test_nothing_is_compared_when_off(schedule, monkeypatch):
+    monkeypatch.setattr(deduplicator, "DEDUPLICATION_MODE", "OFF")
+    assert asyncio.run(deduplicate_schedule(schedule, "schedule-1", "Vendor")) is None
@@ -0,0 +1,173 @@
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pymupdf
+import pytest
+
+from api.util import DownloadUtils
+from api.util.BandwidthUtils import DIRECT, BandwidthMeter, DownloadMeter
+from api.util.DownloadUtils import DownloadCancelledError, download_document, probe_pdf
+from api.util.PdfUtils import finalize_pdf
+
+DOCUMENT = bytes(range(256)) * 200
+
+
+class DocumentHandler(BaseHTTPRequestHandler):
+    """
+    Serves the server's document, honouring single byte ranges when the server accepts them.
+    """
+
+    def do_HEAD(self):
+        self.send_document(body=False)
+
+    def do_GET(self):
+        self.send_document(body=True)
+
+    def send_document(self, body):
+        server = self.server
+        if server.stall_seconds:
+            time.sleep(server.stall_seconds)
+        document = server.document
+        byte_range = self.headers.get('Range')
+        if byte_range and server.accepts_ranges:
+            start, end = (int(bound) for bound in byte_range[len('bytes='):].split('-'))
+            server.range_requests.append((start, end))
+            data = document[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(document)}')
+        else:
+            data = document
+            self.send_response(200)
+        if server.accepts_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(accepts_ranges=True, stall_seconds=0, document=DOCUMENT):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), DocumentHandler)
+        server.document = document
+        server.accepts_ranges = accepts_ranges
+        server.stall_seconds = stall_seconds
+        server.range_requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f'http://127.0.0.1:{server.server_address[1]}/document.pdf'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # 4KB range chunks, and ranges used from 8KB on
+    monkeypatch.setattr(DownloadUtils, 'MB', 1024)
+
+
+def test_downloads_whole_document_in_parallel_ranges(serve):
+    server, url = serve()
+    probe = probe_pdf(url)
+    assert probe.accepts_ranges and probe.size == len(DOCUMENT)
+
+    content = io.BytesIO()
+    assert download_document(url, content, probe) is False
+    assert content.getvalue() == DOCUMENT
+    # HEAD answers the probe, so every range request is a 4KB chunk
+    assert sorted(server.range_requests) == [(start, min(start + 4095, len(DOCUMENT) - 1))
+                                             for start in range(0, len(DOCUMENT), 4096)]
+
+
+def test_range_download_keeps_only_leading_bytes(serve):
+    server, url = serve()
+    content = io.BytesIO()
+    assert download_document(url, content, probe_pdf(url), limit=10000) is True
+    assert content.getvalue() == DOCUMENT[:10000]
+
+
+def test_streams_when_server_ignores_ranges(serve):
+    server, url = serve(accepts_ranges=False)
+    probe = probe_pdf(url)
+    assert not probe.accepts_ranges
+
+    content = io.BytesIO()
+    assert download_document(url, content, probe) is False
+    assert content.getvalue() == DOCUMENT
+
+    content = io.BytesIO()
+    assert download_document(url, content, probe, limit=10000) is True
+    assert content.getvalue() == DOCUMENT[:10000]
+    assert not server.range_requests
+
+
+def test_bytes_read_past_the_limit_are_counted(serve, monkeypatch):
+    monkeypatch.setattr(DownloadUtils, 'STREAM_CHUNK_SIZE', 8192)
+    server, url = serve(accepts_ranges=False)
+    meter = BandwidthMeter()
+    download_meter = DownloadMeter(meter, "Google", url, DIRECT)
+
+    content = io.BytesIO()
+    assert download_document(url, content, probe_pdf(url), limit=10000, on_received=download_meter.add) is True
+    assert len(content.getvalue()) == 10000
+    assert download_meter.received == 16384
+    assert meter.summary()["direct_bytes"] == 16384 and meter.summary()["requests"] == 1
+
+
+def test_bytes_of_a_failed_download_are_counted(serve, monkeypatch):
+    server, url = serve()
+    cancelled = threading.Event()
+    received = []
+
+    def cancel_after_first_chunk(size):
+        received.append(size)
+        cancelled.set()
+
+    with pytest.raises(DownloadCancelledError):
+        download_document(url, io.BytesIO(), probe_pdf(url), cancelled=cancelled, on_received=cancel_after_first_chunk)
+    assert sum(received) > 0
+
+
+def test_truncated_pdf_keeps_its_leading_pages(serve):
+    doc = pymupdf.open()
+    for page_num in range(20):
+        doc.new_page().insert_text((72, 72), f"Page {page_num + 1} " + "text " * 200)
+    document = doc.tobytes()
+    doc.close()
+    server, url = serve(document=document)
+
+    content = io.BytesIO()
+    assert download_document(url, content, probe_pdf(url), limit=len(document) // 2) is True
+    finalized = finalize_pdf(content.getvalue(), max_pages=5)
+    assert finalized.partial
+    with pymupdf.open(stream=finalized.content, filetype='pdf') as repaired:
+        assert repaired.page_count == 5
+        assert repaired.load_page(0).get_text().startswith("Page 1 ")
+
+
+def test_cancelled_download_stops(serve):
+    server, url = serve()
+    cancelled = threading.Event()
+    cancelled.set()
+    with pytest.raises(DownloadCancelledError):
+        download_document(url, io.BytesIO(), probe_pdf(url), cancelled=cancelled)
+
+
+def test_stalled_server_times_out(serve, monkeypatch):
+    server, url = serve(accepts_ranges=False, stall_seconds=2)
+    monkeypatch.setattr(DownloadUtils, 'READ_TIMEOUT_SECONDS', 0.5)
+    started_at = time.monotonic()
+    with pytest.raises(Exception):
+        download_document(url, io.BytesIO(), DownloadUtils.PdfProbe())
+    assert time.monotonic() - started_at < 1.5
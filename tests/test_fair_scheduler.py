@@ -0,0 +1,93 @@
+import asyncio
+
+from api.util.FairScheduler import PRIORITY_WEIGHTS, FairScheduler, ResourcePool
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_slots_are_granted_by_weighted_round_robin():
+    pool = ResourcePool("pages", 1, {"large": PRIORITY_WEIGHTS["NORMAL"], "small": PRIORITY_WEIGHTS["LOW"]})
+    granted = []
+
+    async def use_slot(schedule_id):
+        await pool.acquire(schedule_id)
+        granted.append(schedule_id)
+        pool.release()
+
+    async def run():
+        await pool.acquire("holder")
+        tasks = [asyncio.create_task(use_slot(schedule_id)) for schedule_id in ["large"] * 4 + ["small"] * 4]
+        await settle()
+        assert list(pool.ring) == ["large", "small"]
+        pool.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert granted == ["large", "large", "small", "large", "large", "small", "small", "small"]
+    assert pool.in_use == 0 and not pool.ring and not pool.queues
+    assert pool.stats["large"].granted == 4 and pool.stats["large"].max_queue_depth == 4
+
+
+def test_unregistered_schedules_get_normal_weight():
+    scheduler = FairScheduler({"pages": 1})
+    scheduler.register("urgent", "HIGH")
+    scheduler.register("unknown", "SOMEDAY")
+    assert scheduler.weights == {"urgent": PRIORITY_WEIGHTS["HIGH"], "unknown": PRIORITY_WEIGHTS["NORMAL"]}
+    scheduler.unregister("urgent")
+    assert "urgent" not in scheduler.weights
+
+
+def test_cancelled_waiter_is_skipped():
+    pool = ResourcePool("pages", 1, {})
+    granted = []
+
+    async def use_slot(name, schedule_id):
+        await pool.acquire(schedule_id)
+        granted.append(name)
+        pool.release()
+
+    async def run():
+        await pool.acquire("holder")
+        cancelled = asyncio.create_task(use_slot("cancelled", "first"))
+        waiting = asyncio.create_task(use_slot("waiting", "second"))
+        await settle()
+        cancelled.cancel()
+        await settle()
+        # The schedule had no other waiters, so it leaves the ring
+        assert list(pool.ring) == ["second"]
+        pool.release()
+        await waiting
+        return cancelled.cancelled()
+
+    assert asyncio.run(run())
+    assert granted == ["waiting"]
+    assert pool.in_use == 0
+    assert pool.stats["first"].as_dict()["granted"] == 0 and pool.stats["first"].queue_depth == 0
+
+
+def test_slot_granted_to_a_cancelled_waiter_is_passed_on():
+    pool = ResourcePool("pages", 1, {})
+    granted = []
+
+    async def use_slot(name, schedule_id):
+        await pool.acquire(schedule_id)
+        granted.append(name)
+        pool.release()
+
+    async def run():
+        await pool.acquire("holder")
+        cancelled = asyncio.create_task(use_slot("cancelled", "first"))
+        waiting = asyncio.create_task(use_slot("waiting", "second"))
+        await settle()
+        # Granted, then cancelled before it got to run
+        pool.release()
+        cancelled.cancel()
+        await waiting
+        await asyncio.gather(cancelled, return_exceptions=True)
+
+    asyncio.run(run())
+    assert granted == ["waiting"]
+    assert pool.in_use == 0 and not pool.ring
@@ -0,0 +1,99 @@
+import asyncio
+
+from api.util.BandwidthUtils import DIRECT, PROXIED, BandwidthMeter, ByteBudgetExceededError, PageMeter
+
+
+class FakeClient:
+    """
+    The DevTools session of a page: records the handlers PageMeter registers and the commands it sends.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.sent = []
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    def emit(self, event, **params):
+        self.handlers[event](params)
+
+    async def send(self, method):
+        self.sent.append(method)
+
+
+class FakePage:
+
+    def __init__(self):
+        self._client = FakeClient()
+
+
+def load(client, request_id, url, chunks, total=None):
+    client.emit('Network.requestWillBeSent', requestId=request_id, request={'url': url})
+    for chunk in chunks:
+        client.emit('Network.dataReceived', requestId=request_id, encodedDataLength=chunk)
+    if total is not None:
+        client.emit('Network.loadingFinished', requestId=request_id, encodedDataLength=total)
+
+
+def test_finished_requests_are_recorded_with_their_headers():
+    page = FakePage()
+    meter = BandwidthMeter()
+    page_meter = PageMeter(page, meter, "Google", PROXIED, budget_bytes=10000)
+    load(page._client, "1", "https://example.com/", [400, 400], total=1000)
+    load(page._client, "2", "https://cdn.example.net/app.js", [300])
+    page._client.emit('Network.loadingFailed', requestId="2")
+
+    assert page_meter.received == 1300 and not page_meter.aborted
+    assert page_meter.error("https://example.com/") is None
+    summary = meter.summary()
+    assert summary["proxied_bytes"] == 1300 and summary["requests"] == 2
+    assert summary["top_hosts"]["cdn.example.net"]["proxied_bytes"] == 300
+    assert page._client.sent == []
+
+
+def test_page_over_its_byte_budget_stops_loading():
+    async def run():
+        page = FakePage()
+        meter = BandwidthMeter()
+        page_meter = PageMeter(page, meter, "Google", DIRECT, budget_bytes=1000)
+        load(page._client, "1", "https://example.com/", [600])
+        assert not page_meter.aborted
+        load(page._client, "2", "https://example.com/video.mp4", [300, 300, 300])
+        await asyncio.sleep(0)
+        return page, meter, page_meter
+
+    page, meter, page_meter = asyncio.run(run())
+    assert page_meter.aborted
+    # Stopped once, on the chunk that crossed the budget
+    assert page._client.sent == ['Page.stopLoading']
+    assert page_meter.received == 1500
+    assert meter.pages_aborted == 1
+    error = page_meter.error("https://example.com/")
+    assert isinstance(error, ByteBudgetExceededError) and error.received == 1500
+
+
+def test_schedule_over_its_byte_budget_stops_the_page():
+    async def run():
+        page = FakePage()
+        meter = BandwidthMeter(budget_bytes=5000)
+        meter.record("Google", "https://example.com/earlier", DIRECT, 4500)
+        # No budget of its own, but the bytes in flight take the schedule over
+        page_meter = PageMeter(page, meter, "Google", DIRECT)
+        load(page._client, "1", "https://example.com/", [400])
+        assert not page_meter.aborted
+        load(page._client, "2", "https://example.com/logo.png", [200])
+        await asyncio.sleep(0)
+        return page, meter, page_meter
+
+    page, meter, page_meter = asyncio.run(run())
+    assert page_meter.aborted and page._client.sent == ['Page.stopLoading']
+    assert meter.exhausted_reason() is None
+    assert meter.pages_aborted == 1
+
+
+def test_unlimited_page_is_never_stopped():
+    page = FakePage()
+    page_meter = PageMeter(page, BandwidthMeter(), "Google", DIRECT)
+    load(page._client, "1", "https://example.com/", [10 ** 9], total=10 ** 9)
+    assert not page_meter.aborted
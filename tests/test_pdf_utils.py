@@ -0,0 +1,38 @@
+import pymupdf
+
+from api.util import PdfUtils
+from api.util.PdfUtils import finalize_pdf
+
+
+def sample_pdf(pages):
+    doc = pymupdf.open()
+    for page_num in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {page_num + 1}")
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+def test_optimized_copy_is_kept_when_smaller():
+    pdf_bytes = sample_pdf(3)
+    finalized = finalize_pdf(pdf_bytes, optimize=True, image_dpi=150, image_quality=75)
+    assert len(finalized.content) < len(pdf_bytes)
+
+
+def test_original_is_kept_when_optimizing_does_not_shrink_it(monkeypatch):
+    monkeypatch.setattr(PdfUtils, 'optimize_document', lambda doc, image_dpi, image_quality: b'%PDF' * 10000)
+    pdf_bytes = sample_pdf(3)
+    finalized = finalize_pdf(pdf_bytes, optimize=True, image_dpi=150, image_quality=75)
+    assert finalized.content == pdf_bytes
+
+
+def test_stamped_and_trimmed_copy_is_kept_when_optimizing_does_not_shrink_it(monkeypatch):
+    pdf_bytes = sample_pdf(10)
+    monkeypatch.setattr(PdfUtils, 'optimize_document', lambda doc, image_dpi, image_quality: b'%PDF' * 10000)
+    finalized = finalize_pdf(pdf_bytes, cover_text="Generated by VDD Crawler", max_pages=5, optimize=True,
+                             image_dpi=150, image_quality=75)
+    # The saved document's /ID is random, so its bytes can't be compared with another save
+    assert finalized.content != b'%PDF' * 10000
+    with pymupdf.open(stream=finalized.content, filetype='pdf') as doc:
+        assert doc.page_count == 6
+        assert "Generated by VDD Crawler" in doc.load_page(0).get_text()
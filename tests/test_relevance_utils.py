@@ -0,0 +1,53 @@
+import pytest
+
+from api.util.RelevanceUtils import SearchResult, domain_quality, rank_search_results, term_pattern
+
+RISK_TERMS = ["fraud", "fine", "ban", "money laundering", "धोखाधड़ी"]
+ACTOR_NAMES = ["Acme Infra Private Limited", "Ravi Kumar"]
+
+
+@pytest.mark.parametrize("text", ["fraud alleged", "sebi fine imposed", "(ban)", "money laundering case",
+                                  "विक्रेता पर धोखाधड़ी का आरोप", "fraud-accused"])
+def test_terms_match_whole_words(text):
+    assert any(term_pattern(term).search(text) for term in RISK_TERMS)
+
+
+@pytest.mark.parametrize("text", ["define the scope", "bank statement", "fraudster", "money-laundering",
+                                  "धोखाधड़ीपूर्ण", "banned"])
+def test_terms_do_not_match_inside_words(text):
+    assert not any(term_pattern(term).search(text) for term in RISK_TERMS)
+
+
+def test_term_pattern_ignores_case_of_the_term():
+    assert term_pattern("Fraud").search("fraud probe")
+
+
+def test_domain_quality():
+    assert domain_quality("https://www.sebi.gov.in/orders/1.pdf") == 1.0
+    assert domain_quality("https://indiankanoon.org/doc/1/") == 1.0
+    assert domain_quality("https://www.zaubacorp.com/company/ACME") == -1.0
+    assert domain_quality("https://in.linkedin.com/company/acme") == -1.0
+    # Only whole domain labels count
+    assert domain_quality("https://notzaubacorp.com/") == 0.0
+    assert domain_quality("https://example.com/") == 0.0
+
+
+def test_results_are_ranked_by_risk_name_domain_and_rank():
+    results = [
+        SearchResult("https://www.zaubacorp.com/company/ACME-INFRA", 1, "Acme Infra Private Limited - Company profile"),
+        SearchResult("https://example.com/blog", 2, "Infrastructure trends", "Roads and bridges"),
+        SearchResult("https://www.sebi.gov.in/orders/acme.pdf", 3, "Order against Acme Infra Private Limited",
+                     "SEBI imposes fine for fraud"),
+        SearchResult("https://news.example.com/ravi-kumar-money-laundering", 4, "Director arrested", ""),
+    ]
+    ranked = rank_search_results(results, RISK_TERMS, ACTOR_NAMES)
+    assert [result.rank for result in ranked] == [3, 4, 1, 2]
+    assert ranked[0].score > ranked[1].score > ranked[2].score > ranked[3].score
+
+
+def test_ties_keep_the_search_engine_order():
+    results = [SearchResult("https://example.com/b", 2), SearchResult("https://example.com/a", 1),
+               SearchResult("https://example.com/c", 2)]
+    ranked = rank_search_results(results, RISK_TERMS, ACTOR_NAMES)
+    assert [result.url for result in ranked] == ["https://example.com/a", "https://example.com/b",
+                                                 "https://example.com/c"]
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from api.page_objects import google_crawler_page
+from api.page_objects.google_crawler_page import render_result
+
+CONTENT = {"title": "Vendor news", "url": "https://example.com/news", "text": "The vendor was fined.", "links": []}
+
+
+class FakePage:
+
+    async def goto(self, url, options):
+        return None
+
+    async def evaluate(self, script):
+        return CONTENT
+
+
+class FakeStorage:
+
+    def __init__(self):
+        self.texts = {}
+
+    def write_text(self, key, text):
+        self.texts[key] = text
+
+
+@pytest.fixture
+def dom_mode(monkeypatch):
+    async def no_stealth(page):
+        pass
+
+    async def no_wait(seconds):
+        pass
+
+    monkeypatch.setattr(google_crawler_page, "TEXT_EXTRACTION_MODE", "DOM")
+    monkeypatch.setattr(google_crawler_page, "WRITE_TEXT_SIDECAR", True)
+    monkeypatch.setattr(google_crawler_page, "stealth", no_stealth)
+    monkeypatch.setattr(google_crawler_page.asyncio, "sleep", no_wait)
+
+
+def test_text_is_written_after_the_pdf_renders(dom_mode, monkeypatch):
+    async def render_pdf(page):
+        return b"%PDF"
+
+    monkeypatch.setattr(google_crawler_page, "render_pdf", render_pdf)
+    storage = FakeStorage()
+    pdf_bytes, text = asyncio.run(render_result(FakePage(), CONTENT["url"], storage, "schedule-1/Google/1.pdf", 5, 5))
+    assert pdf_bytes == b"%PDF"
+    assert "The vendor was fined." in text
+    assert storage.texts["schedule-1/Google/1.txt"] == text
+    assert "schedule-1/Google/1.json" in storage.texts
+
+
+def test_failed_render_writes_no_text(dom_mode, monkeypatch):
+    async def render_pdf(page):
+        raise RuntimeError("Printing failed")
+
+    monkeypatch.setattr(google_crawler_page, "render_pdf", render_pdf)
+    storage = FakeStorage()
+    with pytest.raises(RuntimeError):
+        asyncio.run(render_result(FakePage(), CONTENT["url"], storage, "schedule-1/Google/1.pdf", 5, 5))
+    assert storage.texts == {}
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+from api.handlers import web_event_handler
+from api.modules import schedule_ledger
+from api.modules.schedule_ledger import SqliteScheduleLedger, keep_lease
+
+
+class FakeSqsClient:
+
+    def __init__(self):
+        self.deleted = []
+        self.visibility = []
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self.deleted.append(ReceiptHandle)
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout):
+        self.visibility.append((ReceiptHandle, VisibilityTimeout))
+
+
+def schedule_message(schedule_id):
+    payload = {"vendor_name": "Vendor", "schedule_id": schedule_id, "pages": 1, "directors": [],
+               "website_url": "https://vendor.example", "crawlers": ["google"]}
+    return {"MessageId": f"message-{schedule_id}", "ReceiptHandle": f"receipt-{schedule_id}",
+            "Body": json.dumps({"Message": json.dumps(payload)})}
+
+
+def use_ledger(monkeypatch, tmp_path):
+    ledger = SqliteScheduleLedger(str(tmp_path / "ledger.sqlite"))
+    monkeypatch.setattr(schedule_ledger, "_ledger", ledger)
+    return ledger
+
+
+def test_failed_run_keeps_the_message_and_its_redelivery_runs_again(monkeypatch, tmp_path):
+    use_ledger(monkeypatch, tmp_path)
+    runs = []
+
+    async def run_schedule(payload):
+        runs.append(payload["schedule_id"])
+        if len(runs) == 1:
+            raise RuntimeError("crawler crashed")
+
+    monkeypatch.setattr(web_event_handler, "perform_due_diligence_v2", run_schedule)
+    sqs = FakeSqsClient()
+    message = schedule_message("schedule-1")
+
+    asyncio.run(web_event_handler.process_and_delete_message(sqs, "queue", message))
+    assert sqs.deleted == []
+    assert sqs.visibility == [("receipt-schedule-1", web_event_handler.FAILED_RUN_RETRY_SECONDS)]
+
+    asyncio.run(web_event_handler.process_and_delete_message(sqs, "queue", message))
+    assert runs == ["schedule-1", "schedule-1"]
+    assert sqs.deleted == ["receipt-schedule-1"]
+
+
+def test_malformed_message_is_deleted(monkeypatch, tmp_path):
+    use_ledger(monkeypatch, tmp_path)
+    sqs = FakeSqsClient()
+    message = {"MessageId": "message-1", "ReceiptHandle": "receipt-1", "Body": "not json"}
+
+    asyncio.run(web_event_handler.process_and_delete_message(sqs, "queue", message))
+    assert sqs.deleted == ["receipt-1"]
+
+
+def test_lost_lease_stops_extending_visibility(monkeypatch, tmp_path):
+    ledger = use_ledger(monkeypatch, tmp_path)
+    monkeypatch.setattr(schedule_ledger, "SCHEDULE_LEASE_SECONDS", 0.03)
+    ledger.claim("schedule-1", "another-worker", 60)
+    renewals = []
+
+    async def keep_lost_lease():
+        await asyncio.wait_for(keep_lease(ledger, "schedule-1", lambda: renewals.append(1)), timeout=1)
+
+    asyncio.run(keep_lost_lease())
+    assert renewals == []
@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+from api.util import TextIndexUtils
+from api.util.TextIndexUtils import (
+    TextIndex, close_schedule_text_index, open_schedule_text_index, search_schedule, to_match_query
+)
+
+RISK_TERMS = {"english": ["court", "money laundering"], "hindi": ["धोखाधड़ी"]}
+
+DOCUMENTS = [
+    ("Google", 1, "https://example.com/1", "Annual report", "Thanks for the courtesy shown by the vendor."),
+    ("Google", 2, "https://example.com/2", "Court ruling", "The court heard the money laundering case."),
+    ("Google", 3, "https://example.com/3", "Bank notice", "Laundering of money was not proven."),
+    ("Hindi", 4, "https://example.com/4", "समाचार", "विक्रेता पर धोखाधड़ी का आरोप लगा।"),
+]
+
+
+@pytest.fixture
+def built_index(tmp_path, monkeypatch):
+    """
+    Builds a schedule's index, ships it to the cache dir as it would be downloaded, and returns the tags per document.
+    """
+    monkeypatch.setattr(TextIndexUtils, "TEXT_INDEX_ENABLED", True)
+    monkeypatch.setattr(TextIndexUtils, "TEXT_INDEX_CACHE_DIR", str(tmp_path))
+    text_index = open_schedule_text_index("schedule-1", RISK_TERMS)
+    tags = [text_index.add_document("schedule-1", *document) for document in DOCUMENTS]
+    content = close_schedule_text_index("schedule-1")
+    (tmp_path / "schedule-1.sqlite").write_bytes(content)
+    return tags
+
+
+def test_index_is_built_in_memory_and_serialized(built_index, tmp_path):
+    assert close_schedule_text_index("schedule-1") is None
+    assert [path.name for path in tmp_path.iterdir()] == ["schedule-1.sqlite"]
+    with sqlite3.connect(tmp_path / "schedule-1.sqlite") as connection:
+        assert connection.execute("SELECT count(*) FROM documents").fetchone() == (len(DOCUMENTS),)
+        assert (connection.execute("SELECT language FROM risk_terms WHERE term = ?", ("धोखाधड़ी",)).fetchone()
+                == ("hindi",))
+
+
+def test_risk_terms_tag_whole_words_and_phrases(built_index):
+    assert built_index == [[], ["court", "money laundering"], [], ["धोखाधड़ी"]]
+
+
+def test_hindi_words_are_kept_whole():
+    text_index = TextIndex(":memory:")
+    text_index.add_document("schedule-1", "Hindi", 1, "https://example.com/1", "", "विक्रेता पर धोखाधड़ी का आरोप")
+    assert [result["file_number"] for result in text_index.search("धोखाधड़ी")] == ["1"]
+    # Without the vowel signs as token characters, the word would split into fragments that match on their own
+    assert text_index.search("ड़") == []
+    assert text_index.search("धोख") == []
+    text_index.close()
+
+
+def test_search_snippets_and_filters(built_index):
+    results = search_schedule("schedule-1", "money laundering")
+    assert sorted(result["file_number"] for result in results) == ["2", "3"]
+    result = next(result for result in results if result["file_number"] == "2")
+    assert result["risk_terms"] == ["court", "money laundering"]
+    assert "[money] [laundering]" in result["snippet"]
+
+    assert search_schedule("schedule-1", "court धोखाधड़ी") == []
+    results = search_schedule("schedule-1", "court धोखाधड़ी", match_any=True)
+    assert sorted(result["file_number"] for result in results) == ["2", "4"]
+    assert [result["category"] for result in search_schedule("schedule-1", "धोखाधड़ी", category="Hindi")] == ["Hindi"]
+    assert search_schedule("schedule-1", "धोखाधड़ी", category="Google") == []
+    assert search_schedule("schedule-1", "   ") == []
+
+
+def test_title_matches_rank_first():
+    text_index = TextIndex(":memory:")
+    text_index.add_document("schedule-1", "Google", 1, "https://example.com/1", "Annual report", "Vendor accounts")
+    text_index.add_document("schedule-1", "Google", 2, "https://example.com/2", "Vendor accounts", "Annual report")
+    for file_number in range(3, 8):
+        text_index.add_document("schedule-1", "Google", file_number, f"https://example.com/{file_number}", "Notice",
+                                "Unrelated text")
+    results = text_index.search("vendor")
+    assert [result["file_number"] for result in results] == ["2", "1"]
+    assert results[0]["score"] > results[1]["score"] > 0
+    text_index.close()
+
+
+def test_query_syntax_is_quoted():
+    assert to_match_query('court "NEAR OR') == '"court" """NEAR" "OR"'
+    assert to_match_query("a b", match_any=True) == '"a" OR "b"'
+    assert to_match_query("  ") is None
+    text_index = TextIndex(":memory:")
+    assert text_index.search('court" OR body:*') == []
+    text_index.close()
+
+
+def test_removed_documents_are_not_found():
+    text_index = TextIndex(":memory:")
+    text_index.add_document("schedule-1", "Google", 1, "https://example.com/1", "", "Court ruling")
+    text_index.remove_document("Google", 1)
+    assert text_index.search("court") == []
+    text_index.close()